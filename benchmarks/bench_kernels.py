@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import kernels
+import loader
+import utils
+from edge import Edge
+from point_cloud import PointCloud
+
+"""
+Compare the per-triangle geometry checks of the algorithm: the utils functions over Point objects and small NumPy
+arrays (the original way), against the kernels over the raw coordinates (compiled when Numba is installed).
+Usage: python benchmarks/bench_kernels.py [path] [radius] [triangles] [repeats]
+"""
+
+
+def run_utils(cloud, triangles, radius):
+    points = cloud.points
+    results = []
+
+    for i, j, k in triangles:
+        p1, p2, p3 = points[i], points[j], points[k]
+        normal = np.cross([p2.x - p1.x, p2.y - p1.y, p2.z - p1.z], [p3.x - p1.x, p3.y - p1.y, p3.z - p1.z])
+        centers, valid = utils.calc_ball_centers(cloud.coordinates, cloud.normals, i, j, [k], radius)
+        results.append((utils.calc_incircle_radius(p1, p2, p3),
+                        utils.calc_min_max_angle_of_triangle(Edge(p1, p2), Edge(p2, p3), Edge(p3, p1))[0],
+                        utils.calc_distance_point_to_edge(p3, Edge(p1, p2)),
+                        np.dot(normal, p1.normal), bool(valid[0])))
+
+    return results
+
+
+def run_kernels(c, n, triangles, radius):
+    results = []
+
+    for i, j, k in triangles:
+        results.append((kernels.incircle_radius(c, i, j, k), kernels.min_max_angle(c, i, j, j, k, k, i)[0],
+                        kernels.distance_point_to_edge(c, k, i, j), kernels.triangle_normal_dot(c, n, i, j, k, i),
+                        kernels.ball_center(c, n, i, j, k, radius)[0]))
+
+    return results
+
+
+def measure(function, repeats, *args):
+    times = []
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        times.append(time.perf_counter() - start)
+
+    return min(times), result
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                                               'data', 'bunny_with_normals.txt')
+    radius = float(sys.argv[2]) if len(sys.argv) > 2 else 0.015
+    num_triangles = int(sys.argv[3]) if len(sys.argv) > 3 else 20000
+    repeats = int(sys.argv[4]) if len(sys.argv) > 4 else 3
+
+    cloud = PointCloud(*loader.load_points(path))
+    rng = np.random.default_rng(0)
+    triangles = [tuple(int(i) for i in rng.choice(len(cloud), 3, replace=False)) for _ in range(num_triangles)]
+
+    # Converting the arrays is done once per mesh, so it's timed apart.
+    start = time.perf_counter()
+    c, n = kernels.as_kernel_array(cloud.coordinates), kernels.as_kernel_array(cloud.normals)
+    convert_time = time.perf_counter() - start
+
+    # The first call compiles the kernels when Numba is installed.
+    run_kernels(c, n, triangles[:1], radius)
+
+    old_time, old_results = measure(run_utils, repeats, cloud, triangles, radius)
+    new_time, new_results = measure(run_kernels, repeats, c, n, triangles, radius)
+
+    # utils works on the float32 coordinates, the kernels on float64, so tiny angles differ a bit.
+    np.testing.assert_allclose(np.array(old_results, dtype=float), np.array(new_results, dtype=float), rtol=1e-4,
+                               atol=1e-3)
+    print("{} triangles, numba: {}, arrays converted in {:.3f}s".format(num_triangles, kernels.HAS_NUMBA,
+                                                                          convert_time))
+    print("utils:   {:.3f}s".format(old_time))
+    print("kernels: {:.3f}s ({:.1f}x)".format(new_time, old_time / new_time))
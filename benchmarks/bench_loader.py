@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import loader
+from point_cloud import PointCloud
+
+"""
+Compare the vectorised loader with the original one (split and float() each token, then sort with a lambda).
+Usage: python benchmarks/bench_loader.py [path] [repeats]
+"""
+
+
+def load_points_per_line(path):
+    coordinates = []
+    normals = []
+    f = open(path, "r")
+    lines = f.read().splitlines()
+
+    for line in lines:
+        values = line.split()
+
+        if len(values) == 6:
+            coordinates.append((float(values[0]), float(values[1]), float(values[2])))
+            normals.append((float(values[3]), float(values[4]), float(values[5])))
+
+    f.close()
+    order = sorted(range(len(coordinates)), key=lambda i: (np.float32(coordinates[i][0]),
+                                                           np.float32(coordinates[i][1]),
+                                                           np.float32(coordinates[i][2])))
+    return np.array(coordinates, dtype=np.float32)[order], np.array(normals, dtype=np.float32)[order]
+
+
+def load_points_vectorised(path):
+    cloud = PointCloud(*loader.load_points(path))
+    cloud.sort_lexicographic()
+    return cloud.coordinates, cloud.normals
+
+
+def measure(function, path, repeats):
+    times = []
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(path)
+        times.append(time.perf_counter() - start)
+
+    return min(times), result
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                                               'data', 'large_bunny_with_normals.txt')
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    old_time, (old_coordinates, old_normals) = measure(load_points_per_line, path, repeats)
+    new_time, (new_coordinates, new_normals) = measure(load_points_vectorised, path, repeats)
+
+    assert np.array_equal(old_coordinates, new_coordinates) and np.array_equal(old_normals, new_normals)
+    print("{} points".format(len(new_coordinates)))
+    print("per line:   {:.3f}s".format(old_time))
+    print("vectorised: {:.3f}s ({:.1f}x)".format(new_time, old_time / new_time))
@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import loader
+from grid import Grid
+from point_cloud import PointCloud
+
+"""
+Compare gathering the candidates of points and edges from the grid: decoding the 27 neighbor cells of each point and
+intersecting them as sets (the original way), against the grid's precomputed neighborhood tables.
+Usage: python benchmarks/bench_neighbors.py [path] [radius] [repeats]
+"""
+
+
+def gather_from_cells(grid, points, pairs):
+    total = 0
+
+    for p in points:
+        total += len(grid.get_cells_points_ids(p.neighbor_nodes))
+
+    for p1, p2 in pairs:
+        total += len(grid.get_cells_points_ids(set(p1.neighbor_nodes) & set(p2.neighbor_nodes)))
+
+    return total
+
+
+def gather_from_tables(grid, points, pairs):
+    total = 0
+
+    for p in points:
+        total += len(grid.get_neighbor_points_ids(p))
+
+    for p1, p2 in pairs:
+        total += len(grid.get_common_neighbor_points_ids(p1, p2))
+
+    return total
+
+
+def measure(function, repeats, *args):
+    times = []
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        times.append(time.perf_counter() - start)
+
+    return min(times), result
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                                               'data', 'large_bunny_with_normals.txt')
+    radius = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    cloud = PointCloud(*loader.load_points(path))
+    cloud.sort_lexicographic()
+    start = time.perf_counter()
+    grid = Grid(radius=radius, points=cloud.points)
+    build_time = time.perf_counter() - start
+
+    # Each point with its nearest neighbor in the sorted order, like the edges of the front.
+    points = cloud.points
+    pairs = list(zip(points[:-1], points[1:]))
+
+    old_time, old_total = measure(gather_from_cells, repeats, grid, points, pairs)
+    new_time, new_total = measure(gather_from_tables, repeats, grid, points, pairs)
+
+    assert old_total == new_total
+    print("{} points, {} cells, grid built in {:.3f}s".format(len(points), len(grid.cells), build_time))
+    print("cells and sets: {:.3f}s".format(old_time))
+    print("tables:         {:.3f}s ({:.1f}x)".format(new_time, old_time / new_time))
@@ -0,0 +1,302 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import loader
+from bpa import BPA
+from grid import IS_EDGE
+from point_cloud import PointCloud
+
+"""
+Headless benchmarks of the whole reconstruction, over the bundled datasets and synthetic spheres and planes of 10^4 to
+10^6 points. Each case runs in its own process, so its peak memory is its own. For each case it reports the times of
+loading the points, building the grid, searching for seeds and expanding the front, the triangles per second, the peak
+memory and statistics of the mesh. The results can be written to a JSON file, and compared with a previous one: a case
+whose time grew by more than the tolerance, or whose mesh changed, is a regression (and the exit code is 1). With
+repeats, each case is run a few times and the shortest times (and smallest peak memory) are kept.
+Usage: python benchmarks/bench_suite.py [cases ...] [--output results.json] [--baseline baseline.json]
+       [--tolerance 0.1] [--repeats 1]
+Cases are names from CASES, 'all', or by default all the cases up to 10^5 points.
+"""
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+# Name: (dataset, number of points for synthetic clouds, radius (or its ratio to the points spacing), mode).
+CASES = {
+    'bunny': ('bunny_with_normals.txt', None, 0.015, 'pivot'),
+    'teapot': ('teapot_with_normal.txt', None, 0.07, 'pivot'),
+    'large-bunny': ('large_bunny_with_normals.txt', None, 0.002, 'incircle'),
+    'sphere-1e4': ('sphere', 10 ** 4, 1.0, 'pivot'),
+    'plane-1e4': ('plane', 10 ** 4, 1.0, 'pivot'),
+    'sphere-1e5': ('sphere', 10 ** 5, 1.0, 'pivot'),
+    'plane-1e5': ('plane', 10 ** 5, 1.0, 'pivot'),
+    'sphere-1e6': ('sphere', 10 ** 6, 1.0, 'pivot'),
+    'plane-1e6': ('plane', 10 ** 6, 1.0, 'pivot'),
+}
+DEFAULT_CASES = [name for name, (_, num_points, _, _) in CASES.items() if num_points is None or num_points <= 10 ** 5]
+
+# The fields compared with the baseline. Times are compared with the tolerance, the mesh statistics must be equal.
+TIME_FIELDS = ['load_time', 'grid_time', 'seed_time', 'expand_time', 'mesh_time']
+MESH_FIELDS = ['num_triangles', 'num_edges', 'num_seeds']
+
+# Times shorter than this are too noisy to compare.
+MIN_COMPARED_TIME = 0.05
+
+
+def make_sphere(num_points):
+    """
+    Points spread evenly on the unit sphere (a Fibonacci lattice), with outward normals.
+
+    :param num_points: The number of points.
+    :return: Coordinates, normals (float32 arrays of shape (N, 3)) and the average distance between neighbor points.
+    """
+    i = np.arange(num_points) + 0.5
+    phi = np.arccos(1 - 2 * i / num_points)
+    theta = np.pi * (1 + math.sqrt(5)) * i
+    normals = np.column_stack([np.cos(theta) * np.sin(phi), np.sin(theta) * np.sin(phi), np.cos(phi)])
+    return normals.astype(np.float32), normals.astype(np.float32), math.sqrt(4 * math.pi / num_points)
+
+
+def make_plane(num_points, seed=0):
+    """
+    Points on a jittered square grid in the unit square of the z=0 plane, with normals pointing up.
+
+    :param num_points: The number of points (rounded to a square).
+    :param seed: (Optional) seed of the jitter.
+    :return: Coordinates, normals (float32 arrays of shape (N, 3)) and the distance between neighbor points.
+    """
+    k = int(round(math.sqrt(num_points)))
+    x, y = np.meshgrid(np.arange(k), np.arange(k))
+    coordinates = np.column_stack([x.ravel(), y.ravel(), np.zeros(k * k)]) / k
+    coordinates[:, :2] += np.random.RandomState(seed).uniform(-0.25, 0.25, (k * k, 2)) / k
+    normals = np.tile(np.array([0, 0, 1], dtype=np.float32), (k * k, 1))
+    return coordinates.astype(np.float32), normals, 1 / k
+
+
+def timed(function, times, name):
+    # Wrap a method of the BPA object, to add up the time spent in it.
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+
+        try:
+            return function(*args, **kwargs)
+        finally:
+            times[name] = times.get(name, 0) + time.perf_counter() - start
+
+    return wrapper
+
+
+def get_peak_memory() -> float:
+    # The peak resident memory of this process, in MB (ru_maxrss is in KB on Linux and in bytes on macOS).
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def get_mesh_stats(bpa) -> dict:
+    """
+    Get statistics of the mesh.
+
+    :param bpa: The BPA object, after create_mesh.
+    :return: Dictionary of the statistics.
+    """
+    grid = bpa.grid
+    is_edge = (grid.edge_flags.array & IS_EDGE) > 0
+    num_triangles = grid.edge_num_triangles.array[is_edge]
+    triangles = grid.get_triangles_array()
+    return {'num_triangles': len(triangles),
+            'num_edges': int(is_edge.sum()),
+            'num_boundary_edges': int((num_triangles < 2).sum()),
+            'num_non_manifold_edges': int((num_triangles > 2).sum()),
+            'used_points_ratio': len(np.unique(triangles)) / len(bpa.points) if len(bpa.points) else 0}
+
+
+def measure(name) -> dict:
+    """
+    Run a single case.
+
+    :param name: The name of the case (see CASES).
+    :return: Dictionary of the results.
+    """
+    dataset, num_points, radius, mode = CASES[name]
+    start = time.perf_counter()
+
+    if num_points is None:
+        coordinates, normals = loader.load_points(os.path.join(DATA_DIR, dataset))
+    else:
+        coordinates, normals, spacing = (make_sphere if dataset == 'sphere' else make_plane)(num_points)
+        radius *= spacing
+
+    cloud = PointCloud(coordinates, normals=normals)
+    cloud.sort_lexicographic()
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bpa = BPA(path=None, cloud=cloud, radius=radius)
+    grid_time = time.perf_counter() - start
+
+    times = {}
+    seeds = []
+    find_seed_triangle = timed(bpa.find_seed_triangle, times, 'seed_time')
+
+    def find_and_count_seed_triangle(*args, **kwargs):
+        result = find_seed_triangle(*args, **kwargs)
+
+        if result[1] is not None:
+            seeds.append(result[2])
+
+        return result
+
+    bpa.find_seed_triangle = find_and_count_seed_triangle
+    bpa.expand_front = timed(bpa.expand_front, times, 'expand_time')
+
+    start = time.perf_counter()
+
+    with contextlib.redirect_stderr(io.StringIO()):
+        bpa.create_mesh(mode=mode)
+
+    mesh_time = time.perf_counter() - start
+    results = {'case': name, 'num_points': len(cloud.coordinates), 'radius': radius, 'mode': mode,
+               'index': type(bpa.grid.index).__name__, 'load_time': load_time, 'grid_time': grid_time,
+               'seed_time': times.get('seed_time', 0), 'expand_time': times.get('expand_time', 0),
+               'mesh_time': mesh_time, 'num_seeds': len(seeds),
+               'num_seed_points_tried': bpa.num_points_i_tried_to_seed_from}
+    results.update(get_mesh_stats(bpa))
+    results['triangles_per_second'] = results['num_triangles'] / mesh_time if mesh_time > 0 else 0
+    results['peak_memory_mb'] = get_peak_memory()
+    return results
+
+
+def run_case(name, repeats=1) -> dict:
+    """
+    Run a case in new processes, so the peak memory is only of this case.
+
+    :param name: The name of the case.
+    :param repeats: (Optional) how many times to run it. The shortest times and the smallest peak memory are kept.
+    :return: Dictionary of the results.
+    """
+    results = None
+
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', name], check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout
+        result = json.loads(output.splitlines()[-1])
+
+        if results is None:
+            results = result
+        else:
+            for field in TIME_FIELDS + ['peak_memory_mb']:
+                results[field] = min(results[field], result[field])
+
+    results['triangles_per_second'] = results['num_triangles'] / results['mesh_time'] if results['mesh_time'] else 0
+    return results
+
+
+def compare(results, baseline, tolerance) -> list:
+    """
+    Compare results with a baseline.
+
+    :param results: Dictionary of the results of each case.
+    :param baseline: Dictionary of the baseline results of each case.
+    :param tolerance: The allowed relative growth of a time.
+    :return: List of the regressions, as strings.
+    """
+    regressions = []
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        for field in TIME_FIELDS + MESH_FIELDS:
+            # A baseline from before the field was added.
+            if field not in baseline[name]:
+                regressions.append('{}: {} is not in the baseline'.format(name, field))
+
+        for field in TIME_FIELDS:
+            old, new = baseline[name].get(field), result[field]
+
+            if old is not None and max(old, new) >= MIN_COMPARED_TIME and new > old * (1 + tolerance):
+                growth = '+{:.0%}'.format(new / old - 1) if old > 0 else 'was 0'
+                regressions.append('{}: {} {:.3f}s -> {:.3f}s ({})'.format(name, field, old, new, growth))
+
+        for field in MESH_FIELDS:
+            if field in baseline[name] and baseline[name][field] != result[field]:
+                regressions.append('{}: {} {} -> {}'.format(name, field, baseline[name][field], result[field]))
+
+    return regressions
+
+
+def print_table(results, baseline):
+    columns = ['load_time', 'grid_time', 'seed_time', 'expand_time', 'mesh_time', 'triangles_per_second',
+               'peak_memory_mb', 'num_triangles', 'num_boundary_edges']
+    print('{:<12}'.format('case') + ''.join('{:>22}'.format(column) for column in columns))
+
+    for name, result in results.items():
+        row = '{:<12}'.format(name)
+
+        for column in columns:
+            value = '{:.3f}'.format(result[column]) if isinstance(result[column], float) else str(result[column])
+
+            if name in baseline and column in TIME_FIELDS and baseline[name].get(column, 0) > 0:
+                value += ' ({:+.0%})'.format(result[column] / baseline[name][column] - 1)
+
+            row += '{:>22}'.format(value)
+
+        print(row)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == '--child':
+        print(json.dumps(measure(sys.argv[2])))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description='Benchmark the reconstruction.')
+    parser.add_argument('cases', nargs='*', help="names of cases, or 'all' (default: the cases up to 10^5 points)")
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative growth of times')
+    parser.add_argument('--repeats', type=int, default=1, help='runs of each case, the best results are kept')
+    args = parser.parse_args()
+
+    names = list(CASES) if args.cases == ['all'] else args.cases or DEFAULT_CASES
+    unknown = [name for name in names if name not in CASES]
+
+    if unknown:
+        parser.error('unknown cases {}, expected some of {}'.format(unknown, list(CASES)))
+
+    baseline = {}
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+
+    for name in names:
+        results[name] = run_case(name, args.repeats)
+        print('{}: {:.2f}s, {} triangles'.format(name, results[name]['mesh_time'], results[name]['num_triangles']),
+              file=sys.stderr)
+
+    print_table(results, baseline)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results}, f,
+                      indent=2)
+
+    regressions = compare(results, baseline, args.tolerance)
+
+    for regression in regressions:
+        print('Regression: ' + regression)
+
+    sys.exit(1 if regressions else 0)
@@ -1,65 +1,161 @@
 from typing import List, Tuple
 from tqdm import tqdm
+import os
+import time
 import numpy as np
 
 from grid import Grid
 from point import Point
+from point_cloud import PointCloud
 from edge import Edge
+from front import Front
 from visualizer import Visualizer
+import loader
+import checkpoint
+import instrumentation
+import kernels
+import mesh_io
+import normal_estimation
+import parallel
+import point_cache
 import utils
 
 INFINITY = np.inf
 
+# The criteria for accepting a triangle:
+# 'incircle' - a ball with the radius can be fitted inside the triangle.
+# 'pivot' - a ball with the radius touches the triangle's points without containing any other point, and the expanded
+# triangles are found by pivoting the ball around the edges.
+MODES = ('incircle', 'pivot')
+
+# The incircle criteria doesn't limit the size of a triangle, so its candidates are the nearest points rather than the
+# points at distance of 2r. The grid's cells grow until they hold that many points on average.
+INCIRCLE_POINTS_PER_CELL = 4
+
+# The number of nearest candidates tried for each edge of the front. If none of them makes a valid triangle, the edge
+# stays on the boundary. The candidates are validated together (see validate_candidates), so raising it costs little.
+LIMIT_POINTS = 5
+
+# The number of candidates validated together. Usually one of the first candidates makes a triangle, so they are not
+# all validated at once.
+CANDIDATES_CHUNK_SIZE = 8
+
+# The methods whose calls and time are measured when the stats are on (see BPA's stats argument), and their timers. The
+# timers nest: 'expansion' includes the candidates' gathering and validation, and the visualization of a new triangle.
+PHASE_TIMERS = {'find_seed_triangle': 'seed_search', 'expand_triangle': 'expansion', 'add_triangles': 'merge_blocks',
+                'write_new_triangles': 'writing'}
+
+# The names of the counters of candidates rejected by kernels.check_candidates, by its reasons.
+REJECTION_COUNTERS = {kernels.REJECTED_SAME_POINT: 'rejected_same_point', kernels.REJECTED_OVERLAP: 'rejected_overlap',
+                      kernels.REJECTED_ANGLE: 'rejected_angle'}
+
+def sort_by_height(points) -> List[Point]:
+    # Sort points by their z, and points of the same height by their ids. The points come from a set, whose order isn't
+    # the same in every run, so without the ids the order of a triangle's points could change between runs.
+    return sorted(points, key=lambda p: (p.z, p.id))
+
+
 class BPA:
-    def __init__(self, path, radius, visualizer=False, num_workers=1):
-        self.first_free_point_index = 0
+    def __init__(self, path, radius, visualizer=False, num_workers=1, cloud=None, cache=False, index='auto',
+                 limit_points=LIMIT_POINTS, frames_dir=None, stats=False, profile=None,
+                 normals_neighbors=normal_estimation.NUM_NEIGHBORS):
+        """
+        :param path: The path to the text file of the points, or to a point cache file (see point_cache.py).
+        :param radius: The ball's radius.
+        :param visualizer: (Optional) whether to visualize the algorithm's progress.
+        :param num_workers: (Optional) number of processes to reconstruct the mesh with.
+        :param cloud: (Optional) a point cloud to use instead of reading the points from path.
+        :param cache: (Optional) if True, the points are loaded from a binary cache next to the text file, which is
+        created (or refreshed, if the text file changed) when needed.
+        :param index: (Optional) the spatial index for finding the points around a point, one of
+        spatial_index.INDEX_TYPES: 'grid', 'kdtree', or 'auto' to pick by the density of the points (only in 'pivot'
+        mode, in 'incircle' mode it's the grid).
+        :param limit_points: (Optional) the number of candidates tried for each edge of the front.
+        :param frames_dir: (Optional) record the algorithm's progress as PNG frames in this directory, without a window
+        (see Visualizer).
+        :param stats: (Optional) whether to count and time the phases of the algorithm, and the candidates it rejected
+        by the reasons, in self.stats (see instrumentation.py).
+        :param profile: (Optional) a profiler to run in create_mesh, one of instrumentation.PROFILERS: 'cprofile' or
+        'sampling'. Its results are added to the stats (it turns them on).
+        :param normals_neighbors: (Optional) the number of neighbors the normals of points without normals are
+        estimated from (see estimate_normals).
+        """
+        self.first_free_point_index = 0  # Cursor for the seed search, all points before it are not free.
         self.num_points_i_tried_to_seed_from = 0
-        self.points = self.read_points(path)
+        cells_radius = None
+
+        if cloud is None and point_cache.is_cache_file(path):
+            cloud, cells_radius = point_cache.open_cache(path)
+        elif cloud is None and cache and point_cache.is_cache_valid(point_cache.get_cache_path(path), path):
+            cloud, cells_radius = point_cache.open_cache(point_cache.get_cache_path(path))
+
+        self.cloud = cloud if cloud is not None else self.read_points(path)
+        self.points = self.cloud.points
+        self.kernel_coordinates = kernels.as_kernel_array(self.cloud.coordinates)
+        self.kernel_normals = kernels.as_kernel_array(self.cloud.normals)
+        self.exhausted_points = np.zeros(len(self.points), dtype=bool)  # Points that have no seed triangle.
         self.radius = radius
-        self.grid = Grid(points=self.points, radius=radius)
-        self.num_free_points = len(self.points)
-        self.visualizer = None
+        self.grid = Grid(points=self.points, radius=radius, use_cell_codes=cells_radius == radius, index_type=index)
         self.num_workers = num_workers
 
-        if visualizer is True:
-            self.visualizer = Visualizer(self.points)
+        if self.cloud.normals is None or np.isnan(self.cloud.normals).any():
+            self.estimate_normals(normals_neighbors)
 
-    def read_points(self, path: str) -> List:
+        if cache and not point_cache.is_cache_file(path) and cells_radius != radius:
+            # Save the points with their cells for this radius, so the next run can skip both.
+            point_cache.write_cache(point_cache.get_cache_path(path), self.cloud, radius=radius, source_path=path)
+        self.num_free_points = len(self.points)
+        self.visualizer = None
+        self.limit_points = limit_points
+        self.mesh_writer = None  # Writes the triangles to a file while the mesh is created (see create_mesh).
+        self.num_written_triangles = 0
+        self.checkpoint_path = None  # Where create_mesh saves its state every checkpoint_interval seconds.
+        self.checkpoint_interval = checkpoint.CHECKPOINT_INTERVAL
+        self.last_checkpoint_time = 0
+        self.run_state = {}  # The passes of the running create_mesh, saved with the checkpoints.
+        self.num_iterations = 0  # The iterations the last create_mesh took (of limit_iterations).
+        self.mode = 'incircle'
+        self.front = Front(self.grid)
+
+        # When there are no stats this is None, and the algorithm only checks that.
+        self.stats = instrumentation.Stats(profile=profile) if stats or profile is not None else None
+
+        if frames_dir is not None:
+            self.visualizer = Visualizer(self.cloud, frames_dir=frames_dir)
+        elif visualizer is True:
+            self.visualizer = Visualizer(self.cloud)
+
+    def read_points(self, path: str) -> PointCloud:
         """
         Read the points from a text file.
 
         :param path: The path to the text file.
-        :return: A list with the points.
+        :return: A point cloud with the points.
         """
-        points = []
-        f = open(path, "r")
-        lines = f.read().splitlines()
-
-        for i, line in enumerate(lines):
-            coordinates = line.split()
-
-            if len(coordinates) is 3:
-                p = Point(float(coordinates[0]), float(coordinates[1]), float(coordinates[2]), id=i)
-                points.append(p)
-
-            elif len(coordinates) is 6:
-                p = Point(float(coordinates[0]), float(coordinates[1]), float(coordinates[2]), id=i)
-                normal = [float(coordinates[3]), float(coordinates[4]), float(coordinates[5])]
-                p.normal = normal
-                points.append(p)
+        coordinates, normals = loader.load_points(path)
+        cloud = PointCloud(coordinates, normals=normals)
 
-            else:
-                continue
+        # Sorting the points can lead to better seed triangle picking
+        cloud.sort_lexicographic()
+        return cloud
 
-        f.close()
+    def estimate_normals(self, num_neighbors=normal_estimation.NUM_NEIGHBORS):
+        """
+        Estimate the normals of the points that have no normal, from their nearest neighbors in the grid's index (see
+        normal_estimation.py). If some points have normals, the estimated ones are oriented by them.
 
-        # Sorting the points can lead to better seed triangle picking
-        sorted_points = sorted(points, key=lambda p: (p.x, p.y, p.z))
+        :param num_neighbors: (Optional) the number of neighbors of each point.
+        :return: None.
+        """
+        known = self.cloud.normals
+        normals = normal_estimation.estimate_normals(self.cloud.coordinates, num_neighbors, index=self.grid.index,
+                                                     num_workers=self.num_workers, reference=known)
 
-        for i, p in enumerate(sorted_points):
-            p.id = i
+        if known is not None:
+            normals = np.where(np.isnan(known), normals, known)
 
-        return sorted_points
+        self.cloud.normals = np.ascontiguousarray(normals, dtype=np.float32)
+        self.kernel_normals = kernels.as_kernel_array(self.cloud.normals)
 
     @staticmethod
     def get_points_distances_from_edge(points: List, p1: Point, p2: Point) -> list:
@@ -104,182 +200,548 @@ class BPA:
 
         return third_point
 
-    @staticmethod
-    def will_triangles_overlap(edge: Edge, p3: Point, p4: Point) -> bool:
+    def will_triangles_overlap(self, edge: Edge, p3: Point, p4: Point) -> bool:
         """
         Check if a triangle defined by the 2 points of "edge" and a point p3, will overlap  a triangle defined by
         2 points of "edge" and a point p4.
 
         :return: Boolean.
         """
-        p1, p2 = edge.p1, edge.p2
+        # Check if p3 is on the same side of the edge as p4 (the third point of the triangle we are expanding). If so -
+        # keep searching, so we won't have overlapping triangles in the mesh.
+        return kernels.will_triangles_overlap(self.kernel_coordinates, edge.p1.id, edge.p2.id, p3.id, p4.id)
+
+    def create_mesh(self,  limit_iterations: int = INFINITY, first_point_index: int = 0, mode: str = 'incircle',
+                    radii: List[float] = None, priority: str = 'fifo', output: str = None, stats_output: str = None,
+                    checkpoint_path: str = None, checkpoint_interval: float = checkpoint.CHECKPOINT_INTERVAL,
+                    resume: bool = False):
+        """
+        Create mesh from the points.
+
+        :param limit_iterations: (Optional) number of iterations to limit the algorithm's run. With num_workers > 1
+        the blocks share it, and the stitching of the blocks gets what they left (see parallel.split_iterations).
+        :param first_point_index: First index the algorithm will try to find seed triangle from.
+        :param mode: (Optional) the criteria for accepting a triangle, one of MODES. 'pivot' is the actual ball
+        pivoting, 'incircle' is the original (faster, less accurate) criteria.
+        :param radii: (Optional) list of radii to run the algorithm with, one after the other. Each pass continues from
+        the mesh of the previous one: it first tries to expand the boundary edges left by the previous pass, and then
+        looks for new seeds. The grid is re-binned for each radius, the points are not read again. If not given, a
+        single pass with the current radius is done.
+        :param priority: (Optional) the order the edges of the front are pivoted around, one of front.PRIORITIES:
+        'fifo' (in the order they were created) or 'shortest' (shortest edge first).
+        :param output: (Optional) path of a mesh file (.obj, .ply or .stl, see mesh_io.py) the triangles are written to
+        while the mesh is created, in chunks of mesh_io.MESH_CHUNK_SIZE triangles. The file holds the whole mesh, also
+        the triangles of previous calls.
+        :param stats_output: (Optional) path of a JSON file to write the stats to at the end (see BPA's stats argument).
+        :param checkpoint_path: (Optional) path of a file the state of the run is saved to (see checkpoint.py), every
+        checkpoint_interval seconds and at the end.
+        :param checkpoint_interval: (Optional) seconds between checkpoints.
+        :param resume: (Optional) if the checkpoint file exists, continue the run it was saved from instead of starting
+        over. The arguments must be the ones the run was started with, and the mesh is the same as if the run was never
+        stopped (limit_iterations counts the iterations before the checkpoint too).
+        :return: None
+        """
+        if mode not in MODES:
+            raise ValueError("Unknown mode '{}', expected one of {}".format(mode, MODES))
+
+        if radii is None:
+            radii = [self.radius]
+
+        self.front = Front(self.grid, priority)
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.last_checkpoint_time = time.perf_counter()
+        self.run_state = {'mode': mode, 'priority': priority, 'requested_radii': list(radii), 'radii': list(radii),
+                          'pass_index': 0, 'first_point_index': first_point_index}
+        is_resumed = resume and checkpoint_path is not None and os.path.exists(checkpoint_path)
+
+        if is_resumed:
+            tried_to_expand_counter = self.load_checkpoint(checkpoint_path)
+            radii = self.run_state['radii']
+        else:
+            tried_to_expand_counter = 0
+
+        if self.stats is not None:
+            self.start_instrumentation()
+
+        try:
+            self.mode = mode
+            min_points_per_cell = INCIRCLE_POINTS_PER_CELL if mode == 'incircle' else 0
+
+            if self.grid.min_points_per_cell != min_points_per_cell:
+                self.grid.min_points_per_cell = min_points_per_cell
+                self.grid.set_radius(self.radius)
+
+            # Points that had no seed triangle in a previous pass might have one with a different radius.
+            reset_exhausted_points = True
+
+            if output is not None:
+                # Each chunk of triangles leaves a valid file, so if the run is stopped the mesh so far is kept.
+                self.mesh_writer = mesh_io.open_writer(output, self.cloud.coordinates, normals=self.cloud.normals)
+                self.num_written_triangles = 0
+
+            if self.num_workers > 1 and len(self.grid.triangles) == 0 and not is_resumed:
+                # Reconstruct the blocks of the cloud in parallel with all the radii. Then stitch them together with a
+                # single pass of the last radius, which only retries seeds near the blocks boundaries. The blocks share
+                # limit_iterations, and the stitching gets what they left of it.
+                start = time.perf_counter()
+                bpa_kwargs = {'radius': radii[0], 'index': self.grid.index_type, 'limit_points': self.limit_points}
+                mesh_kwargs = {'limit_iterations': limit_iterations, 'mode': mode, 'radii': radii, 'priority': priority}
+                triangles, closing_edges, exhausted_points, tried_to_expand_counter = parallel.reconstruct_in_parallel(
+                    self.cloud, self.num_workers, bpa_kwargs=bpa_kwargs, mesh_kwargs=mesh_kwargs)
+
+                if self.stats is not None:
+                    self.stats.add_time('parallel_blocks', start)
+
+                self.add_triangles(triangles, closing_edges)
+                self.exhausted_points[:] = exhausted_points
+                reset_exhausted_points = False
+                radii = radii[-1:]
+                self.run_state['radii'] = list(radii)
+
+            with tqdm(total=limit_iterations, initial=tried_to_expand_counter) as pbar:
+                for pass_index in range(self.run_state['pass_index'], len(radii)):
+                    radius = radii[pass_index]
+                    self.run_state['pass_index'] = pass_index
+
+                    if radius != self.radius:
+                        self.set_radius(radius)
+
+                    if is_resumed:
+                        # The pass was already started, its front and seed cursor are the checkpoint's.
+                        is_resumed = False
+                    else:
+                        if len(self.grid.edges) > 0:
+                            if reset_exhausted_points:
+                                self.exhausted_points[:] = False
+
+                            # Continue from the front the previous pass (or the parallel reconstruction) left.
+                            self.front.activate_boundary()
 
-        # The following section checks if p3 is the same side of the edge as the third point of the rectangle
-        # we are expanding. If so - keep searching, so we won't have overlapping triangles in the mesh.
-        # Calculate the normal of the triangle
-        v1 = [p3.x - p1.x, p3.y - p1.y, p3.z - p1.z]
-        v2 = [p2.x - p1.x, p2.y - p1.y, p2.z - p1.z]
-        triangle_normal = np.cross(v1, v2)
+                        reset_exhausted_points = True
+                        self.first_free_point_index = first_point_index
 
-        # Calculate the normal to the plane defined by v2 and the triangle_normal (the plane orthogonal to
-        # the triangle).
-        plane_normal = np.cross(v2, triangle_normal)
+                    while tried_to_expand_counter < limit_iterations:
+                        # Grow the mesh until the front is empty, and only then look for a new seed.
+                        tried_to_expand_counter = self.expand_front(tried_to_expand_counter, limit_iterations, pbar)
 
-        # Check if p3 is in the same side of the plane as the third point.
-        v3 = [p4.x - p1.x, p4.y - p1.y, p4.z - p1.z]
+                        if tried_to_expand_counter >= limit_iterations:
+                            break
 
-        return np.sign(np.dot(plane_normal, v1)) == np.sign(np.dot(plane_normal, v3))
+                        # Find a seed triangle.
+                        _, edges, _ = self.find_seed_triangle()
 
-    def create_mesh(self,  limit_iterations: int = INFINITY, first_point_index: int = 0):
+                        if edges is None:
+                            break
+
+                        if self.visualizer is not None:
+                            self.visualizer.update(self.grid, color='red')
+
+                        tried_to_expand_counter += 1
+                        pbar.update(1)
+
+                        for edge in edges:
+                            self.front.push(edge)
+
+                        self.write_new_triangles()
+
+                        if self.checkpoint_path is not None:
+                            self.save_checkpoint_if_due(tried_to_expand_counter)
+
+            self.num_iterations = tried_to_expand_counter
+
+            if self.checkpoint_path is not None:
+                self.save_checkpoint(self.checkpoint_path, tried_to_expand_counter)
+                self.checkpoint_path = None
+
+            if self.mesh_writer is not None:
+                self.write_new_triangles(force=True)
+        finally:
+            # Also when the run is stopped, so the next run starts clean.
+            if self.mesh_writer is not None:
+                self.mesh_writer.close()
+                self.mesh_writer = None
+
+            if self.stats is not None:
+                self.stop_instrumentation()
+
+        if self.stats is not None and stats_output is not None:
+            self.stats.save(stats_output)
+
+    def start_instrumentation(self):
         """
-        Create mesh from the points.
+        Start measuring the phases of create_mesh (see PHASE_TIMERS), and the profiler. The methods are wrapped on this
+        object only while it runs, so without the stats they have nothing added to them.
 
-        :param limit_iterations: (Optional) number of iterations to limit the algorithm's run.
-        :param first_point_index: First index the algorithm will try to find seed triangle from.
-        :return: None
+        :return: None.
         """
-        tried_to_expand_counter = 0
+        for method, timer in PHASE_TIMERS.items():
+            setattr(self, method, self.stats.timed(timer, getattr(self, method)))
 
-        with tqdm(total=limit_iterations) as pbar:
-            while 1 and tried_to_expand_counter < limit_iterations:
-                # Find a seed triangle.
-                _, edges, last_point_index = self.find_seed_triangle(first_point_index=first_point_index)
-                first_point_index = last_point_index
+        if self.visualizer is not None:
+            self.visualizer.update = self.stats.timed('visualization', self.visualizer.update)
 
-                if edges is None or edges is -1:
-                    return
+        self.stats.count('triangles', -len(self.grid.triangles))
+        self.create_mesh_start_time = time.perf_counter()
+        self.stats.start_profile()
 
-                if self.visualizer is not None:
-                    self.visualizer.update(edges=self.grid.edges, grid_triangles=self.grid.triangles, color='red')
+    def stop_instrumentation(self):
+        self.stats.stop_profile()
+        self.stats.add_time('create_mesh', self.create_mesh_start_time)
+        self.stats.count('triangles', len(self.grid.triangles))
 
-                tried_to_expand_counter += 1
-                pbar.update(1)
-                i = 0
+        for method in PHASE_TIMERS:
+            delattr(self, method)
 
-                # Try to expand from each edge.
-                while i < len(edges) and tried_to_expand_counter < limit_iterations:
-                    e1, e2 = self.expand_triangle(edges[i], edges)
-                    tried_to_expand_counter += 1
-                    pbar.update(1)
+        if self.visualizer is not None:
+            del self.visualizer.update
 
-                    if e1 is not None and e2 is not None:
-                        edges = [e1, e2]
-                        i = 0
+    def expand_front(self, tried_to_expand_counter: int, limit_iterations: int, pbar) -> int:
+        """
+        Pivot the ball around the edges of the front, until the front is empty. Each new triangle adds its new edges to
+        the front, and an edge the ball can't pivot around stays on the boundary of the mesh.
 
-                        if self.visualizer is not None:
-                            if tried_to_expand_counter >= limit_iterations:
-                                self.visualizer.update(edges=self.grid.edges, grid_triangles=self.grid.triangles,
-                                                       color='blue')
-                            else:
-                                self.visualizer.update(edges=self.grid.edges, grid_triangles=self.grid.triangles,
-                                                       color='green')
+        :param tried_to_expand_counter: Number of iterations done so far.
+        :param limit_iterations: Number of iterations to limit the algorithm's run.
+        :param pbar: The progress bar.
+        :return: Number of iterations done so far.
+        """
+        while tried_to_expand_counter < limit_iterations:
+            edge = self.front.pop()
+
+            if edge is None:
+                break
+
+            e1, e2 = self.expand_triangle(edge, self.get_triangle_edges(edge))
+            tried_to_expand_counter += 1
+            pbar.update(1)
+
+            if e1 is not None and e2 is not None:
+                # The edge is in two triangles now, so pushing it freezes it.
+                for new_edge in (edge, e1, e2):
+                    self.front.push(new_edge)
+
+                self.write_new_triangles()
+
+                if self.visualizer is not None:
+                    if tried_to_expand_counter >= limit_iterations:
+                        self.visualizer.update(self.grid, color='blue')
                     else:
-                        i += 1
+                        self.visualizer.update(self.grid, color='green')
+
+            if self.checkpoint_path is not None:
+                self.save_checkpoint_if_due(tried_to_expand_counter)
+
+        return tried_to_expand_counter
 
-    def find_seed_triangle(self, first_point_index=0, num_recursion_calls=0) -> (int, Tuple):
+    def get_saved_state(self) -> dict:
         """
-        Find seed triangle.
+        Get the state of the reconstruction, to save it in a checkpoint: the points flags, the mesh, the front, the seed
+        cursor and the passes of the run.
 
-        :param first_point_index: First index the algorithm will try to find seed triangle from.
-        :param num_recursion_calls: Number of recursion calls for the recursion stop condition. You should not pass to
-        this function anything beside 0 in this parameter.
+        :return: Dictionary of arrays and scalars.
+        """
+        state = {'num_points': len(self.points),
+                 'fingerprint': checkpoint.get_cloud_fingerprint(self.cloud.coordinates),
+                 'used': np.packbits(self.cloud.used), 'exhausted_points': np.packbits(self.exhausted_points),
+                 'first_free_point_index': self.first_free_point_index,
+                 'num_points_i_tried_to_seed_from': self.num_points_i_tried_to_seed_from,
+                 'mode': self.run_state['mode'], 'priority': self.run_state['priority'],
+                 'requested_radii': np.array(self.run_state['requested_radii'], dtype=np.float64),
+                 'radii': np.array(self.run_state['radii'], dtype=np.float64),
+                 'pass_index': self.run_state['pass_index'],
+                 'first_point_index': self.run_state['first_point_index']}
+        state.update(self.grid.get_mesh_state())
+        state.update(self.front.get_saved_state())
+        return state
+
+    def save_checkpoint(self, path: str, tried_to_expand_counter: int = 0):
+        """
+        Save the state of the reconstruction (see checkpoint.py).
+
+        :param path: The path to the file.
+        :param tried_to_expand_counter: (Optional) number of iterations done so far.
         :return: None.
         """
-        if num_recursion_calls > len(self.points):
-            print("i was here")
-            return -1, -1, -1
+        state = self.get_saved_state()
+        state['tried_to_expand_counter'] = tried_to_expand_counter
+        checkpoint.save_checkpoint(path, state)
+        self.last_checkpoint_time = time.perf_counter()
 
-        # Find a free point.
-        #while first_point_index < len(self.points)-1 and self.points[first_point_index].is_used:
-        #    first_point_index += 1
+    def save_checkpoint_if_due(self, tried_to_expand_counter: int):
+        if time.perf_counter() - self.last_checkpoint_time >= self.checkpoint_interval:
+            self.save_checkpoint(self.checkpoint_path, tried_to_expand_counter)
 
-        if first_point_index >= len(self.points) - 1:
-            first_point_index = 0
+    def load_checkpoint(self, path: str) -> int:
+        """
+        Restore the state of the reconstruction from a checkpoint. The run must have the points and the arguments the
+        checkpoint was saved with (self.run_state is set by create_mesh).
 
-        p1 = self.points[first_point_index]
-        p1_neighbor_points = []
+        :param path: The path to the file.
+        :return: Number of iterations done before the checkpoint.
+        """
+        state = checkpoint.load_checkpoint(path)
 
-        # Find all points in 2r distance from that point.
-        for cell in p1.neighbor_nodes:
-            p1_neighbor_points.extend(self.grid.get_cell_points(cell))
+        if state['num_points'] != len(self.points) or \
+                state['fingerprint'] != checkpoint.get_cloud_fingerprint(self.cloud.coordinates):
+            raise ValueError("Checkpoint {} was saved with different points".format(path))
 
-        # TODO: Don't know why it appends all points twice in the previous loop?
-        p1_neighbor_points = set(p1_neighbor_points)
+        requested = {'mode': state['mode'], 'priority': state['priority'],
+                     'requested_radii': state['requested_radii'].tolist(),
+                     'first_point_index': state['first_point_index']}
 
-        # Sort points by distance from p1.
-        dists = [utils.calc_distance_points(p1, p2) for p2 in p1_neighbor_points]
-        p1_neighbor_points = [x for _, x in sorted(zip(dists, p1_neighbor_points))]
+        for name, value in requested.items():
+            if self.run_state[name] != value:
+                raise ValueError("Checkpoint {} was saved with {}={}, not {}".format(path, name, value,
+                                                                                   self.run_state[name]))
+
+        self.run_state.update(radii=state['radii'].tolist(), pass_index=state['pass_index'])
+        self.cloud.used[:] = np.unpackbits(state['used'], count=len(self.points)).astype(bool)
+        self.exhausted_points[:] = np.unpackbits(state['exhausted_points'], count=len(self.points)).astype(bool)
+        self.first_free_point_index = state['first_free_point_index']
+        self.num_points_i_tried_to_seed_from = state['num_points_i_tried_to_seed_from']
+        self.grid.set_mesh_state(state)
+        self.front.set_saved_state(state)
+
+        if self.visualizer is not None:
+            self.visualizer.update(self.grid, color='red')
+
+        return state['tried_to_expand_counter']
+
+    def add_triangles(self, triangles, closing_edges=()):
+        """
+        Add triangles to the mesh, and mark their points as used.
+
+        :param triangles: Array of shape (T, 3) of the points indices of each triangle.
+        :param closing_edges: (Optional) array of shape (E, 2) of the points indices of edges that closed a loop in the
+        mesh when they were created.
+        :return: None.
+        """
+        for triangle in triangles:
+            triangle = [self.points[i] for i in triangle]
+
+            for i in range(3):
+                p1, p2 = triangle[i], triangle[(i + 1) % 3]
+
+                if not self.grid.are_connected(p1, p2):
+                    self.grid.add_edge(Edge(p1, p2))
+
+                p1.is_used = True
+
+            self.grid.add_triangle(triangle)
+
+        for i1, i2 in closing_edges:
+            self.grid.mark_closing_edge(self.grid.get_edge(self.points[i1], self.points[i2]))
+
+        if self.visualizer is not None:
+            self.visualizer.update(self.grid, color='red')
+
+    def get_triangles_array(self, start: int = 0, end: int = None) -> np.ndarray:
+        """
+        Get the triangles of the mesh as an array of the points indices. Each triangle's vertices are ordered so its
+        normal agrees with the normal of its first point.
+
+        :param start: (Optional) index of the first triangle.
+        :param end: (Optional) index after the last triangle. Defaults to all the triangles.
+        :return: Array of shape (T, 3).
+        """
+        triangles = self.grid.get_triangles_array()[start:end].astype(np.int64)
+
+        if self.cloud.normals is not None and len(triangles) > 0:
+            # Only the triangles' points are converted, not the whole cloud.
+            p1, p2, p3 = (self.cloud.coordinates[triangles[:, k]].astype(np.float64) for k in range(3))
+            normals = utils.cross(p2 - p1, p3 - p1)
+            flip = np.einsum('ij,ij->i', normals, self.cloud.normals[triangles[:, 0]]) < 0
+            triangles[flip] = triangles[flip][:, ::-1]
+
+        return triangles
+
+    def write_new_triangles(self, force: bool = False):
+        """
+        Write the triangles that were added since the last write to the mesh file, once there are enough of them.
+
+        :param force: (Optional) write them even if there are only a few.
+        :return: None.
+        """
+        if self.mesh_writer is None:
+            return
+
+        num_new_triangles = len(self.grid.triangles) - self.num_written_triangles
+
+        if num_new_triangles >= mesh_io.MESH_CHUNK_SIZE or (force and num_new_triangles > 0):
+            self.mesh_writer.write_triangles(self.get_triangles_array(self.num_written_triangles))
+            self.num_written_triangles = len(self.grid.triangles)
+
+    def save_mesh(self, path: str, binary: bool = True):
+        """
+        Save the mesh to a file.
+
+        :param path: The path to the file, .obj, .ply or .stl (see mesh_io.py).
+        :param binary: (Optional) for PLY files, whether to write a binary or an ASCII file.
+        :return: None.
+        """
+        mesh_io.write_mesh(path, self.cloud.coordinates, self.get_triangles_array(), normals=self.cloud.normals,
+                           binary=binary)
+
+    def set_radius(self, radius: float):
+        """
+        Change the ball's radius. The grid is re-binned in place, the mesh built so far is kept.
+
+        :param radius: The new radius.
+        :return: None.
+        """
+        self.radius = radius
+        self.grid.set_radius(radius)
+
+    def get_boundary_edges(self) -> List[Edge]:
+        """
+        Get all edges of the mesh that are in a single triangle.
+
+        :return: List of edges.
+        """
+        return [edge for edge in self.grid.edges if self.grid.get_num_triangles(edge) < 2]
+
+    def get_triangle_edges(self, edge: Edge) -> List[Edge]:
+        """
+        Get the edges of a triangle an edge is in, starting with the edge itself.
+
+        :param edge: The edge.
+        :return: List of the triangle's edges.
+        """
+        triangles = self.find_triangles_by_edge(edge)
+
+        if len(triangles) == 0:
+            return [edge]
+
+        p1, p2, p3 = triangles[0]
+        return [edge, self.grid.get_edge(p1, p3), self.grid.get_edge(p2, p3)]
+
+    def find_next_free_point(self):
+        """
+        Advance the seed cursor to the next point that is not used and that wasn't already found to have no seed
+        triangle. Points are only ever marked as used or exhausted, so the cursor never has to go back, and finding all
+        seeds scans the points once.
+
+        :return: The index of the point, or None if there are no free points left.
+        """
+        CHUNK_SIZE = 1024
+        start = self.first_free_point_index
+
+        while start < len(self.points):
+            end = min(start + CHUNK_SIZE, len(self.points))
+            free = np.flatnonzero(~(self.cloud.used[start:end] | self.exhausted_points[start:end]))
+
+            if len(free) > 0:
+                self.first_free_point_index = start + int(free[0])
+                return self.first_free_point_index
+
+            start = end
+
+        self.first_free_point_index = len(self.points)
+        return None
+
+    def find_seed_triangle(self, first_point_index=None) -> (int, Tuple):
+        """
+        Find seed triangle. Tries the free points one after the other, starting from the seed cursor.
+
+        :param first_point_index: (Optional) first index the algorithm will try to find seed triangle from. If not
+        given, continues from where the last search stopped.
+        :return: 1, the seed triangle's edges and the index of the point it was found from. If there are no more seed
+        triangles, -1, None, -1.
+        """
+        if first_point_index is not None:
+            self.first_free_point_index = first_point_index
+
+        while 1:
+            first_point_index = self.find_next_free_point()
+
+            if first_point_index is None:
+                return -1, None, -1
 
+            edges = self.find_seed_triangle_from_point(self.points[first_point_index])
+
+            if edges is not None:
+                return 1, edges, first_point_index
+
+            # The point's neighborhood is exhausted, never try it again.
+            self.exhausted_points[first_point_index] = True
+
+    def find_seed_triangle_from_point(self, p1: Point) -> Tuple:
+        """
+        Find seed triangle that one of its points is p1.
+
+        :param p1: The point.
+        :return: The seed triangle's edges, or None if there is no such triangle.
+        """
+        self.num_points_i_tried_to_seed_from += 1
+
+        if self.stats is not None:
+            self.stats.count('seed_points_tried')
+
+        # Find all points in 2r distance from that point.
+        p1_neighbor_points = self.grid.get_neighbor_points_ids(p1)
+
+        # Sort points by distance from p1.
         # For better performance. If we couldn't find a close point to expand to, it's better just to find new
         # seed than getting a far point.
         LIMIT_POINTS = 6
-        p1_neighbor_points = p1_neighbor_points[:LIMIT_POINTS]
+        p1_neighbor_points = utils.sort_points_by_distance(self.cloud.coordinates, p1_neighbor_points, [p1.id],
+                                                           limit=LIMIT_POINTS)
+        p1_neighbor_points = [self.points[i] for i in p1_neighbor_points]
 
         # For each other point, find all points that are in 2r distance from that other point.
         for p2 in p1_neighbor_points:
             if p2.is_used:
-                #continue
-                pass
+                continue
 
             if p2.x == p1.x and p2.y == p1.y and p2.z == p1.z:
                 continue
 
             # Find all points that are on 2r distance from p1 and p2
-            intersect_cells = list(set(p1.neighbor_nodes) & set(p2.neighbor_nodes))
-            possible_points = []
-
-            for cell in intersect_cells:
-                possible_points.extend(self.grid.get_cell_points(cell))
-
-            # Sort points by distance from p2.
-            dists_p2 = [utils.calc_distance_points(p2, p3) for p3 in possible_points]
-            dist_p1 = [utils.calc_distance_points(p1, p3) for p3 in possible_points]
-            dists = [dist_p1[i] + dists_p2[i] for i in range(len(dist_p1))]
-            possible_points = [x for _, x in sorted(zip(dists, possible_points))]
+            possible_points = self.grid.get_common_neighbor_points_ids(p1, p2)
 
+            # Sort points by distance from p1 and p2.
             # For better performance. If we couldn't find a close point to expand to, it's better just to find new
             # seed than getting a far point.
             LIMIT_POINTS = 5
-            possible_points = possible_points[:LIMIT_POINTS]
+            possible_points = utils.sort_points_by_distance(self.cloud.coordinates, possible_points, [p1.id, p2.id],
+                                                            limit=LIMIT_POINTS)
+            possible_points = [self.points[i] for i in possible_points]
+
+            if self.stats is not None:
+                self.stats.count('seed_candidates', len(possible_points))
 
             for i, p3 in enumerate(possible_points):
                 if p3.is_used:
-                    #continue
-                    pass
+                    if self.stats is not None:
+                        self.stats.count('seed_rejected_used')
+
+                    continue
 
                 if (p3.x == p1.x and p3.y == p1.y and p3.z == p1.z) or (p2.x == p3.x and p2.y == p3.y and p2.z
                                                                         == p3.z):
                     continue
 
-                # For each three points we got, check if a sphere with a radius of r cant be fitted inside the
-                # triangle.
-                if self.radius <= utils.calc_incircle_radius(p1, p2, p3):
-                    # Calculate triangle's normal.
-                    v1 = [p2.x - p1.x, p2.y - p1.y, p2.z - p1.z]
-                    v2 = [p3.x - p1.x, p3.y - p1.y, p3.z - p1.z]
-                    triangle_normal = np.cross(v1, v2)
-
+                # For each three points we got, check if a sphere with a radius of r can be fitted on the triangle.
+                if self.does_ball_fit(p1, p2, p3):
                     # Check if the normal of the triangle is on the same direction with points normals.
-                    if np.dot(triangle_normal, p1.normal) < 0:
+                    if kernels.triangle_normal_dot(self.kernel_coordinates, self.kernel_normals, p1.id, p2.id, p3.id,
+                                                   p1.id) < 0:
+                        if self.stats is not None:
+                            self.stats.count('seed_rejected_normal')
+
                         continue
 
                     # Check if two of the points are already connected.
-                    p1_and_p3_already_connected = [e for e in self.grid.edges if ((e.p1.id == p1.id)
-                                                                                  and (e.p2.id == p3.id)) or (
-                                                               (e.p1.id == p3.id)
-                                                               and (e.p2.id == p1.id))]
-                    p1_and_p2_already_connected = [e for e in self.grid.edges if ((e.p1.id == p1.id)
-                                                    and (e.p2.id == p2.id)) or ((e.p1.id == p2.id)
-                                                    and (e.p2.id == p1.id))]
-                    p2_and_p3_already_connected = [e for e in self.grid.edges if ((e.p1.id == p2.id)
-                                                    and (e.p2.id == p3.id)) or ((e.p1.id == p3.id)
-                                                    and (e.p2.id == p2.id))]
                     e1 = None
                     e2 = None
                     e3 = None
 
-                    if len(p1_and_p3_already_connected) > 0 or len(p1_and_p2_already_connected) > 0 or\
-                            len(p2_and_p3_already_connected) > 0:
+                    if self.grid.are_connected(p1, p3) or self.grid.are_connected(p1, p2) or \
+                            self.grid.are_connected(p2, p3):
+                        if self.stats is not None:
+                            self.stats.count('seed_rejected_already_connected')
+
                         continue
 
                     # Check if one of the new edges might close another triangle in the mesh.
@@ -292,48 +754,49 @@ class BPA:
 
                     if e1 is None:
                         e1 = Edge(p1, p3)
-                        e1.num_triangles_this_edge_is_in += 1
-
-                        if are_p1_p3_closing_another_triangle_in_the_mesh:
-                            e1.num_triangles_this_edge_is_in += 1
 
                     if e2 is None:
                         e2 = Edge(p1, p2)
-                        e2.num_triangles_this_edge_is_in += 1
-
-                        if are_p1_p2_closing_another_triangle_in_the_mesh:
-                            e2.num_triangles_this_edge_is_in += 1
 
                     if e3 is None:
                         e3 = Edge(p2, p3)
-                        e3.num_triangles_this_edge_is_in += 1
-
-                        if are_p2_p3_closing_another_triangle_in_the_mesh:
-                            e3.num_triangles_this_edge_is_in += 1
 
                     # Get rid of these extreme acute or obtuse triangles.
-                    min_angle, max_angle = utils.calc_min_max_angle_of_triangle(e1, e2, e3)
+                    min_angle, max_angle = self.calc_min_max_angle(e1, e2, e3)
                     if max_angle > 170 or min_angle < 20:
+                        if self.stats is not None:
+                            self.stats.count('seed_rejected_angle')
+
                         continue
 
-                    self.grid.edges.append(e1)
-                    self.grid.edges.append(e2)
-                    self.grid.edges.append(e3)
+                    self.grid.add_edge(e1)
+                    self.grid.add_edge(e2)
+                    self.grid.add_edge(e3)
+
+                    if are_p1_p3_closing_another_triangle_in_the_mesh:
+                        self.grid.mark_closing_edge(e1)
+
+                    if are_p1_p2_closing_another_triangle_in_the_mesh:
+                        self.grid.mark_closing_edge(e2)
 
-                    triangle = sorted(list({e1.p1, e1.p2, e2.p1, e2.p2, e3.p1, e3.p2}))
-                    self.grid.triangles.append(triangle)
+                    if are_p2_p3_closing_another_triangle_in_the_mesh:
+                        self.grid.mark_closing_edge(e3)
 
-                    # Move the points to the end of the list.
-                    self.first_free_point_index += 1
+                    triangle = sort_by_height({e1.p1, e1.p2, e2.p1, e2.p2, e3.p1, e3.p2})
+                    self.grid.add_triangle(triangle)
 
                     p1.is_used = True
                     p2.is_used = True
                     p3.is_used = True
 
-                    return 1, (e1, e2, e3), first_point_index
+                    if self.stats is not None:
+                        self.stats.count('seeds')
 
-        # Else, find another free point and start over.
-        return self.find_seed_triangle(first_point_index=first_point_index+1, num_recursion_calls=num_recursion_calls+1)
+                    return e1, e2, e3
+                elif self.stats is not None:
+                    self.stats.count('seed_rejected_' + self.get_ball_rejection_name())
+
+        return None
 
     def expand_triangle(self, edge: Edge, triangle_edges: List[Edge]) -> (Edge, Edge):
         """
@@ -343,155 +806,343 @@ class BPA:
         :param triangle_edges: All edges of the triangle we are expanding.
         :return: Tuple of two edges of the new formed triangle.
         """
-        if edge.num_triangles_this_edge_is_in < 2:
+        if self.grid.get_num_triangles(edge) < 2:
             # Avoid duplications.
-            intersect_cells = list(set(edge.p1.neighbor_nodes) & set(edge.p2.neighbor_nodes))
-            possible_points = []
-
+            start = time.perf_counter() if self.stats is not None else 0
             p1, p2 = edge.p1, edge.p2
             third_point_of_triangle_we_expand = self.get_third_point_of_triangle(triangle_edges, p1, p2)
-
-            for cell in intersect_cells:
-                possible_points.extend(self.grid.get_cell_points(cell))
-
-            # Sort points by distance from p1 and p2.
-            dists = self.get_points_distances_from_edge(possible_points, p1, p2)
-            sorted_possible_points = [x for _, x in sorted(zip(dists, possible_points))]
+            possible_points = self.grid.get_common_neighbor_points_ids(p1, p2)
 
             # For better performance. If we couldn't find a close point to expand to, it's better just to find new
             # seed than getting a far point.
-            LIMIT_POINTS = 5
-            sorted_possible_points = sorted_possible_points[:LIMIT_POINTS]
+            sorted_possible_points = None
+            centers = None
 
-            for index, p3 in enumerate(sorted_possible_points):
-                if p3.id == p1.id or p3.id == p2.id or p3.id == third_point_of_triangle_we_expand.id:
-                    continue
+            if self.mode == 'pivot':
+                # Sort the points by the order the ball hits them while pivoting around the edge.
+                sorted_possible_points, centers = self.sort_points_by_pivot_angle(possible_points, p1, p2,
+                                                                                  third_point_of_triangle_we_expand,
+                                                                                  limit=self.limit_points)
 
-                if self.will_triangles_overlap(edge, third_point_of_triangle_we_expand, p3):
-                    continue
+            if sorted_possible_points is None:
+                # Sort points by distance from p1 and p2 (the same distance as get_points_distances_from_edge).
+                sorted_possible_points = utils.sort_points_by_distance(self.cloud.coordinates, possible_points,
+                                                                       [p1.id, p2.id], limit=self.limit_points,
+                                                                       decimals=2)
 
-                # If a sphere's radius is smaller than the radius of the incircle of a triangle, the sphere can fit into
-                # the triangle.
-                t = utils.calc_incircle_radius(p1, p2, p3)
-                if self.radius <= utils.calc_incircle_radius(p1, p2, p3):
-                    # Calculate new triangle's normal.
-                    v1 = [p2.x - p1.x, p2.y - p1.y, p2.z - p1.z]
-                    v2 = [p3.x - p1.x, p3.y - p1.y, p3.z - p1.z]
-                    new_triangle_normal = np.cross(v1, v2)
-
-                    # Check if the normal of the triangle is on the same direction with other points normals.
-                    if np.dot(new_triangle_normal, p1.normal) < 0 and np.dot(new_triangle_normal, p2.normal) < 0:
-                        # TODO: Fix this! need to check if the vertices order is anti-clockwise, and if so, change the
-                        #  vector order.
-                        pass
+            # The geometric checks don't depend on the mesh, so they are done for the candidates in batches. Only the
+            # candidates that pass them are checked against the mesh, in order.
+            sorted_possible_points = np.asarray(sorted_possible_points, dtype=np.int64)
 
-                    e1 = None
-                    e2 = None
+            if self.stats is not None:
+                self.stats.add_time('gather_candidates', start)
 
-                    p1_and_p3_already_connected = [e for e in self.grid.edges if ((e.p1.id == p1.id)
-                                                       and (e.p2.id == p3.id)) or ((e.p1.id == p3.id)
-                                                       and (e.p2.id == p1.id))]
-                    p2_and_p3_already_connected = [e for e in self.grid.edges if ((e.p1.id == p2.id)
-                                                       and (e.p2.id == p3.id)) or ((e.p1.id == p3.id)
-                                                       and (e.p2.id == p2.id))]
+            for p3, flip_triangle in self.iter_valid_candidates(p1, p2, third_point_of_triangle_we_expand,
+                                                                sorted_possible_points, centers):
+                e1 = None
+                e2 = None
 
-                    # These points are already part of a triangle!
-                    if len(p1_and_p3_already_connected) and len(p2_and_p3_already_connected):
-                        continue
+                p1_and_p3_edge = self.grid.get_edge(p1, p3)
+                p2_and_p3_edge = self.grid.get_edge(p2, p3)
 
-                    if len(p1_and_p3_already_connected) > 0:
-                        # Find the single edge they are connected with.
-                        e1 = p1_and_p3_already_connected[0]
+                # These points are already part of a triangle!
+                if p1_and_p3_edge is not None and p2_and_p3_edge is not None:
+                    if self.stats is not None:
+                        self.stats.count('rejected_already_connected')
 
-                        if e1.num_triangles_this_edge_is_in >= 2:
-                            continue
+                    continue
 
-                        # Make sure that if the edge they are already connected with is part of the triangle, the new
-                        # triangle will not overlap
-                        triangles = self.find_triangles_by_edge(e1)
+                if p1_and_p3_edge is not None:
+                    # Find the single edge they are connected with.
+                    e1 = p1_and_p3_edge
 
-                        if len(triangles) >= 2:
-                            continue
-                        else:
-                            third_point_of_triangle = [p for p in triangles[0] if p.id != p1.id and p.id != p3.id][0]
+                    if self.grid.get_num_triangles(e1) >= 2:
+                        if self.stats is not None:
+                            self.stats.count('rejected_edge_full')
 
-                            if self.will_triangles_overlap(e1, third_point_of_triangle, p2):
-                                continue
+                        continue
 
-                        e1.num_triangles_this_edge_is_in += 1
+                    # Make sure that if the edge they are already connected with is part of the triangle, the new
+                    # triangle will not overlap
+                    triangles = self.find_triangles_by_edge(e1)
 
-                    if len(p2_and_p3_already_connected) > 0:
-                        # Find the single edge they are connected with.
-                        e2 = p2_and_p3_already_connected[0]
+                    if len(triangles) >= 2:
+                        if self.stats is not None:
+                            self.stats.count('rejected_edge_full')
 
-                        if e2.num_triangles_this_edge_is_in >= 2:
-                            continue
+                        continue
+                    else:
+                        third_point_of_triangle = triangles[0][2]
 
-                        # Make sure that if the edge they are already connected with is part of the triangle, the new
-                        # triangle will not overlap
-                        triangles = self.find_triangles_by_edge(e2)
+                        if self.will_triangles_overlap(e1, third_point_of_triangle, p2):
+                            if self.stats is not None:
+                                self.stats.count('rejected_overlap')
 
-                        if len(triangles) >= 2:
                             continue
-                        else:
-                            third_point_of_triangle = [p for p in triangles[0] if p.id != p1.id and p.id != p3.id][0]
-                            if self.will_triangles_overlap(e2, third_point_of_triangle, p1):
-                                continue
 
-                        e2.num_triangles_this_edge_is_in += 1
+                if p2_and_p3_edge is not None:
+                    # Find the single edge they are connected with.
+                    e2 = p2_and_p3_edge
 
-                    # Check if one of the new edges might close another triangle in the mesh.
-                    are_p1_p3_closing_another_triangle_in_the_mesh = False
-                    are_p2_p3_closing_another_triangle_in_the_mesh = False
+                    if self.grid.get_num_triangles(e2) >= 2:
+                        if self.stats is not None:
+                            self.stats.count('rejected_edge_full')
 
-                    if p3.is_used:
-                        are_p1_p3_closing_another_triangle_in_the_mesh = self.is_there_a_path_between_two_points(p1, p3, p2)
-                        are_p2_p3_closing_another_triangle_in_the_mesh = self.is_there_a_path_between_two_points(p2, p3, p1)
+                        continue
 
-                    # Update that the edge we expand is now part of the triangle.
-                    edge.num_triangles_this_edge_is_in += 1
+                    # Make sure that if the edge they are already connected with is part of the triangle, the new
+                    # triangle will not overlap
+                    triangles = self.find_triangles_by_edge(e2)
 
-                    # Update that 'point' is not free anymore, so it won't be accidentally chosen in the seed search.
-                    p3.is_used = True
+                    if len(triangles) >= 2:
+                        if self.stats is not None:
+                            self.stats.count('rejected_edge_full')
 
-                    if e1 is None:
-                        e1 = Edge(p1, p3)
-                        e1.num_triangles_this_edge_is_in += 1
+                        continue
+                    else:
+                        third_point_of_triangle = triangles[0][2]
 
-                        if are_p1_p3_closing_another_triangle_in_the_mesh:
-                            e1.num_triangles_this_edge_is_in += 1
+                        if self.will_triangles_overlap(e2, third_point_of_triangle, p1):
+                            if self.stats is not None:
+                                self.stats.count('rejected_overlap')
 
-                    if e2 is None:
-                        e2 = Edge(p2, p3)
-                        e2.num_triangles_this_edge_is_in += 1
+                            continue
 
-                        if are_p2_p3_closing_another_triangle_in_the_mesh:
-                            e2.num_triangles_this_edge_is_in += 1
+                if (e1 is not None and e1.p1.id != p1.id) or (e2 is not None and e2.p1.id != p2.id):
+                    # The candidates' angles were calculated with the new edges going from p3, check them again
+                    # with the direction of the existing edges.
+                    min_angle, max_angle = self.calc_min_max_angle(e1 or Edge(p1, p3), e2 or Edge(p2, p3), edge)
 
-                    # Get rid of these extreme acute or obtuse triangles.
-                    min_angle, max_angle = utils.calc_min_max_angle_of_triangle(e1, e2, edge)
                     if max_angle > 180 or min_angle < 1:
+                        if self.stats is not None:
+                            self.stats.count('rejected_angle')
+
                         continue
 
-                    self.grid.add_edge(e1)
-                    self.grid.add_edge(e2)
+                # Check if one of the new edges might close another triangle in the mesh.
+                are_p1_p3_closing_another_triangle_in_the_mesh = False
+                are_p2_p3_closing_another_triangle_in_the_mesh = False
 
-                    triangle = sorted(list({e1.p1, e1.p2, e2.p1, e2.p2,edge.p1, edge.p2}))
+                if p3.is_used:
+                    are_p1_p3_closing_another_triangle_in_the_mesh = self.is_there_a_path_between_two_points(p1, p3, p2)
+                    are_p2_p3_closing_another_triangle_in_the_mesh = self.is_there_a_path_between_two_points(p2, p3, p1)
+
+                # Update that 'point' is not free anymore, so it won't be accidentally chosen in the seed search.
+                p3.is_used = True
 
-                    v1 = [p2.x - p1.x, p2.y - p1.y, p2.z - p1.z]
-                    v2 = [p3.x - p1.x, p3.y - p1.y, p3.z - p1.z]
-                    normal = np.cross(v1, v2)
+                # Only a new edge can close another triangle in the mesh.
+                if e1 is None:
+                    e1 = Edge(p1, p3)
+                else:
+                    are_p1_p3_closing_another_triangle_in_the_mesh = False
 
-                    if np.sign(np.dot(normal, p1.normal)) < 0:
-                        triangle.reverse()
+                if e2 is None:
+                    e2 = Edge(p2, p3)
+                else:
+                    are_p2_p3_closing_another_triangle_in_the_mesh = False
 
-                    self.grid.triangles.append(triangle)
-                    return e1, e2
+                self.grid.add_edge(e1)
+                self.grid.add_edge(e2)
+
+                if are_p1_p3_closing_another_triangle_in_the_mesh:
+                    self.grid.mark_closing_edge(e1)
+
+                if are_p2_p3_closing_another_triangle_in_the_mesh:
+                    self.grid.mark_closing_edge(e2)
+
+                triangle = sort_by_height({e1.p1, e1.p2, e2.p1, e2.p2, edge.p1, edge.p2})
+
+                if flip_triangle:
+                    triangle.reverse()
+
+                self.grid.add_triangle(triangle)
+                return e1, e2
             else:
                 return None, None
 
         return None, None
 
+    def validate_candidates(self, p1: Point, p2: Point, third_point: Point, candidates,
+                            centers=None) -> (np.ndarray, np.ndarray):
+        """
+        Check which candidates make a valid triangle with the edge (p1, p2), with all of them at once: the new triangle
+        doesn't overlap the triangle (p1, p2, third_point), the ball fits it (according to the mode of the algorithm),
+        and it's not too acute or obtuse. Checks that depend on the mesh (the edges the points already have) are not
+        done here.
+
+        :param p1: First point of the edge.
+        :param p2: Second point of the edge.
+        :param third_point: Third point of the triangle we expand, or None.
+        :param candidates: Array of the candidates indices, sorted by the order they should be tried in.
+        :param centers: (Optional) in pivot mode, array of shape (k, 3) of the centers of the balls touching the edge
+        and each candidate, if they were already calculated.
+        :return: Boolean mask of the valid candidates (in the same order), and a boolean mask of the candidates whose
+        triangle should be reversed to agree with p1's normal.
+        """
+        start = time.perf_counter() if self.stats is not None else 0
+        reasons, flip = kernels.check_candidates(self.kernel_coordinates, self.kernel_normals, p1.id, p2.id,
+                                                 -1 if third_point is None else third_point.id, candidates,
+                                                 self.radius, self.mode == 'incircle')
+        valid = reasons == kernels.ACCEPTED
+
+        if self.stats is not None:
+            self.count_rejections(reasons)
+
+        if self.mode == 'pivot' and np.any(valid):
+            if centers is None:
+                centers, _ = utils.calc_ball_centers(self.cloud.coordinates, self.cloud.normals, p1.id, p2.id,
+                                                     candidates, self.radius)
+
+            # Check that the balls are empty. They all touch p1, so the points inside them are all in p1's
+            # neighborhood, which is gathered once for all of them.
+            neighbor_points = self.grid.get_neighbor_points_ids(p1)
+            neighbor_points = neighbor_points[(neighbor_points != p1.id) & (neighbor_points != p2.id)]
+            v = self.cloud.coordinates[neighbor_points][:, None, :] - centers[valid][None, :, :]
+
+            # Points on the ball's surface are not considered inside it.
+            inside = (np.einsum('ijk,ijk->ij', v, v) < (self.radius * (1 - 1e-6)) ** 2) & \
+                (neighbor_points[:, None] != candidates[valid][None, :])
+            is_empty = ~np.any(inside, axis=0)
+            valid[valid] = is_empty
+
+            if self.stats is not None:
+                self.stats.count('rejected_ball_not_empty', int(np.sum(~is_empty)))
+
+        if self.stats is not None:
+            self.stats.add_time('validate_candidates', start)
+
+        return valid, flip
+
+    def get_ball_rejection_name(self) -> str:
+        # The name of the rejection of a triangle the ball doesn't fit (see kernels.REJECTED_BALL).
+        return 'incircle' if self.mode == 'incircle' else 'ball'
+
+    def count_rejections(self, reasons):
+        """
+        Count the candidates that were validated, and the ones that were rejected by the reasons.
+
+        :param reasons: Array of the reasons from kernels.check_candidates.
+        :return: None.
+        """
+        counts = np.bincount(reasons, minlength=len(REJECTION_COUNTERS) + 2)
+        self.stats.count('candidates', len(reasons))
+
+        for reason, name in REJECTION_COUNTERS.items():
+            self.stats.count(name, int(counts[reason]))
+
+        self.stats.count('rejected_' + self.get_ball_rejection_name(), int(counts[kernels.REJECTED_BALL]))
+
+    def iter_valid_candidates(self, p1: Point, p2: Point, third_point: Point, candidates, centers=None):
+        """
+        Iterate over the candidates that make a valid triangle with the edge (p1, p2) (see validate_candidates), in
+        order. The candidates are validated in chunks, so when one of the first candidates makes a triangle, the rest
+        are not checked at all.
+
+        :param p1: First point of the edge.
+        :param p2: Second point of the edge.
+        :param third_point: Third point of the triangle we expand, or None.
+        :param candidates: Array of the candidates indices, sorted by the order they should be tried in.
+        :param centers: (Optional) see validate_candidates.
+        :return: Generator of the valid candidates, and whether their triangle should be reversed.
+        """
+        for start in range(0, len(candidates), CANDIDATES_CHUNK_SIZE):
+            chunk = candidates[start:start + CANDIDATES_CHUNK_SIZE]
+            chunk_centers = None if centers is None else centers[start:start + CANDIDATES_CHUNK_SIZE]
+            valid, flip = self.validate_candidates(p1, p2, third_point, chunk, chunk_centers)
+
+            for p3, flip_triangle in zip(chunk[valid], flip[valid]):
+                yield self.points[p3], flip_triangle
+
+    def get_ball_center(self, p1: Point, p2: Point, p3: Point):
+        """
+        Get the center of the ball that touches the three points, on the side their normals are pointing to.
+
+        :param p1: First point.
+        :param p2: Second point.
+        :param p3: Third point.
+        :return: The center, or None if the ball is too small to touch the three points.
+        """
+        valid, x, y, z = kernels.ball_center(self.kernel_coordinates, self.kernel_normals, p1.id, p2.id, p3.id,
+                                             self.radius)
+        return np.array([x, y, z]) if valid else None
+
+    def is_ball_empty(self, center, p1: Point, p2: Point, p3: Point) -> bool:
+        """
+        Check that a ball doesn't contain any point, beside the three points it touches. All points in the ball are
+        at distance of maximum 2r from p1, so only p1's neighbor cells are checked.
+
+        :param center: The center of the ball.
+        :param p1: First point the ball touches.
+        :param p2: Second point the ball touches.
+        :param p3: Third point the ball touches.
+        :return: Boolean.
+        """
+        neighbor_points = self.grid.get_neighbor_points_ids(p1)
+        neighbor_points = neighbor_points[(neighbor_points != p1.id) & (neighbor_points != p2.id) &
+                                          (neighbor_points != p3.id)]
+        v = self.cloud.coordinates[neighbor_points] - center
+        distances_2 = np.einsum('ij,ij->i', v, v)
+
+        # Points on the ball's surface are not considered inside it.
+        return not np.any(distances_2 < (self.radius * (1 - 1e-6)) ** 2)
+
+    def does_ball_fit(self, p1: Point, p2: Point, p3: Point) -> bool:
+        """
+        Check if the ball fits the triangle defined by the three points, according to the mode of the algorithm.
+
+        :param p1: First point.
+        :param p2: Second point.
+        :param p3: Third point.
+        :return: Boolean.
+        """
+        if self.mode == 'pivot':
+            center = self.get_ball_center(p1, p2, p3)
+            return center is not None and self.is_ball_empty(center, p1, p2, p3)
+
+        # If a sphere's radius is smaller than the radius of the incircle of a triangle, the sphere can fit into
+        # the triangle.
+        return self.radius <= kernels.incircle_radius(self.kernel_coordinates, p1.id, p2.id, p3.id)
+
+    def calc_min_max_angle(self, e1: Edge, e2: Edge, e3: Edge) -> (float, float):
+        """
+        Calculate the minimum and maximum angles between the edges of a triangle (see
+        utils.calc_min_max_angle_of_triangle).
+
+        :param e1: First edge.
+        :param e2: Second edge.
+        :param e3: Third edge.
+        :return: minimum angle, maximum angle.
+        """
+        return kernels.min_max_angle(self.kernel_coordinates, e1.p1.id, e1.p2.id, e2.p1.id, e2.p2.id, e3.p1.id,
+                                     e3.p2.id)
+
+    def sort_points_by_pivot_angle(self, points, p1: Point, p2: Point, third_point: Point, limit=None):
+        """
+        Sort points by the angle the ball should pivot around the edge (p1, p2), from the triangle (p1, p2,
+        third_point), until it touches them. Points the ball can't touch together with p1 and p2 are dropped.
+
+        :param points: Indices of the points to sort.
+        :param p1: First point of the edge.
+        :param p2: Second point of the edge.
+        :param third_point: Third point of the triangle we expand.
+        :param limit: (Optional) maximum number of points to return.
+        :return: The sorted indices and an array of shape (k, 3) of the centers of the ball when it touches them, or
+        None, None if the ball can't be placed on the triangle we expand.
+        """
+        center = self.get_ball_center(p1, p2, third_point)
+
+        if center is None:
+            return None, None
+
+        points = np.asarray(points, dtype=np.int64)
+        points = points[(points != p1.id) & (points != p2.id) & (points != third_point.id)]
+        centers, valid = utils.calc_ball_centers(self.cloud.coordinates, self.cloud.normals, p1.id, p2.id, points,
+                                                 self.radius)
+        points, centers = points[valid], centers[valid]
+        angles = utils.calc_pivot_angles(self.cloud.coordinates, p1.id, p2.id, third_point.id, center, centers)
+        order = np.lexsort((points, angles))[:limit]
+        return points[order], centers[order]
+
     def find_triangles_by_edge(self, edge: Edge) -> List:
         """
         Find all triangles the edge is in them.
@@ -501,13 +1152,12 @@ class BPA:
         """
         possible_triangles = []
 
-        for triangle in self.grid.triangles:
-            if edge.p1 in triangle and edge.p2 in triangle:
-                third_point = [p for p in triangle if p.id != edge.p1.id and p.id != edge.p2.id]
+        for triangle in self.grid.get_edge_triangles(edge):
+            third_point = [p for p in triangle if p.id != edge.p1.id and p.id != edge.p2.id]
 
-                if len(third_point) > 0:
-                    third_point = third_point[0]
-                    possible_triangles.append([edge.p1, edge.p2, third_point])
+            if len(third_point) > 0:
+                third_point = third_point[0]
+                possible_triangles.append([edge.p1, edge.p2, third_point])
 
         return possible_triangles
 
@@ -520,41 +1170,13 @@ class BPA:
         :param point_of_triangle_we_creating: Third point of a triangle these 2 points are in.
         :return:
         """
-        edges_first_point_int = []
-        edges_second_point_int = []
-        points_first_edges = []
-        points_second_edges = []
-
-        for e in self.grid.edges:
-            if p1.id == e.p1.id or p1.id == e.p2.id:
-                edges_first_point_int.append(e)
+        # Points connected to both points, beside themselves.
+        intersection = self.grid.get_connected_points_ids(p1) & self.grid.get_connected_points_ids(p2)
+        intersection = intersection - {p1.id, p2.id}
 
-            if p2.id == e.p1.id or p2.id == e.p2.id:
-                edges_second_point_int.append(e)
-
-        for e in edges_first_point_int:
-            points_first_edges.append(e.p1.id)
-            points_first_edges.append(e.p2.id)
-
-        for e in edges_second_point_int:
-            points_second_edges.append(e.p1.id)
-            points_second_edges.append(e.p2.id)
-
-        points_first_edges = set(points_first_edges)
-
-        if p1.id in points_first_edges:
-            points_first_edges.remove(p1.id)
-
-        points_second_edges = set(points_second_edges)
-
-        if p2.id in points_second_edges:
-            points_second_edges.remove(p2.id)
-
-        intersection = set(points_first_edges & points_second_edges)
         if point_of_triangle_we_creating.id in intersection:
             # I already know these two points have a path, because they are part of a triangle. Remove that third point
             # to find out if there are multiple routes between the points.
             intersection.remove(point_of_triangle_we_creating.id)
 
         return len(intersection) > 0
-
@@ -0,0 +1,59 @@
+import os
+import zlib
+import numpy as np
+
+"""
+Checkpoints of a reconstruction, so a long run that crashed or was stopped can be resumed (see create_mesh's checkpoint
+arguments). A checkpoint is an uncompressed .npz file of the arrays of the state: the points flags (bit packed), the
+mesh's edges and triangles tables (see Grid.get_mesh_state), the front (see Front.get_saved_state), the seed cursor,
+and the passes of the run. The file is written next to its path and then renamed over it, so a crash while writing
+leaves the previous checkpoint.
+"""
+
+VERSION = 1
+
+# Default seconds between checkpoints.
+CHECKPOINT_INTERVAL = 60.0
+
+
+def get_cloud_fingerprint(coordinates) -> int:
+    """
+    Get a checksum of the points, to make sure a checkpoint is resumed with the same points.
+
+    :param coordinates: Array of shape (N, 3).
+    :return: The checksum.
+    """
+    return zlib.crc32(np.ascontiguousarray(coordinates, dtype=np.float32).tobytes())
+
+
+def save_checkpoint(path: str, state: dict):
+    """
+    Write a checkpoint.
+
+    :param path: The path to the file.
+    :param state: Dictionary of arrays and scalars.
+    :return: None.
+    """
+    temp_path = path + '.tmp'
+
+    # np.savez adds '.npz' to paths without it, but not to files.
+    with open(temp_path, 'wb') as f:
+        np.savez(f, version=VERSION, **state)
+
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path: str) -> dict:
+    """
+    Read a checkpoint.
+
+    :param path: The path to the file.
+    :return: Dictionary of arrays, and of scalars (as Python values) for the 0-dimensional arrays.
+    """
+    with np.load(path, allow_pickle=False) as f:
+        state = {name: f[name] if f[name].ndim > 0 else f[name].item() for name in f.files}
+
+    if state.get('version') != VERSION:
+        raise ValueError("Checkpoint {} has version {}, expected {}".format(path, state.get('version'), VERSION))
+
+    return state
@@ -1,7 +1,20 @@
 class Edge:
+    __slots__ = ('p1', 'p2')
+
     def __init__(self, p1, p2):
+        # The mesh keeps its edges as arrays of points ids (see Grid), an Edge is only a view of one of them.
         self.p1 = p1
         self.p2 = p2
-        self.num_triangles_this_edge_is_in = 0 # To avoid cases where algorithm tries to expand edges that are already
-        # part of 2 different triangles.
-        self.color = [] # For visualization
+
+    def __eq__(self, other):
+        # Edges are equal if they connect the same points, in any order.
+        if not isinstance(other, Edge):
+            return NotImplemented
+
+        return {self.p1.id, self.p2.id} == {other.p1.id, other.p2.id}
+
+    def __hash__(self):
+        return hash(frozenset((self.p1.id, self.p2.id)))
+
+    def __repr__(self):
+        return 'Edge({}, {})'.format(self.p1.id, self.p2.id)
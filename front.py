@@ -0,0 +1,145 @@
+import heapq
+from collections import deque
+import numpy as np
+
+from edge import Edge
+import utils
+
+"""
+The front of the mesh: the boundary edges the ball still has to pivot around. Each edge is in one of three states:
+- ACTIVE: waiting in the queue to be pivoted around.
+- BOUNDARY: the ball was pivoted around it and found no point. It's pivoted again only if the radius changes.
+- FROZEN: it's in two triangles (or closed a loop in the mesh), so it's not part of the front anymore.
+"""
+
+ACTIVE = 'active'
+BOUNDARY = 'boundary'
+FROZEN = 'frozen'
+
+PRIORITIES = ('fifo', 'shortest')
+
+# The states, in the order they are numbered in a saved front (see Front.get_saved_state).
+STATES = (ACTIVE, BOUNDARY, FROZEN)
+
+
+class Front:
+    def __init__(self, grid, priority='fifo'):
+        """
+        :param grid: The grid with the mesh.
+        :param priority: (Optional) the order edges are popped in, one of PRIORITIES: 'fifo' pops them in the order they
+        were pushed, 'shortest' pops the shortest edge first.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError("Unknown priority '{}', expected one of {}".format(priority, PRIORITIES))
+
+        self.grid = grid
+        self.priority = priority
+        self.queue = deque() if priority == 'fifo' else []
+        self.states = {}  # Maps an edge key to the edge's state.
+        self.num_pushed = 0  # Tie breaker for the heap, so edges of the same length are popped in the order pushed.
+
+    def __len__(self):
+        return len(self.queue)
+
+    def get_state(self, edge: Edge):
+        """
+        Get the state of an edge.
+
+        :param edge: The edge.
+        :return: The state, or None if the edge was never in the front.
+        """
+        return self.states.get(self.grid.get_edge_key(edge.p1, edge.p2))
+
+    def push(self, edge: Edge):
+        """
+        Add an edge to the front, unless it's already waiting in it or it's not on the boundary of the mesh.
+
+        :param edge: The edge.
+        :return: None.
+        """
+        key = self.grid.get_edge_key(edge.p1, edge.p2)
+
+        if self.states.get(key) == ACTIVE:
+            return
+
+        if self.grid.get_num_triangles(edge) >= 2:
+            self.states[key] = FROZEN
+            return
+
+        self.states[key] = ACTIVE
+        self.num_pushed += 1
+
+        if self.priority == 'fifo':
+            self.queue.append(edge)
+        else:
+            heapq.heappush(self.queue, (utils.calc_distance_points(edge.p1, edge.p2), self.num_pushed, edge))
+
+    def pop(self):
+        """
+        Pop the next edge to pivot around. Edges that left the boundary while waiting are frozen and skipped.
+
+        :return: The edge, or None if the front is empty.
+        """
+        while len(self.queue) > 0:
+            edge = self.queue.popleft() if self.priority == 'fifo' else heapq.heappop(self.queue)[2]
+            key = self.grid.get_edge_key(edge.p1, edge.p2)
+
+            if self.grid.get_num_triangles(edge) >= 2:
+                self.states[key] = FROZEN
+                continue
+
+            # The edge is marked as boundary until the ball finds a point to expand to.
+            self.states[key] = BOUNDARY
+            return edge
+
+        return None
+
+    def activate_boundary(self):
+        """
+        Push again all the edges of the mesh that are on its boundary, for example after the radius was changed.
+
+        :return: None.
+        """
+        for edge in self.grid.edges:
+            if self.grid.get_num_triangles(edge) < 2:
+                self.push(edge)
+            else:
+                self.states[self.grid.get_edge_key(edge.p1, edge.p2)] = FROZEN
+
+    def get_saved_state(self) -> dict:
+        """
+        Get the front as arrays, to save it (see checkpoint.py).
+
+        :return: Dictionary of arrays: the points ids of the queued edges (in the queue's order, for 'shortest' it's
+        the heap's order) and the order they were pushed in, and the keys of the edges that have a state and their
+        states (indices in STATES).
+        """
+        entries = [(edge, 0) for edge in self.queue] if self.priority == 'fifo' else \
+            [(edge, num_pushed) for _, num_pushed, edge in self.queue]
+        codes = {state: i for i, state in enumerate(STATES)}
+        edges = np.array([(edge.p1.id, edge.p2.id) for edge, _ in entries], dtype=np.int64).reshape(-1, 2)
+        return {'front_edges': edges,
+                'front_pushed': np.array([num_pushed for _, num_pushed in entries], dtype=np.int64),
+                'front_num_pushed': np.int64(self.num_pushed),
+                'front_keys': np.array(list(self.states.keys()), dtype=np.int64),
+                'front_states': np.array([codes[state] for state in self.states.values()], dtype=np.uint8)}
+
+    def set_saved_state(self, state: dict):
+        """
+        Replace the front with one from get_saved_state. The grid must already have the mesh the front was saved
+        with.
+
+        :param state: Dictionary of arrays, see get_saved_state.
+        :return: None.
+        """
+        edges = [Edge(self.grid.get_point(i), self.grid.get_point(j)) for i, j in state['front_edges'].tolist()]
+
+        if self.priority == 'fifo':
+            self.queue = deque(edges)
+        else:
+            # The heap is restored in its own order, so it's still a heap and pops the edges in the same order.
+            self.queue = [(utils.calc_distance_points(edge.p1, edge.p2), num_pushed, edge)
+                          for edge, num_pushed in zip(edges, state['front_pushed'].tolist())]
+
+        self.num_pushed = int(state['front_num_pushed'])
+        self.states = dict(zip(state['front_keys'].tolist(), [STATES[i] for i in state['front_states'].tolist()]))
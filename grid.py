@@ -1,89 +1,560 @@
+import numpy as np
+
 from edge import Edge
+from growable_array import GrowableArray
+import point_cloud
+import spatial_index
 import utils
 
+# Flags of the rows of the mesh's edges (see Grid).
+IS_EDGE = 1  # The row is an edge of the mesh, and not only a side of a triangle that was added without its edges.
+IS_CLOSING = 2  # The edge closed a loop in the mesh when it was created.
+
 
 class Grid:
-    def __init__(self, radius, points=None):
+    def __init__(self, radius, points=None, use_cell_codes=False, min_points_per_cell=0, index_type='grid'):
         self.all_points = points
-        self.cells = {}
+        self.index_type = index_type  # The spatial index for the candidates search, one of spatial_index.INDEX_TYPES.
+        self.index = None
+        self.positions = None  # Maps a point id to its index in all_points, if the ids are not the indices.
+        self.min_points_per_cell = min_points_per_cell  # If set, the cells grow until they hold that many points.
+        self.cells = {}  # Maps a cell code to its index in cell_codes.
+        self.cell_codes = np.zeros(0, dtype=np.int64)  # Sorted codes of the non-empty cells.
+        self.cell_offsets = np.zeros(1, dtype=np.int64)  # Cell i has cell_points[offsets[i]:offsets[i + 1]].
+        self.cell_points = np.zeros(0, dtype=np.int64)  # Indices (in all_points) of the points, sorted by cell.
+        self.cell_points_ids = np.zeros(0, dtype=np.int64)  # The ids of the points in cell_points.
         self.radius = radius
-        self.num_cells_per_axis = 0
-        self.bounding_box_size = 0
-        self.edges = []
-        self.triangles = []
+        self.origin = np.zeros(3)
+
+        # The mesh. A row is kept for every pair of points that is an edge or a side of a triangle, in edge_points.
+        self.edge_rows = {}  # Maps an edge key to its row.
+        self.edge_points = GrowableArray((2,), np.int32)  # The points ids of each row, in the order the edge was added.
+        self.edge_flags = GrowableArray((), np.uint8)  # IS_EDGE and IS_CLOSING.
+        self.edge_num_triangles = GrowableArray((), np.int32)
+        self.edge_triangles = GrowableArray((2,), np.int32, fill_value=-1)  # The first 2 triangles of each row.
+        self.extra_edge_triangles = {}  # Maps a row to the triangles after its first 2, rarely used.
+        self.num_edges = 0
+        self.adjacency = {}  # Maps a point id to the ids of all points it's connected to.
+        self.triangle_points = GrowableArray((3,), np.int32)  # The points ids of each triangle.
         self.cell_size = 0
 
         if points is not None:
-            self.init_with_data(points)
-
-    def init_with_data(self, list_of_points):
-        min_x, max_x, min_y, max_y, min_z, max_z = 0, 0, 0, 0, 0, 0
-
-        # Find boundaries for the bounding box of the entire data.
-        for point in list_of_points:
-            min_x = point.x if point.x < min_x else min_x
-            max_x = point.x if point.x > max_x else max_x
-            min_y = point.y if point.y < min_y else min_y
-            max_y = point.y if point.y > max_y else max_y
-            min_z = point.z if point.z < min_z else min_z
-            max_z = point.z if point.z > max_z else max_z
-
-        x = max_x - min_x
-        y = max_y - min_y
-        z = max_z - min_z
-
-        # I'm taking the max since i want the bounding box to be a square.
-        self.bounding_box_size = max(x, y, z)
-
-        # Calculate each cell edge size.
-        self.num_cells_per_axis = self.bounding_box_size / (2 * self.radius)
-        self.cell_size = self.bounding_box_size / self.num_cells_per_axis
-
-        # Start appending the data points to their cells.
-        for point in list_of_points:
-            # Find the point's fitting cell. Assuming the bounding box's front-bottom-right corner is the origin (marked
-            # with * in the following figure)
-            '''
-                      y
-                      |
-                      |________
-                     /|        |
-                    / |        |
-                   /  |        |
-                  |   |________|______ x
-                  |  /         /
-                  | /         /
-                  |/________*/
-                  /
-                 /
-                z
-            '''
-
-            x_cell = int((point.x // self.cell_size) * self.cell_size)
-            y_cell = int((point.y // self.cell_size) * self.cell_size)
-            z_cell = int((point.z // self.cell_size) * self.cell_size)
-
-            # Encode cell location.
-            code = utils.encode_cell(x=x_cell, y=y_cell, z=z_cell)
+            self.init_with_data(points, use_cell_codes=use_cell_codes)
+
+    @staticmethod
+    def get_points_arrays(list_of_points) -> (np.ndarray, np.ndarray, np.ndarray):
+        """
+        Get the coordinates, ids and cell codes of the points. If the points are all the points of a cloud, the cloud's
+        arrays are used as they are.
+
+        :param list_of_points: The points.
+        :return: Array of shape (N, 3) of the coordinates, array of the ids and array of the cell codes.
+        """
+        cloud = list_of_points[0].cloud
+
+        if len(cloud) == len(list_of_points) and cloud.points is list_of_points:
+            return cloud.coordinates, np.arange(len(cloud)), cloud.cell_codes
+
+        coordinates = np.array([(p.x, p.y, p.z) for p in list_of_points], dtype=np.float64)
+        ids = np.array([p.id for p in list_of_points], dtype=np.int64)
+        codes = np.array([point_cloud.NO_CELL if p.cell_code is None else p.cell_code for p in list_of_points],
+                         dtype=np.int64)
+        return coordinates, ids, codes
+
+    def set_cell_codes(self, codes):
+        """
+        Save the cell codes in the points.
+
+        :param codes: Array of the cell codes, in the order of all_points.
+        :return: None.
+        """
+        cloud = self.all_points[0].cloud
+
+        if len(cloud) == len(self.all_points) and cloud.points is self.all_points:
+            cloud.cell_codes[:] = codes
+            return
+
+        for point, code in zip(self.all_points, codes.tolist()):
             point.cell_code = code
 
-            # Add the point to the cell in the hash table.
-            if code not in self.cells.keys():
-                self.cells[code] = []
+    def init_with_data(self, list_of_points, use_cell_codes=False):
+        """
+        Add the points to the grid. The grid's origin is the minimum corner of the points' bounding box, so all the
+        cells' coordinates are non-negative.
+
+        :param list_of_points: The points.
+        :param use_cell_codes: (Optional) if True, the points are already assigned to cells for this radius (for
+        example, when they are loaded from a point cache), so their cells are not calculated again.
+        :return: None.
+        """
+        self.all_points = list_of_points
+
+        if len(list_of_points) == 0:
+            return
+
+        coordinates, ids, codes = self.get_points_arrays(list_of_points)
+
+        # Each cell is a cube with an edge of 2r, so all points at distance of 2r from a point are in its cell or in
+        # one of the 26 cells around it.
+        self.cell_size = 2 * self.radius
+        self.origin = coordinates.min(axis=0).astype(np.float64)
 
-            self.cells[code].append(point)
+        if not use_cell_codes:
+            codes = self.calc_cell_codes(coordinates)
+
+            # Grow the cells until they hold (on average) the requested number of points.
+            while self.min_points_per_cell > 0:
+                num_cells = len(np.unique(codes))
+
+                if num_cells == 1 or len(codes) >= self.min_points_per_cell * num_cells:
+                    break
+
+                self.cell_size *= 2
+                codes = self.calc_cell_codes(coordinates)
+
+            self.set_cell_codes(codes)
+
+        # Compressed layout: the points sorted by cell, and the offset of each cell's points.
+        self.cell_points = np.argsort(codes, kind='stable')
+        self.cell_points_ids = ids[self.cell_points]
+        self.cell_codes, starts = np.unique(codes[self.cell_points], return_index=True)
+        self.cell_offsets = np.append(starts, len(codes)).astype(np.int64)
+        self.cells = dict(zip(self.cell_codes.tolist(), range(len(self.cell_codes))))
+        self.positions = None if np.array_equal(ids, np.arange(len(ids))) else dict(zip(ids.tolist(), range(len(ids))))
+        self.index = spatial_index.create_index(self.index_type, self, coordinates, ids)
+
+    def calc_cell_codes(self, coordinates) -> np.ndarray:
+        """
+        Find the cell of each point.
+
+        :param coordinates: Array of shape (N, 3) of the points coordinates.
+        :return: Array of the cell codes.
+        """
+        cells = np.floor((coordinates - self.origin) / self.cell_size).astype(np.int64)
+
+        if cells.max() > utils.CELL_MASK:
+            raise ValueError("Too many cells for radius {}, at most {} cells per axis are supported".format(
+                self.radius, utils.CELL_MASK + 1))
+
+        return utils.encode_cell(cells[:, 0], cells[:, 1], cells[:, 2])
+
+    def set_radius(self, radius):
+        """
+        Re-bin the points for a new radius. The mesh (edges and triangles) is kept.
+
+        :param radius: The new radius.
+        :return: None.
+        """
+        self.radius = radius
+        self.init_with_data(self.all_points)
 
     def get_cell_points(self, cell_code):
-        points = []
+        if cell_code not in self.cells:
+            return []
+
+        i = self.cells[cell_code]
+        return [self.all_points[j] for j in self.cell_points[self.cell_offsets[i]:self.cell_offsets[i + 1]]]
+
+    @staticmethod
+    def get_edge_key(p1, p2) -> int:
+        """
+        Get the key of the edge between two points. The key doesn't depend on the order of the points.
+
+        :param p1: First point.
+        :param p2: Second point.
+        :return: The smaller id in the high 32 bits, and the larger id in the low 32 bits.
+        """
+        return (p1.id << 32) | p2.id if p1.id <= p2.id else (p2.id << 32) | p1.id
+
+    @property
+    def edges(self):
+        """
+        Get the edges of the mesh, in the order they were added.
+
+        :return: Sequence of Edge views (see EdgesView).
+        """
+        return EdgesView(self)
+
+    @property
+    def triangles(self):
+        """
+        Get the triangles of the mesh, in the order they were added.
+
+        :return: Sequence of lists of 3 points (see TrianglesView).
+        """
+        return TrianglesView(self)
+
+    def get_point(self, point_id):
+        """
+        Get a point by its id.
+
+        :param point_id: The id.
+        :return: The point.
+        """
+        return self.all_points[point_id if self.positions is None else self.positions[point_id]]
+
+    def get_edge_row(self, p1, p2, create=False):
+        """
+        Get the row of the edge between two points.
+
+        :param p1: First point.
+        :param p2: Second point.
+        :param create: (Optional) whether to add a row if there is none.
+        :return: The row, or None.
+        """
+        key = self.get_edge_key(p1, p2)
+        row = self.edge_rows.get(key)
+
+        if row is None and create:
+            row = self.edge_points.append((p1.id, p2.id))
+            self.edge_flags.grow()
+            self.edge_num_triangles.grow()
+            self.edge_triangles.grow()
+            self.edge_rows[key] = row
+
+        return row
+
+    def get_edge_by_row(self, row) -> Edge:
+        i, j = self.edge_points.data[row].tolist()
+        return Edge(self.get_point(i), self.get_point(j))
+
+    def get_edge(self, p1, p2):
+        """
+        Get the edge connecting two points.
+
+        :param p1: First point.
+        :param p2: Second point.
+        :return: The edge (with its points in the order it was added), or None if the points are not connected.
+        """
+        row = self.edge_rows.get(self.get_edge_key(p1, p2))
+
+        if row is None or not self.edge_flags.data.item(row) & IS_EDGE:
+            return None
+
+        return Edge(p1, p2) if self.edge_points.data.item(row, 0) == p1.id else Edge(p2, p1)
+
+    def are_connected(self, p1, p2) -> bool:
+        """
+        Check if two points are connected by an edge.
+
+        :param p1: First point.
+        :param p2: Second point.
+        :return: Boolean.
+        """
+        row = self.edge_rows.get(self.get_edge_key(p1, p2))
+        return row is not None and bool(self.edge_flags.data.item(row) & IS_EDGE)
+
+    def get_connected_points_ids(self, point) -> set:
+        """
+        Get the ids of all points connected to a point by an edge.
+
+        :param point: The point.
+        :return: Set of points ids.
+        """
+        return self.adjacency.get(point.id, set())
+
+    def get_position(self, point):
+        """
+        Get the index of a point in all_points.
+
+        :param point: The point.
+        :return: The index, or None if the point is not in the grid.
+        """
+        if self.positions is not None:
+            return self.positions.get(point.id)
+
+        return point.id if 0 <= point.id < len(self.all_points) else None
+
+    def get_neighbor_points_ids(self, point) -> np.ndarray:
+        """
+        Get the candidates of a point: the ids of all points at distance of 2r from it (and maybe more, depending on
+        the index).
+
+        :param point: The point.
+        :return: Read-only array of the points ids (a view, don't keep it after the grid changes).
+        """
+        i = self.get_position(point)
+
+        if i is None:
+            return np.zeros(0, dtype=np.int64)
+
+        return self.index.get_neighbor_points_ids(i)
+
+    def get_common_neighbor_points_ids(self, p1, p2) -> np.ndarray:
+        """
+        Get the candidates of an edge: the ids of all points at distance of 2r from both its points (and maybe more,
+        depending on the index).
+
+        :param p1: First point.
+        :param p2: Second point.
+        :return: Read-only array of the points ids.
+        """
+        i, j = self.get_position(p1), self.get_position(p2)
+
+        if i is None or j is None:
+            return np.zeros(0, dtype=np.int64)
+
+        return self.index.get_common_neighbor_points_ids(i, j)
 
-        if cell_code in self.cells.keys():
-            p = self.cells[cell_code]
-            points.extend(p)
+    def get_cells_points_ids(self, cell_codes) -> np.ndarray:
+        """
+        Get the ids of all points in some cells.
 
-        return points
+        :param cell_codes: The cells codes. Each cell is taken once, even if it appears more than once.
+        :return: Array of the points ids.
+        """
+        offsets = self.cell_offsets
+        ids = [self.cell_points_ids[offsets[i]:offsets[i + 1]] for i in
+               (self.cells[code] for code in set(cell_codes) if code in self.cells)]
+
+        if len(ids) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        return np.concatenate(ids)
 
     def add_edge(self, edge: Edge):
-        self.edges.append(edge)
+        row = self.get_edge_row(edge.p1, edge.p2, create=True)
+        flags = self.edge_flags.data.item(row)
+
+        # The edge is already registered, no need to add it again.
+        if flags & IS_EDGE:
+            return
+
+        # The row might have been added by a triangle before the edge itself, in the other orientation.
+        if self.edge_points.data.item(row, 0) != edge.p1.id:
+            self.edge_points.data[row] = (edge.p1.id, edge.p2.id)
+
+        self.edge_flags.data[row] = flags | IS_EDGE
+        self.num_edges += 1
+        self.adjacency.setdefault(edge.p1.id, set()).add(edge.p2.id)
+        self.adjacency.setdefault(edge.p2.id, set()).add(edge.p1.id)
 
     def remove_edge(self, edge: Edge):
-        self.edges.remove(edge)
+        row = self.edge_rows.get(self.get_edge_key(edge.p1, edge.p2))
+
+        flags = 0 if row is None else self.edge_flags.data.item(row)
+
+        if not flags & IS_EDGE:
+            raise ValueError("{} is not an edge of the mesh".format(edge))
+
+        # The row is kept, so the rows after it (and their triangles) don't move.
+        self.edge_flags.data[row] = flags & ~IS_EDGE
+        self.num_edges -= 1
+        self.adjacency[edge.p1.id].discard(edge.p2.id)
+        self.adjacency[edge.p2.id].discard(edge.p1.id)
+
+    def add_triangle(self, triangle):
+        """
+        Add a triangle to the mesh, and register it for each of its edges.
+
+        :param triangle: List of the 3 points of the triangle.
+        :return: The index of the triangle.
+        """
+        index = self.triangle_points.append([p.id for p in triangle])
+
+        for i in range(3):
+            row = self.get_edge_row(triangle[i], triangle[(i + 1) % 3], create=True)
+            num_triangles = self.edge_num_triangles.data.item(row)
+
+            if num_triangles < 2:
+                self.edge_triangles.data[row, num_triangles] = index
+            else:
+                self.extra_edge_triangles.setdefault(row, []).append(index)
+
+            self.edge_num_triangles.data[row] = num_triangles + 1
+
+        return index
+
+    def get_triangle(self, index) -> list:
+        """
+        Get a triangle of the mesh.
+
+        :param index: The index of the triangle.
+        :return: List of the 3 points of the triangle.
+        """
+        return [self.get_point(i) for i in self.triangle_points.data[index].tolist()]
+
+    def get_edge_triangles(self, edge: Edge) -> list:
+        """
+        Get all triangles an edge is in.
+
+        :param edge: The edge.
+        :return: List of triangles.
+        """
+        row = self.edge_rows.get(self.get_edge_key(edge.p1, edge.p2))
+
+        if row is None:
+            return []
+
+        indices = [i for i in self.edge_triangles.data[row].tolist() if i >= 0] + self.extra_edge_triangles.get(row, [])
+        return [self.get_triangle(i) for i in indices]
+
+    def mark_closing_edge(self, edge: Edge):
+        """
+        Mark that an edge closed a loop of edges in the mesh when it was created. Such an edge is counted as if it's
+        part of an additional triangle, so the algorithm won't try to expand into that loop.
+
+        :param edge: The edge.
+        :return: None.
+        """
+        row = self.get_edge_row(edge.p1, edge.p2, create=True)
+        self.edge_flags.data[row] |= IS_CLOSING
+
+    def get_num_triangles(self, edge: Edge) -> int:
+        """
+        Get the number of triangles an edge is in.
+
+        :param edge: The edge.
+        :return: Number of triangles.
+        """
+        row = self.edge_rows.get(self.get_edge_key(edge.p1, edge.p2))
+
+        if row is None:
+            return 0
+
+        return self.edge_num_triangles.data.item(row) + (1 if self.edge_flags.data.item(row) & IS_CLOSING else 0)
+
+    def get_mesh_state(self) -> dict:
+        """
+        Get the mesh as arrays, to save it (see checkpoint.py).
+
+        :return: Dictionary of arrays: the rows of the edges (points, flags, number of triangles and first 2
+        triangles), the triangles after the first 2 of a row as (row, triangle) pairs, and the triangles.
+        """
+        extra = [(row, index) for row, indices in self.extra_edge_triangles.items() for index in indices]
+        return {'edge_points': self.edge_points.array.copy(), 'edge_flags': self.edge_flags.array.copy(),
+                'edge_num_triangles': self.edge_num_triangles.array.copy(),
+                'edge_triangles': self.edge_triangles.array.copy(),
+                'extra_edge_triangles': np.array(extra, dtype=np.int32).reshape(-1, 2),
+                'triangle_points': self.triangle_points.array.copy()}
+
+    def set_mesh_state(self, state: dict):
+        """
+        Replace the mesh with one from get_mesh_state. The rows keep their order, so the edges and triangles are in the
+        same order as they were added.
+
+        :param state: Dictionary of arrays, see get_mesh_state.
+        :return: None.
+        """
+        self.edge_points = GrowableArray((2,), np.int32, capacity=len(state['edge_points']))
+        self.edge_points.extend(state['edge_points'])
+        self.edge_flags = GrowableArray((), np.uint8, capacity=len(state['edge_flags']))
+        self.edge_flags.extend(state['edge_flags'])
+        self.edge_num_triangles = GrowableArray((), np.int32, capacity=len(state['edge_num_triangles']))
+        self.edge_num_triangles.extend(state['edge_num_triangles'])
+        self.edge_triangles = GrowableArray((2,), np.int32, fill_value=-1, capacity=len(state['edge_triangles']))
+        self.edge_triangles.extend(state['edge_triangles'])
+        self.triangle_points = GrowableArray((3,), np.int32, capacity=len(state['triangle_points']))
+        self.triangle_points.extend(state['triangle_points'])
+
+        self.extra_edge_triangles = {}
+
+        for row, index in state['extra_edge_triangles'].tolist():
+            self.extra_edge_triangles.setdefault(row, []).append(index)
+
+        # The lookups are rebuilt from the rows.
+        points = self.edge_points.array.astype(np.int64)
+        low, high = np.minimum(points[:, 0], points[:, 1]), np.maximum(points[:, 0], points[:, 1])
+        self.edge_rows = dict(zip(((low << 32) | high).tolist(), range(len(points))))
+        is_edge = (self.edge_flags.array & IS_EDGE) > 0
+        self.num_edges = int(is_edge.sum())
+        self.adjacency = {}
+
+        for i, j in points[is_edge].tolist():
+            self.adjacency.setdefault(i, set()).add(j)
+            self.adjacency.setdefault(j, set()).add(i)
+
+    def get_edges_array(self) -> np.ndarray:
+        """
+        Get the edges of the mesh as an array of the points ids.
+
+        :return: Array of shape (E, 2), in the order the edges were added.
+        """
+        return self.edge_points.array[(self.edge_flags.array & IS_EDGE) > 0]
+
+    def get_closing_edges(self) -> np.ndarray:
+        """
+        Get the edges that closed a loop in the mesh (see mark_closing_edge).
+
+        :return: Array of shape (C, 2) of the points ids, sorted.
+        """
+        edges = np.sort(self.edge_points.array[(self.edge_flags.array & IS_CLOSING) > 0], axis=1)
+        return edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+
+    def get_triangles_array(self) -> np.ndarray:
+        """
+        Get the triangles of the mesh as an array of the points ids.
+
+        :return: Array of shape (T, 3) (a view, don't keep it after adding triangles).
+        """
+        return self.triangle_points.array
+
+
+class EdgesView:
+    def __init__(self, grid: Grid):
+        """
+        The edges of a grid's mesh as a sequence of Edge objects, which are created when they are accessed. Converting
+        it to a NumPy array gives the points ids of the edges.
+
+        :param grid: The grid.
+        """
+        self.grid = grid
+        self._rows = None
+
+    @property
+    def rows(self) -> np.ndarray:
+        # The rows of the edges, found only when the edges themselves are needed (len() is just a counter).
+        if self._rows is None:
+            self._rows = np.flatnonzero(self.grid.edge_flags.array & IS_EDGE)
+
+        return self._rows
+
+    def __len__(self):
+        return self.grid.num_edges if self._rows is None else len(self._rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.grid.get_edge_by_row(row) for row in self.rows[i]]
+
+        return self.grid.get_edge_by_row(self.rows[i])
+
+    def __iter__(self):
+        for row in self.rows:
+            yield self.grid.get_edge_by_row(row)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.grid.edge_points.data[self.rows].astype(dtype or np.int32)
+
+
+class TrianglesView:
+    def __init__(self, grid: Grid):
+        """
+        The triangles of a grid's mesh as a sequence of lists of 3 points, which are created when they are accessed.
+        Converting it to a NumPy array gives the points ids of the triangles.
+
+        :param grid: The grid.
+        """
+        self.grid = grid
+        self.size = len(grid.triangle_points)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.grid.get_triangle(j) for j in range(*i.indices(self.size))]
+
+        if i < 0:
+            i += self.size
+
+        if not 0 <= i < self.size:
+            raise IndexError("triangle index out of range")
+
+        return self.grid.get_triangle(i)
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self.grid.get_triangle(i)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.grid.triangle_points.data[:self.size].astype(dtype or np.int32)
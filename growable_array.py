@@ -0,0 +1,82 @@
+import numpy as np
+
+
+class GrowableArray:
+    def __init__(self, shape=(), dtype=np.int32, fill_value=0, capacity=16):
+        """
+        An array that grows along its first axis. Its capacity is doubled when it's full, so appending is O(1)
+        amortized, and the values stay in a single contiguous buffer.
+
+        :param shape: (Optional) the shape of each row.
+        :param dtype: (Optional) the type of the values.
+        :param fill_value: (Optional) the value of new rows before they are set.
+        :param capacity: (Optional) the initial number of rows the buffer can hold.
+        """
+        self.fill_value = fill_value
+        self.data = np.full((max(capacity, 1),) + tuple(shape), fill_value, dtype=dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def array(self) -> np.ndarray:
+        """
+        Get the rows of the array (a view, don't keep it after appending).
+
+        :return: The array.
+        """
+        return self.data[:self.size]
+
+    def reserve(self, capacity: int):
+        """
+        Make sure the buffer can hold a number of rows.
+
+        :param capacity: The number of rows.
+        :return: None.
+        """
+        if capacity <= len(self.data):
+            return
+
+        data = np.full((max(capacity, 2 * len(self.data)),) + self.data.shape[1:], self.fill_value,
+                       dtype=self.data.dtype)
+        data[:self.size] = self.data[:self.size]
+        self.data = data
+
+    def append(self, row) -> int:
+        """
+        Add a row to the end of the array.
+
+        :param row: The row.
+        :return: The index of the row.
+        """
+        if self.size == len(self.data):
+            self.reserve(self.size + 1)
+
+        self.data[self.size] = row
+        self.size += 1
+        return self.size - 1
+
+    def grow(self, count=1) -> int:
+        """
+        Add rows with the fill value to the end of the array (rows past the end always hold the fill value, so they
+        aren't written again).
+
+        :param count: (Optional) the number of rows.
+        :return: The index of the first new row.
+        """
+        self.reserve(self.size + count)
+        self.size += count
+        return self.size - count
+
+    def extend(self, rows):
+        """
+        Add rows to the end of the array.
+
+        :param rows: Array-like of rows.
+        :return: None.
+        """
+        rows = np.asarray(rows, dtype=self.data.dtype).reshape((-1,) + self.data.shape[1:])
+        self.reserve(self.size + len(rows))
+        self.data[self.size:self.size + len(rows)] = rows
+        self.size += len(rows)
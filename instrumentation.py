@@ -0,0 +1,169 @@
+import cProfile
+import collections
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+
+"""
+Counters, phase timers and profilers for the algorithm (see BPA's stats and profile arguments). When they are disabled
+BPA.stats is None, and every hook in the algorithm is a single check of that.
+"""
+
+PROFILERS = ('cprofile', 'sampling')
+
+# Number of functions kept in the exported profile.
+PROFILE_TOP = 30
+
+# Seconds between samples of the sampling profiler.
+SAMPLING_INTERVAL = 0.005
+
+
+class Stats:
+    def __init__(self, profile=None):
+        """
+        :param profile: (Optional) a profiler to run while the mesh is created, one of PROFILERS: 'cprofile' (exact,
+        but slows the algorithm down) or 'sampling' (samples the stack every few milliseconds from another thread).
+        """
+        if profile is not None and profile not in PROFILERS:
+            raise ValueError("Unknown profiler '{}', expected one of {}".format(profile, PROFILERS))
+
+        self.counters = collections.Counter()
+        self.timers = collections.defaultdict(float)
+        self.profile = profile
+        self.profiler = None
+        self.profile_results = None
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def add_time(self, name: str, start: float):
+        """
+        Add the time since start to a timer.
+
+        :param name: The name of the timer.
+        :param start: The start time, from time.perf_counter().
+        :return: None.
+        """
+        self.timers[name] += time.perf_counter() - start
+
+    def timed(self, name: str, function):
+        """
+        Wrap a function so its calls are counted and the time spent in it is added to a timer, both under the same
+        name.
+
+        :param name: The name of the counter and the timer.
+        :param function: The function.
+        :return: The wrapped function.
+        """
+        def wrapper(*args, **kwargs):
+            self.counters[name] += 1
+            start = time.perf_counter()
+
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.timers[name] += time.perf_counter() - start
+
+        return wrapper
+
+    def start_profile(self):
+        if self.profile == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif self.profile == 'sampling':
+            self.profiler = SamplingProfiler(threading.current_thread().ident)
+            self.profiler.start()
+
+    def stop_profile(self):
+        if self.profiler is None:
+            return
+
+        if self.profile == 'cprofile':
+            self.profiler.disable()
+            stats = pstats.Stats(self.profiler)
+            functions = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:PROFILE_TOP]
+            self.profile_results = [{'function': format_function(*function), 'calls': calls, 'self_time': self_time,
+                                     'total_time': total_time}
+                                    for function, (_, calls, self_time, total_time, _) in functions]
+        else:
+            self.profile_results = self.profiler.stop()
+
+        self.profiler = None
+
+    def to_dict(self) -> dict:
+        return {'counters': dict(self.counters), 'timers': dict(self.timers), 'profile': self.profile_results}
+
+    def save(self, path: str):
+        """
+        Write the counters, timers and profile to a JSON file.
+
+        :param path: The path to the file.
+        :return: None.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id, interval=SAMPLING_INTERVAL):
+        """
+        Sample the stack of a thread from another thread, and count the functions in it. Costs the profiled thread
+        little, since it only has to give up the GIL for the samples.
+
+        :param thread_id: The id of the thread to sample.
+        :param interval: (Optional) seconds between samples.
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.num_samples = 0
+        self.self_samples = collections.Counter()  # The sampled stacks' top functions.
+        self.total_samples = collections.Counter()  # All the functions in the sampled stacks.
+        self.is_running = False
+        self.thread = None
+
+    def start(self):
+        self.is_running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.is_running:
+            frame = sys._current_frames().get(self.thread_id)
+
+            if frame is not None:
+                self.num_samples += 1
+                self.self_samples[format_code(frame.f_code)] += 1
+                functions = set()
+
+                while frame is not None:
+                    functions.add(format_code(frame.f_code))
+                    frame = frame.f_back
+
+                self.total_samples.update(functions)
+
+            time.sleep(self.interval)
+
+    def stop(self) -> list:
+        """
+        Stop sampling.
+
+        :return: List of the most sampled functions, with the fraction of the samples they were running in (self) and
+        were on the stack in (total).
+        """
+        self.is_running = False
+        self.thread.join()
+        total = max(self.num_samples, 1)
+        return [{'function': function, 'self_fraction': self.self_samples[function] / total,
+                 'total_fraction': samples / total}
+                for function, samples in self.total_samples.most_common(PROFILE_TOP)]
+
+
+def format_function(path, line, name) -> str:
+    return '{}:{}({})'.format(os.path.basename(path), line, name)
+
+
+def format_code(code) -> str:
+    return format_function(code.co_filename, code.co_firstlineno, code.co_name)
@@ -0,0 +1,320 @@
+import math
+import numpy as np
+
+"""
+Geometry kernels for the per-triangle checks of the algorithm. They work on the raw coordinates and normals and on
+points indices, with scalar arithmetic only, so they are compiled with Numba's njit when it's installed. Without Numba
+they run as plain Python over rows converted to lists (see RowCache), which is still much faster than building small
+NumPy arrays for every check.
+"""
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        # No Numba, the kernels stay plain Python functions.
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+
+        return lambda function: function
+
+
+# Why check_candidates rejected a candidate (ACCEPTED if it didn't).
+ACCEPTED = 0
+REJECTED_SAME_POINT = 1  # The candidate is a point of the edge or of the triangle we expand.
+REJECTED_OVERLAP = 2  # The new triangle would overlap the triangle we expand.
+REJECTED_BALL = 3  # The ball doesn't fit in the triangle (incircle mode) or can't touch its 3 points (pivot mode).
+REJECTED_ANGLE = 4  # The triangle is too acute or obtuse.
+
+
+# Number of rows a RowCache keeps as lists before it starts over.
+CACHE_ROWS = 1 << 16
+
+
+class RowCache(dict):
+    def __init__(self, array, max_rows=CACHE_ROWS):
+        """
+        The rows of an array of shape (N, 3) for the plain Python kernels, as a dictionary of row index to list.
+        Indexing a NumPy array one value at a time is slow, and converting the whole array to lists costs more than 10
+        times its memory, so a row is converted when it's first read (reading the rows that were is a plain dictionary
+        lookup). The algorithm works on one neighborhood at a time, so a bounded number of rows is enough.
+
+        :param array: The array. It's not copied.
+        :param max_rows: (Optional) the number of rows kept, the cache is cleared when it's full.
+        """
+        super().__init__()
+        self.array = array
+        self.max_rows = max_rows
+
+    def __missing__(self, i):
+        if len(self) >= self.max_rows:
+            self.clear()
+
+        row = self[i] = self.array[i].tolist()
+        return row
+
+
+def as_kernel_array(array):
+    """
+    Convert an array of shape (N, 3) to what the kernels expect: a float64 array for Numba, or a RowCache over the
+    array for plain Python.
+
+    :param array: The array, or None.
+    :return: The converted array, or None.
+    """
+    if array is None:
+        return None
+
+    if HAS_NUMBA:
+        return np.ascontiguousarray(array, dtype=np.float64)
+
+    return RowCache(array)
+
+
+@njit(cache=True)
+def distance(c, i, j):
+    """
+    Calculate the distance between 2 points.
+
+    :param c: The coordinates (see as_kernel_array).
+    :param i: Index of the first point.
+    :param j: Index of the second point.
+    :return: The distance.
+    """
+    ci, cj = c[i], c[j]
+    dx = ci[0] - cj[0]
+    dy = ci[1] - cj[1]
+    dz = ci[2] - cj[2]
+    return math.sqrt(dx * dx + dy * dy + dz * dz)
+
+
+@njit(cache=True)
+def distance_point_to_edge(c, k, i, j):
+    """
+    Calculate the distance of a point to the line through an edge.
+
+    :param c: The coordinates (see as_kernel_array).
+    :param k: Index of the point.
+    :param i: Index of the first point of the edge.
+    :param j: Index of the second point of the edge.
+    :return: The distance.
+    """
+    ci, cj, ck = c[i], c[j], c[k]
+    ax, ay, az = ci[0] - ck[0], ci[1] - ck[1], ci[2] - ck[2]
+    bx, by, bz = ci[0] - cj[0], ci[1] - cj[1], ci[2] - cj[2]
+    nx, ny, nz = ay * bz - az * by, az * bx - ax * bz, ax * by - ay * bx
+    return math.sqrt(nx * nx + ny * ny + nz * nz) / math.sqrt(bx * bx + by * by + bz * bz)
+
+
+@njit(cache=True)
+def incircle_radius(c, i, j, k):
+    """
+    Calculate the radius of the incircle of a triangle.
+
+    :param c: The coordinates (see as_kernel_array).
+    :param i: Index of the first point.
+    :param j: Index of the second point.
+    :param k: Index of the third point.
+    :return: The radius, or 0 for a degenerate triangle.
+    """
+    a = distance(c, i, j)
+    b = distance(c, j, k)
+    d = distance(c, i, k)
+    s = (a + b + d) / 2
+
+    if s <= 0:
+        return 0.0
+
+    return math.sqrt(max((s - a) * (s - b) * (s - d) / s, 0.0))
+
+
+@njit(cache=True)
+def angle_between(ux, uy, uz, vx, vy, vz):
+    # The angle between 2 vectors, in degrees.
+    norms = math.sqrt(ux * ux + uy * uy + uz * uz) * math.sqrt(vx * vx + vy * vy + vz * vz)
+
+    if norms == 0:
+        return math.nan
+
+    cosine = min(max((ux * vx + uy * vy + uz * vz) / norms, -1.0), 1.0)
+    return math.degrees(math.acos(cosine))
+
+
+@njit(cache=True)
+def min_max_angle(c, a1, b1, a2, b2, a3, b3):
+    """
+    Calculate the minimum and maximum angles between the 3 edges of a triangle, where each edge is the vector from
+    its second point to its first point (like calc_min_max_angle_of_triangle).
+
+    :param c: The coordinates (see as_kernel_array).
+    :param a1: First point of the first edge.
+    :param b1: Second point of the first edge.
+    :param a2: First point of the second edge.
+    :param b2: Second point of the second edge.
+    :param a3: First point of the third edge.
+    :param b3: Second point of the third edge.
+    :return: Minimum angle, maximum angle, in degrees.
+    """
+    ca, cb = c[a1], c[b1]
+    v1x, v1y, v1z = ca[0] - cb[0], ca[1] - cb[1], ca[2] - cb[2]
+    ca, cb = c[a2], c[b2]
+    v2x, v2y, v2z = ca[0] - cb[0], ca[1] - cb[1], ca[2] - cb[2]
+    ca, cb = c[a3], c[b3]
+    v3x, v3y, v3z = ca[0] - cb[0], ca[1] - cb[1], ca[2] - cb[2]
+    angle1 = angle_between(v1x, v1y, v1z, v2x, v2y, v2z)
+    angle2 = angle_between(v1x, v1y, v1z, v3x, v3y, v3z)
+    angle3 = angle_between(v2x, v2y, v2z, v3x, v3y, v3z)
+    return min(angle1, angle2, angle3), max(angle1, angle2, angle3)
+
+
+@njit(cache=True)
+def triangle_normal_dot(c, n, i, j, k, m):
+    """
+    Calculate the dot product of the normal of a triangle (the cross product of (j - i) and (k - i)) with the normal
+    of a point.
+
+    :param c: The coordinates (see as_kernel_array).
+    :param n: The normals (see as_kernel_array).
+    :param i: Index of the first point of the triangle.
+    :param j: Index of the second point of the triangle.
+    :param k: Index of the third point of the triangle.
+    :param m: Index of the point whose normal is used.
+    :return: The dot product.
+    """
+    ci, cj, ck, nm = c[i], c[j], c[k], n[m]
+    ux, uy, uz = cj[0] - ci[0], cj[1] - ci[1], cj[2] - ci[2]
+    vx, vy, vz = ck[0] - ci[0], ck[1] - ci[1], ck[2] - ci[2]
+    return (uy * vz - uz * vy) * nm[0] + (uz * vx - ux * vz) * nm[1] + (ux * vy - uy * vx) * nm[2]
+
+
+@njit(cache=True)
+def sign(value):
+    return (value > 0) - (value < 0)
+
+
+@njit(cache=True)
+def will_triangles_overlap(c, i, j, k, m):
+    """
+    Check if the triangle (i, j, k) and the triangle (i, j, m) are on the same side of their common edge (i, j).
+
+    :param c: The coordinates (see as_kernel_array).
+    :param i: First point of the edge.
+    :param j: Second point of the edge.
+    :param k: Third point of the first triangle.
+    :param m: Third point of the second triangle.
+    :return: Boolean.
+    """
+    ci, cj, ck, cm = c[i], c[j], c[k], c[m]
+    v1x, v1y, v1z = ck[0] - ci[0], ck[1] - ci[1], ck[2] - ci[2]
+    v2x, v2y, v2z = cj[0] - ci[0], cj[1] - ci[1], cj[2] - ci[2]
+    v3x, v3y, v3z = cm[0] - ci[0], cm[1] - ci[1], cm[2] - ci[2]
+
+    # The normal of the first triangle, and the normal of the plane through the edge that is orthogonal to it.
+    tx, ty, tz = v1y * v2z - v1z * v2y, v1z * v2x - v1x * v2z, v1x * v2y - v1y * v2x
+    px, py, pz = v2y * tz - v2z * ty, v2z * tx - v2x * tz, v2x * ty - v2y * tx
+    return sign(px * v1x + py * v1y + pz * v1z) == sign(px * v3x + py * v3y + pz * v3z)
+
+
+@njit(cache=True)
+def ball_center(c, n, i, j, k, radius):
+    """
+    Calculate the center of the ball of a given radius that touches 3 points, on the side the points' normals are
+    pointing to (like utils.calc_ball_centers, for a single triangle).
+
+    :param c: The coordinates (see as_kernel_array).
+    :param n: The normals (see as_kernel_array).
+    :param i: Index of the first point.
+    :param j: Index of the second point.
+    :param k: Index of the third point.
+    :param radius: The ball's radius.
+    :return: Whether the ball can touch the 3 points, and the center's coordinates.
+    """
+    ci, cj, ck = c[i], c[j], c[k]
+    ax, ay, az = ci[0], ci[1], ci[2]
+    bx, by, bz = cj[0] - ax, cj[1] - ay, cj[2] - az
+    cx, cy, cz = ck[0] - ax, ck[1] - ay, ck[2] - az
+
+    # The normal of the triangle.
+    nx, ny, nz = by * cz - bz * cy, bz * cx - bx * cz, bx * cy - by * cx
+    n_norm_2 = nx * nx + ny * ny + nz * nz
+
+    if n_norm_2 == 0:
+        return False, 0.0, 0.0, 0.0
+
+    # The circumcenter, relative to the first point.
+    ac_2, ab_2 = cx * cx + cy * cy + cz * cz, bx * bx + by * by + bz * bz
+    ox = (ac_2 * (ny * bz - nz * by) + ab_2 * (cy * nz - cz * ny)) / (2 * n_norm_2)
+    oy = (ac_2 * (nz * bx - nx * bz) + ab_2 * (cz * nx - cx * nz)) / (2 * n_norm_2)
+    oz = (ac_2 * (nx * by - ny * bx) + ab_2 * (cx * ny - cy * nx)) / (2 * n_norm_2)
+    h_2 = radius * radius - (ox * ox + oy * oy + oz * oz)
+
+    if h_2 < 0:
+        return False, 0.0, 0.0, 0.0
+
+    # The ball is on the side of the triangle the points normals are pointing to.
+    norm = math.sqrt(n_norm_2)
+    nx, ny, nz = nx / norm, ny / norm, nz / norm
+
+    ni, nj, nk = n[i], n[j], n[k]
+
+    if nx * (ni[0] + nj[0] + nk[0]) + ny * (ni[1] + nj[1] + nk[1]) + nz * (ni[2] + nj[2] + nk[2]) < 0:
+        nx, ny, nz = -nx, -ny, -nz
+
+    h = math.sqrt(h_2)
+    return True, ax + ox + h * nx, ay + oy + h * ny, az + oz + h * nz
+
+
+@njit(cache=True)
+def check_candidates(c, n, i, j, third, candidates, radius, incircle):
+    """
+    Check which candidates make a valid triangle with the edge (i, j), with the checks that don't depend on the mesh:
+    the new triangle doesn't overlap the triangle (i, j, third), the ball fits it, and it's not too acute or obtuse.
+    In pivot mode (incircle is False) the ball only has to touch the 3 points, checking that it's empty is left to the
+    caller.
+
+    :param c: The coordinates (see as_kernel_array).
+    :param n: The normals (see as_kernel_array).
+    :param i: First point of the edge.
+    :param j: Second point of the edge.
+    :param third: Third point of the triangle we expand, or -1.
+    :param candidates: Array of the candidates indices.
+    :param radius: The ball's radius.
+    :param incircle: Whether the ball should fit inside the triangle (incircle mode), or touch its points (pivot mode).
+    :return: Array of why each candidate was rejected (ACCEPTED for the valid ones, see the REJECTED_* codes), and
+    boolean array of the candidates whose triangle should be reversed to agree with the normal of i.
+    """
+    reasons = np.full(len(candidates), ACCEPTED, dtype=np.int8)
+    flip = np.zeros(len(candidates), dtype=np.bool_)
+
+    for a in range(len(candidates)):
+        k = candidates[a]
+
+        if k == i or k == j or k == third:
+            reasons[a] = REJECTED_SAME_POINT
+            continue
+
+        if third >= 0 and will_triangles_overlap(c, i, j, third, k):
+            reasons[a] = REJECTED_OVERLAP
+            continue
+
+        if incircle:
+            if incircle_radius(c, i, j, k) < radius:
+                reasons[a] = REJECTED_BALL
+                continue
+        elif not ball_center(c, n, i, j, k, radius)[0]:
+            reasons[a] = REJECTED_BALL
+            continue
+
+        # Get rid of these extreme acute or obtuse triangles.
+        min_angle, max_angle = min_max_angle(c, i, k, j, k, i, j)
+
+        if max_angle > 180 or min_angle < 1:
+            reasons[a] = REJECTED_ANGLE
+            continue
+
+        flip[a] = triangle_normal_dot(c, n, i, j, k, i) < 0
+
+    return reasons, flip
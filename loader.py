@@ -0,0 +1,92 @@
+from itertools import islice
+from typing import Iterator
+import numpy as np
+
+"""
+Fast loading of point clouds from text files, where each line is either "x y z" or "x y z nx ny nz". The lines are
+parsed in chunks straight into NumPy arrays, instead of splitting and converting each token in Python.
+"""
+
+DEFAULT_CHUNK_SIZE = 1 << 16  # Lines.
+
+
+def parse_lines(lines) -> (np.ndarray, np.ndarray):
+    """
+    Parse lines of points.
+
+    :param lines: List of lines.
+    :return: Array of shape (N, 3) of the coordinates, and array of shape (N, 3) of the normals (nan for points without
+    a normal).
+    """
+    try:
+        # Fast path, all lines have the same number of columns.
+        values = np.loadtxt(lines, dtype=np.float64, ndmin=2)
+    except ValueError:
+        values = None
+
+    if values is None or values.shape[1] not in (3, 6):
+        # Slow path, lines with other than 3 or 6 values are skipped, and points without normals get nan normals.
+        rows = []
+
+        for line in lines:
+            tokens = line.split()
+
+            if len(tokens) == 3:
+                rows.append(tokens + ['nan', 'nan', 'nan'])
+            elif len(tokens) == 6:
+                rows.append(tokens)
+
+        values = np.array(rows, dtype=np.float64).reshape(-1, 6)
+
+    coordinates = values[:, :3].astype(np.float32)
+
+    if values.shape[1] == 6:
+        normals = values[:, 3:].astype(np.float32)
+    else:
+        normals = np.full_like(coordinates, np.nan)
+
+    return coordinates, normals
+
+
+def iter_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator:
+    """
+    Read the points of a text file in chunks, so files that don't fit in memory can be streamed.
+
+    :param path: The path to the text file.
+    :param chunk_size: (Optional) number of lines in each chunk.
+    :return: Iterator of (coordinates, normals) chunks, as parse_lines returns them.
+    """
+    with open(path, "r") as f:
+        while 1:
+            lines = list(islice(f, chunk_size))
+
+            if len(lines) == 0:
+                return
+
+            coordinates, normals = parse_lines(lines)
+
+            if len(coordinates) > 0:
+                yield coordinates, normals
+
+
+def load_points(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> (np.ndarray, np.ndarray):
+    """
+    Load all the points of a text file.
+
+    :param path: The path to the text file.
+    :param chunk_size: (Optional) number of lines parsed at once.
+    :return: Array of shape (N, 3) of the coordinates, and array of shape (N, 3) of the normals, or None if no point
+    has a normal.
+    """
+    chunks = list(iter_chunks(path, chunk_size))
+
+    if len(chunks) == 0:
+        return np.zeros((0, 3), dtype=np.float32), None
+
+    coordinates = np.concatenate([coordinates for coordinates, _ in chunks])
+    normals = np.concatenate([normals for _, normals in chunks])
+
+    if np.isnan(normals).all():
+        normals = None
+
+    return coordinates, normals
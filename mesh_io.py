@@ -0,0 +1,227 @@
+import os
+import struct
+import numpy as np
+
+"""
+Writers of the reconstructed mesh, in OBJ, PLY (ASCII or binary) and binary STL. The triangles are given as arrays of
+shape (T, 3) of the points indices. The vertices are written when the file is opened, and the triangles can then be
+written in chunks while the mesh is created. The triangles count in the header is updated after every chunk, so the
+file is a valid mesh of the triangles written so far even if the run is stopped.
+"""
+
+# Number of new triangles create_mesh collects before writing them.
+MESH_CHUNK_SIZE = 1 << 14
+
+# Number of vertices written at once, so memory mapped points (see streaming.py) are not all loaded.
+VERTICES_CHUNK_SIZE = 1 << 16
+
+PLY_COUNT_WIDTH = 10  # The faces count in the PLY header is padded to this width, so it can be rewritten in place.
+STL_HEADER_SIZE = 80
+
+PLY_FACE_DTYPE = np.dtype([('count', 'u1'), ('indices', '<i4', (3,))])
+STL_TRIANGLE_DTYPE = np.dtype([('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')])
+
+
+class MeshWriter:
+    def __init__(self, path, coordinates, normals=None):
+        """
+        Open a mesh file and write its vertices.
+
+        :param path: The path to the file.
+        :param coordinates: Array of shape (N, 3) of the vertices.
+        :param normals: (Optional) array of shape (N, 3) of the vertices normals.
+        """
+        self.path = path
+        self.coordinates = np.asarray(coordinates, dtype=np.float32)
+        self.normals = None if normals is None else np.asarray(normals, dtype=np.float32)
+        self.num_triangles = 0
+        self.file = open(path, 'wb')
+        self.write_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write_header(self):
+        pass
+
+    def write_faces(self, triangles: np.ndarray):
+        raise NotImplementedError
+
+    def update_count(self):
+        pass
+
+    def write_triangles(self, triangles):
+        """
+        Append triangles to the file, and flush it.
+
+        :param triangles: Array-like of shape (T, 3) of the points indices of the triangles.
+        :return: None.
+        """
+        triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+
+        if len(triangles) == 0:
+            return
+
+        self.write_faces(triangles)
+        self.num_triangles += len(triangles)
+        self.update_count()
+        self.file.flush()
+
+    def close(self):
+        """
+        Close the file.
+
+        :return: None.
+        """
+        if not self.file.closed:
+            self.file.close()
+
+
+class ObjWriter(MeshWriter):
+    def write_header(self):
+        for start in range(0, len(self.coordinates), VERTICES_CHUNK_SIZE):
+            self.file.write(format_rows('v', self.coordinates[start:start + VERTICES_CHUNK_SIZE], '%.9g'))
+
+        if self.normals is not None:
+            for start in range(0, len(self.normals), VERTICES_CHUNK_SIZE):
+                self.file.write(format_rows('vn', self.normals[start:start + VERTICES_CHUNK_SIZE], '%.9g'))
+
+    def write_faces(self, triangles: np.ndarray):
+        # OBJ indices start from 1.
+        triangles = triangles + 1
+
+        if self.normals is None:
+            self.file.write(format_rows('f', triangles, '%d'))
+        else:
+            self.file.write(format_rows('f', np.repeat(triangles, 2, axis=1), '%d//%d'))
+
+
+class PlyWriter(MeshWriter):
+    def __init__(self, path, coordinates, normals=None, binary=True):
+        """
+        :param binary: (Optional) whether to write a binary (little endian) or an ASCII PLY.
+        """
+        self.binary = binary
+        self.count_offset = None
+        super().__init__(path, coordinates, normals=normals)
+
+    def write_header(self):
+        properties = ['x', 'y', 'z'] + (['nx', 'ny', 'nz'] if self.normals is not None else [])
+        header = 'ply\nformat {} 1.0\nelement vertex {}\n'.format(
+            'binary_little_endian' if self.binary else 'ascii', len(self.coordinates))
+        header += ''.join('property float {}\n'.format(name) for name in properties)
+        header += 'element face '
+        self.count_offset = len(header)
+        header += '0'.ljust(PLY_COUNT_WIDTH) + '\nproperty list uchar int vertex_indices\nend_header\n'
+        self.file.write(header.encode('ascii'))
+
+        for start in range(0, len(self.coordinates), VERTICES_CHUNK_SIZE):
+            vertices = self.coordinates[start:start + VERTICES_CHUNK_SIZE]
+
+            if self.normals is not None:
+                vertices = np.hstack([vertices, self.normals[start:start + VERTICES_CHUNK_SIZE]])
+
+            if self.binary:
+                self.file.write(vertices.astype('<f4').tobytes())
+            else:
+                self.file.write(format_rows(None, vertices, '%.9g'))
+
+    def write_faces(self, triangles: np.ndarray):
+        if self.binary:
+            faces = np.empty(len(triangles), dtype=PLY_FACE_DTYPE)
+            faces['count'] = 3
+            faces['indices'] = triangles
+            self.file.write(faces.tobytes())
+        else:
+            self.file.write(format_rows('3', triangles, '%d'))
+
+    def update_count(self):
+        self.file.seek(self.count_offset)
+        self.file.write(str(self.num_triangles).ljust(PLY_COUNT_WIDTH).encode('ascii'))
+        self.file.seek(0, os.SEEK_END)
+
+
+class StlWriter(MeshWriter):
+    """
+    Binary STL. It has no shared vertices, so the coordinates of each triangle are written with it.
+    """
+    def write_header(self):
+        self.file.write(b'Ball pivoting mesh'.ljust(STL_HEADER_SIZE, b'\0'))
+        self.file.write(struct.pack('<I', 0))
+
+    def write_faces(self, triangles: np.ndarray):
+        vertices = self.coordinates[triangles].astype(np.float64)
+        normals = np.cross(vertices[:, 1] - vertices[:, 0], vertices[:, 2] - vertices[:, 0])
+        norms = np.linalg.norm(normals, axis=1)
+        normals[norms > 0] /= norms[norms > 0, None]
+
+        records = np.zeros(len(triangles), dtype=STL_TRIANGLE_DTYPE)
+        records['normal'] = normals
+        records['vertices'] = vertices
+        self.file.write(records.tobytes())
+
+    def update_count(self):
+        self.file.seek(STL_HEADER_SIZE)
+        self.file.write(struct.pack('<I', self.num_triangles))
+        self.file.seek(0, os.SEEK_END)
+
+
+WRITERS = {'.obj': ObjWriter, '.ply': PlyWriter, '.stl': StlWriter}
+
+
+def format_rows(prefix, rows, fmt) -> bytes:
+    """
+    Format the rows of an array as lines of text.
+
+    :param prefix: The first word of each line, or None.
+    :param rows: 2D array.
+    :param fmt: The format of a single value, or of a few consecutive values (like '%d//%d').
+    :return: The lines, encoded.
+    """
+    line = ' '.join([fmt] * (rows.shape[1] // fmt.count('%'))) + '\n'
+
+    if prefix is not None:
+        line = prefix + ' ' + line
+
+    return ''.join(line % tuple(row) for row in rows.tolist()).encode('ascii')
+
+
+def open_writer(path, coordinates, normals=None, binary=True) -> MeshWriter:
+    """
+    Open a mesh writer, by the extension of the file: .obj, .ply or .stl.
+
+    :param path: The path to the file.
+    :param coordinates: Array of shape (N, 3) of the vertices.
+    :param normals: (Optional) array of shape (N, 3) of the vertices normals. STL files have no vertices normals.
+    :param binary: (Optional) for PLY files, whether to write a binary or an ASCII file. OBJ files are always ASCII and
+    STL files are always binary.
+    :return: The writer.
+    """
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension not in WRITERS:
+        raise ValueError("Unknown mesh format '{}', expected one of {}".format(extension, tuple(WRITERS)))
+
+    if extension == '.ply':
+        return PlyWriter(path, coordinates, normals=normals, binary=binary)
+
+    return WRITERS[extension](path, coordinates, normals=normals)
+
+
+def write_mesh(path, coordinates, triangles, normals=None, binary=True):
+    """
+    Write a whole mesh to a file (see open_writer).
+
+    :param path: The path to the file.
+    :param coordinates: Array of shape (N, 3) of the vertices.
+    :param triangles: Array of shape (T, 3) of the points indices of the triangles.
+    :param normals: (Optional) array of shape (N, 3) of the vertices normals.
+    :param binary: (Optional) for PLY files, whether to write a binary or an ASCII file.
+    :return: None.
+    """
+    with open_writer(path, coordinates, normals=normals, binary=binary) as writer:
+        for start in range(0, len(triangles), MESH_CHUNK_SIZE):
+            writer.write_triangles(triangles[start:start + MESH_CHUNK_SIZE])
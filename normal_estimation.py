@@ -0,0 +1,238 @@
+from multiprocessing import Pool
+import numpy as np
+
+from spatial_index import SpatialIndex, HashGridIndex, KDTreeIndex
+
+"""
+Normal estimation for clouds without normals (raw scans, files of "x y z" lines). The normal of a point is the
+direction its k nearest neighbors spread the least along: the eigenvector of the smallest eigenvalue of their
+covariance matrix (PCA). The sign of such a normal is arbitrary, so the normals are oriented like Hoppe et al.: the
+neighbors make a graph whose edges weigh 1 - |n_i . n_j|, and the sign is propagated over its minimum spanning tree,
+where the neighbors' normals are close to parallel and the propagation is least likely to go wrong. Finally each
+connected part of the graph is flipped as a whole, so its normals point outwards (away from its center), or to the
+same side as the normals the points already have.
+
+All the steps work on arrays: the neighbors are queried and the covariances are decomposed in chunks of points
+(which can also be spread over processes), and the spanning tree is built with Boruvka's algorithm, where all the parts
+pick their lightest edge at once.
+"""
+
+NUM_NEIGHBORS = 10  # Number of neighbors of a point (itself included) its normal is estimated from.
+CHUNK_SIZE = 1 << 14  # Number of points whose neighbors are queried at once.
+
+# The index the workers query, set by init_worker. With fork it's inherited, not copied.
+worker_index = None
+
+
+def get_pca_normals(coordinates, neighbors) -> np.ndarray:
+    """
+    Estimate the normals of points from their neighbors, without orienting them.
+
+    :param coordinates: Array of shape (N, 3) of all the coordinates.
+    :param neighbors: Array of shape (Q, k) of the indices of the neighbors of each point.
+    :return: Array of shape (Q, 3) of unit normals.
+    """
+    points = coordinates[neighbors].astype(np.float64)
+    points -= points.mean(axis=1, keepdims=True)
+    covariances = np.einsum('nki,nkj->nij', points, points)
+
+    # eigh sorts the eigenvalues in ascending order, so the first eigenvector is the normal.
+    _, vectors = np.linalg.eigh(covariances)
+    return vectors[:, :, 0]
+
+
+def estimate_chunk(index, coordinates, start, end, num_neighbors) -> (np.ndarray, np.ndarray):
+    """
+    Find the neighbors of a chunk of points and estimate their normals.
+
+    :param index: The spatial index of the points.
+    :param coordinates: Array of shape (N, 3) of all the coordinates.
+    :param start: The first point of the chunk.
+    :param end: The end of the chunk.
+    :param num_neighbors: Number of neighbors of each point.
+    :return: Array of shape (end - start, k) of the neighbors, and array of shape (end - start, 3) of the normals.
+    """
+    neighbors = index.query_knn(coordinates[start:end], num_neighbors)
+    return neighbors, get_pca_normals(coordinates, neighbors)
+
+
+def init_worker(index):
+    global worker_index
+    worker_index = index
+
+
+def estimate_worker_chunk(args) -> (np.ndarray, np.ndarray):
+    """
+    Same as estimate_chunk, with the worker's index. Runs in a worker process.
+
+    :param args: Tuple of the chunk's start and end, and the number of neighbors.
+    :return: Same as estimate_chunk.
+    """
+    start, end, num_neighbors = args
+    return estimate_chunk(worker_index, worker_index.coordinates, start, end, num_neighbors)
+
+
+def get_knn_index(coordinates, num_neighbors, index=None) -> SpatialIndex:
+    """
+    Get an index for the nearest neighbors queries. The hash grid looks for the neighbors in rings of cells, which is
+    only fast if a few rings are enough, so its cells are reused if they are at least as large as the expected distance
+    of the neighbors (see SpatialIndex.query_knn). Otherwise, a KD-tree is built.
+
+    :param coordinates: Array of shape (N, 3) of the coordinates.
+    :param num_neighbors: Number of neighbors of each point.
+    :param index: (Optional) an index of the points, like the grid's index.
+    :return: The index.
+    """
+    if isinstance(index, KDTreeIndex):
+        return index
+
+    if isinstance(index, HashGridIndex) and len(coordinates) > 0:
+        distance = np.ptp(coordinates, axis=0).max() * (num_neighbors / len(coordinates)) ** (1 / 2)
+
+        if index.cell_size >= distance:
+            return index
+
+    return KDTreeIndex(coordinates, np.arange(len(coordinates)), None)
+
+
+def find_neighbors_and_normals(coordinates, num_neighbors=NUM_NEIGHBORS, index=None, num_workers=1,
+                               chunk_size=CHUNK_SIZE) -> (np.ndarray, np.ndarray):
+    """
+    Find the k nearest neighbors of all points and estimate their (not oriented) normals.
+
+    :param coordinates: Array of shape (N, 3) of the coordinates.
+    :param num_neighbors: (Optional) number of neighbors of each point.
+    :param index: (Optional) a spatial index of the points, whose ids are the indices of the coordinates (like the
+    grid's index). A KD-tree is built if it's not given, or if it doesn't fit (see get_knn_index).
+    :param num_workers: (Optional) number of processes to split the chunks between.
+    :param chunk_size: (Optional) number of points in each chunk.
+    :return: Array of shape (N, k) of the neighbors, and array of shape (N, 3) of the normals.
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 3)
+    index = get_knn_index(coordinates, num_neighbors, index)
+    chunks = [(start, min(start + chunk_size, len(coordinates))) for start in range(0, len(coordinates), chunk_size)]
+
+    if num_workers > 1 and len(chunks) > 1:
+        with Pool(processes=num_workers, initializer=init_worker, initargs=(index,)) as pool:
+            results = pool.map(estimate_worker_chunk, [(start, end, num_neighbors) for start, end in chunks])
+    else:
+        results = [estimate_chunk(index, coordinates, start, end, num_neighbors) for start, end in chunks]
+
+    k = min(num_neighbors, len(coordinates))
+    neighbors = np.concatenate([chunk for chunk, _ in results] + [np.zeros((0, k), dtype=np.int64)])
+    normals = np.concatenate([chunk for _, chunk in results] + [np.zeros((0, 3))])
+    return neighbors, normals
+
+
+def get_spanning_forest_signs(num_points, sources, targets, weights, opposite) -> (np.ndarray, np.ndarray):
+    """
+    Build the minimum spanning forest of a graph with Boruvka's algorithm, and propagate the normals' signs over it.
+    Every round, each part of the forest picks its lightest edge to another part, and the parts are merged along them.
+    A point's sign is kept relative to the root of its part, so merging two parts only changes the signs of one of
+    them, which is done for all the parts at once by pointer jumping.
+
+    :param num_points: Number of points.
+    :param sources: Array of the first point of each edge.
+    :param targets: Array of the second point of each edge.
+    :param weights: Array of the weight of each edge.
+    :param opposite: Boolean array of whether the normals of the edge's points point to opposite sides.
+    :return: Array of the part (its root point) of each point, and boolean array of whether to flip each normal.
+    """
+    # Ties are broken by the order of the edges, so every edge weighs differently and the picked edges make no loops.
+    order = np.argsort(weights, kind='stable')
+    sources, targets, opposite = sources[order], targets[order], opposite[order]
+    parts = np.arange(num_points)
+    flips = np.zeros(num_points, dtype=bool)
+
+    while 1:
+        crossing = parts[sources] != parts[targets]
+        sources, targets, opposite = sources[crossing], targets[crossing], opposite[crossing]
+
+        if len(sources) == 0:
+            return parts, flips
+
+        # The lightest edge of each part is its first edge.
+        edges = np.arange(len(sources))
+        first = np.full(num_points, len(sources))
+        np.minimum.at(first, parts[sources], edges)
+        np.minimum.at(first, parts[targets], edges)
+        merged = np.flatnonzero(first < len(sources))
+        chosen = first[merged]
+        other = np.where(parts[sources[chosen]] == merged, parts[targets[chosen]], parts[sources[chosen]])
+
+        # Point each part at the part it's merged into. Two parts that picked the same edge point at each other, the
+        # one with the smaller root is the root of both.
+        pointers = np.arange(num_points)
+        relative_flips = np.zeros(num_points, dtype=bool)
+        pointers[merged] = other
+        relative_flips[merged] = flips[sources[chosen]] ^ flips[targets[chosen]] ^ opposite[chosen]
+        roots = merged[(pointers[other] == merged) & (merged < other)]
+        pointers[roots] = roots
+        relative_flips[roots] = False
+
+        while 1:
+            next_pointers = pointers[pointers]
+
+            if np.array_equal(next_pointers, pointers):
+                break
+
+            relative_flips ^= relative_flips[pointers]
+            pointers = next_pointers
+
+        flips ^= relative_flips[parts]
+        parts = pointers[parts]
+
+
+def orient_normals(coordinates, normals, neighbors, reference=None) -> np.ndarray:
+    """
+    Orient normals consistently, by propagating their signs over the minimum spanning tree of the neighbors graph.
+
+    :param coordinates: Array of shape (N, 3) of the coordinates.
+    :param normals: Array of shape (N, 3) of the normals.
+    :param neighbors: Array of shape (N, k) of the neighbors of each point.
+    :param reference: (Optional) array of shape (N, 3) of normals to orient by, nan for points without a normal. Each
+    part of the graph is flipped to agree with the most of them, and parts without any are flipped to point outwards.
+    :return: Array of shape (N, 3) of the oriented normals.
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 3)
+    sources = np.repeat(np.arange(len(normals)), neighbors.shape[1])
+    targets = neighbors.ravel()
+    edges = sources != targets
+    sources, targets = sources[edges], targets[edges]
+    dots = np.einsum('ij,ij->i', normals[sources], normals[targets])
+    parts, flips = get_spanning_forest_signs(len(normals), sources, targets, 1 - np.abs(dots), dots < 0)
+    normals = np.where(flips[:, None], -normals, normals)
+
+    # Flip the parts whose normals mostly point inwards.
+    sizes = np.maximum(np.bincount(parts, minlength=len(normals)), 1)
+    centers = np.stack([np.bincount(parts, weights=coordinates[:, axis], minlength=len(normals)) / sizes
+                        for axis in range(3)], axis=1)
+    votes = np.bincount(parts, weights=np.einsum('ij,ij->i', normals, coordinates - centers[parts]),
+                        minlength=len(normals))
+
+    if reference is not None:
+        known = ~np.isnan(reference).any(axis=1)
+        agreement = np.einsum('ij,ij->i', normals[known], reference[known])
+        counts = np.bincount(parts[known], minlength=len(normals))
+        reference_votes = np.bincount(parts[known], weights=agreement, minlength=len(normals))
+        votes = np.where(counts > 0, reference_votes, votes)
+
+    return np.where((votes[parts] < 0)[:, None], -normals, normals)
+
+
+def estimate_normals(coordinates, num_neighbors=NUM_NEIGHBORS, index=None, num_workers=1, reference=None,
+                     chunk_size=CHUNK_SIZE) -> np.ndarray:
+    """
+    Estimate the oriented normals of points.
+
+    :param coordinates: Array of shape (N, 3) of the coordinates.
+    :param num_neighbors: (Optional) number of neighbors each normal is estimated from.
+    :param index: (Optional) a spatial index of the points, whose ids are the indices of the coordinates.
+    :param num_workers: (Optional) number of processes to estimate the normals with.
+    :param reference: (Optional) array of shape (N, 3) of known normals to orient by (see orient_normals).
+    :param chunk_size: (Optional) number of points whose neighbors are queried at once.
+    :return: Array of shape (N, 3) of unit normals.
+    """
+    neighbors, normals = find_neighbors_and_normals(coordinates, num_neighbors, index=index, num_workers=num_workers,
+                                                    chunk_size=chunk_size)
+    return orient_normals(coordinates, normals, neighbors, reference=reference).astype(np.float32)
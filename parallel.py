@@ -0,0 +1,171 @@
+from multiprocessing import Pool, shared_memory
+from typing import List
+import numpy as np
+
+from point_cloud import PointCloud
+
+"""
+Parallel reconstruction, in the spirit of Digne's parallel BPA: the cloud is split into slabs along its longest axis,
+each slab is reconstructed independently in its own process, and the slabs are stitched afterwards by pivoting the ball
+over the boundary edges they left.
+"""
+
+
+def partition_points(coordinates, num_blocks: int) -> (List[np.ndarray], int):
+    """
+    Split the points into slabs along the longest axis of their bounding box. All slabs have (about) the same number
+    of points.
+
+    :param coordinates: Array of shape (N, 3) with the points coordinates.
+    :param num_blocks: Number of slabs.
+    :return: List of arrays of the points indices in each slab, each sorted, and the axis the points were split along.
+    """
+    axis = int(np.argmax(coordinates.max(axis=0) - coordinates.min(axis=0)))
+    order = np.argsort(coordinates[:, axis], kind='stable')
+    return [np.sort(block) for block in np.array_split(order, num_blocks) if len(block) > 0], axis
+
+
+def get_points_near_boundaries(coordinates, blocks: List[np.ndarray], axis: int, distance: float) -> np.ndarray:
+    """
+    Find the points that are close to the boundary between two slabs.
+
+    :param coordinates: Array of shape (N, 3) with the points coordinates.
+    :param blocks: The slabs, as partition_points returned them.
+    :param axis: The axis the points were split along.
+    :param distance: Maximum distance from a boundary.
+    :return: Boolean mask of the points.
+    """
+    values = coordinates[:, axis]
+    near = np.zeros(len(coordinates), dtype=bool)
+
+    for block in blocks[1:]:
+        boundary = values[block].min()
+        near |= np.abs(values - boundary) <= distance
+
+    return near
+
+
+def share_array(array: np.ndarray) -> (shared_memory.SharedMemory, tuple):
+    """
+    Copy an array into shared memory.
+
+    :param array: The array.
+    :return: The shared memory block, and a picklable description of the array to attach to it with attach_array.
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def attach_array(description: tuple) -> (shared_memory.SharedMemory, np.ndarray):
+    """
+    Attach to an array in shared memory.
+
+    :param description: The description share_array returned.
+    :return: The shared memory block (keep a reference to it while using the array) and the array.
+    """
+    name, shape, dtype = description
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def split_iterations(limit_iterations, num_blocks: int) -> list:
+    """
+    Split a limit of iterations between blocks, as evenly as possible.
+
+    :param limit_iterations: The limit, or infinity.
+    :param num_blocks: Number of blocks.
+    :return: List of the limit of each block.
+    """
+    if limit_iterations == np.inf:
+        return [limit_iterations] * num_blocks
+
+    share, remainder = divmod(int(limit_iterations), num_blocks)
+    return [share + 1 if i < remainder else share for i in range(num_blocks)]
+
+
+def reconstruct_block(args) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Reconstruct the mesh of a single block. Runs in a worker process.
+
+    :param args: Tuple of the shared coordinates and normals descriptions, the indices of the block's points, and the
+    keyword arguments for the BPA constructor and for create_mesh.
+    :return: The block's triangles and the edges that closed a loop, both with the global indices of the points, the
+    block's points that have no seed triangle, and the number of iterations the block took.
+    """
+    from bpa import BPA
+
+    coordinates_description, normals_description, indices, bpa_kwargs, mesh_kwargs = args
+    coordinates_block, coordinates = attach_array(coordinates_description)
+    normals = None
+
+    if normals_description is not None:
+        normals_block, normals = attach_array(normals_description)
+        normals = normals[indices]
+        normals_block.close()
+
+    cloud = PointCloud(coordinates[indices], normals=normals)
+    coordinates_block.close()
+
+    bpa = BPA(path=None, cloud=cloud, **bpa_kwargs)
+    bpa.create_mesh(**mesh_kwargs)
+
+    triangles = bpa.grid.get_triangles_array().astype(np.int64)
+    closing_edges = bpa.grid.get_closing_edges().astype(np.int64)
+    return indices[triangles], indices[closing_edges], indices[bpa.exhausted_points], bpa.num_iterations
+
+
+def reconstruct_in_parallel(cloud: PointCloud, num_workers: int, bpa_kwargs: dict, mesh_kwargs: dict,
+                            num_blocks: int = None) -> (np.ndarray, np.ndarray, np.ndarray, int):
+    """
+    Reconstruct the blocks of a point cloud in a pool of processes. The points are shared with the workers through
+    shared memory, so they are not copied for each worker.
+
+    :param cloud: The point cloud.
+    :param num_workers: Number of processes.
+    :param bpa_kwargs: Keyword arguments for the BPA constructor of each block (radius etc.).
+    :param mesh_kwargs: Keyword arguments for create_mesh of each block. Its limit_iterations is split between the
+    blocks (see split_iterations).
+    :param num_blocks: (Optional) number of blocks. Defaults to the number of processes.
+    :return: The triangles and the edges that closed a loop of all blocks, with the global indices of the points, and
+    a boolean mask of the points that have no seed triangle. Points that are close to the boundary between blocks are
+    never in that mask, since they might have a seed triangle with points of the neighbor block. Also the number of
+    iterations all the blocks took together.
+    """
+    if num_blocks is None:
+        num_blocks = num_workers
+
+    blocks, axis = partition_points(cloud.coordinates, num_blocks)
+    shared_blocks = []
+
+    try:
+        coordinates_block, coordinates_description = share_array(cloud.coordinates)
+        shared_blocks.append(coordinates_block)
+        normals_description = None
+
+        if cloud.normals is not None:
+            normals_block, normals_description = share_array(cloud.normals)
+            shared_blocks.append(normals_block)
+
+        limits = split_iterations(mesh_kwargs.get('limit_iterations', np.inf), len(blocks))
+        args = [(coordinates_description, normals_description, indices, bpa_kwargs,
+                 dict(mesh_kwargs, limit_iterations=limit)) for indices, limit in zip(blocks, limits)]
+
+        with Pool(processes=num_workers) as pool:
+            results = pool.map(reconstruct_block, args)
+    finally:
+        for block in shared_blocks:
+            block.close()
+            block.unlink()
+
+    triangles = np.concatenate([triangles for triangles, _, _, _ in results])
+    closing_edges = np.concatenate([closing_edges for _, closing_edges, _, _ in results])
+    exhausted = np.zeros(len(cloud), dtype=bool)
+
+    for _, _, exhausted_points, _ in results:
+        exhausted[exhausted_points] = True
+
+    # The ball touches points up to 2r apart.
+    radius = max(mesh_kwargs.get('radii') or [bpa_kwargs['radius']])
+    exhausted &= ~get_points_near_boundaries(cloud.coordinates, blocks, axis, 2 * radius)
+    return triangles, closing_edges, exhausted, sum(num_iterations for _, _, _, num_iterations in results)
@@ -1,16 +1,72 @@
-import numpy as np
 import utils
 from typing import List
 
+import point_cloud
+
+
 class Point:
+    __slots__ = ('cloud', 'index', 'id')
+
     def __init__(self, x, y, z, id, normal=None):
-        self.z = np.float32(z)
-        self.y = np.float32(y)
-        self.x = np.float32(x)
-        self.cell_code = None
-        self.normal = normal
+        # A standalone point owns a cloud of a single point.
+        self.cloud = point_cloud.PointCloud([[x, y, z]], normals=None if normal is None else [normal])
+        self.index = 0
         self.id = id
-        self.is_used = False
+
+    @classmethod
+    def view(cls, cloud, index):
+        """
+        Create a point which is a view over a point in a point cloud. The point's id is its index in the cloud.
+
+        :param cloud: The point cloud.
+        :param index: The index of the point in the cloud.
+        :return: The point.
+        """
+        p = cls.__new__(cls)
+        p.cloud = cloud
+        p.index = index
+        p.id = index
+        return p
+
+    @property
+    def x(self):
+        return self.cloud.coordinates[self.index, 0]
+
+    @property
+    def y(self):
+        return self.cloud.coordinates[self.index, 1]
+
+    @property
+    def z(self):
+        return self.cloud.coordinates[self.index, 2]
+
+    @property
+    def normal(self):
+        if self.cloud.normals is None:
+            return None
+
+        return self.cloud.normals[self.index]
+
+    @normal.setter
+    def normal(self, normal):
+        self.cloud.set_normal(self.index, normal)
+
+    @property
+    def cell_code(self):
+        code = self.cloud.cell_codes[self.index]
+        return None if code == point_cloud.NO_CELL else int(code)
+
+    @cell_code.setter
+    def cell_code(self, code):
+        self.cloud.cell_codes[self.index] = point_cloud.NO_CELL if code is None else code
+
+    @property
+    def is_used(self) -> bool:
+        return bool(self.cloud.used[self.index])
+
+    @is_used.setter
+    def is_used(self, is_used):
+        self.cloud.used[self.index] = is_used
 
     def __lt__(self, other):
         return self.z <= other.z
@@ -18,22 +74,24 @@ class Point:
     @property
     def neighbor_nodes(self) -> List:
         """
-        Get all the points neighbor points.
+        Get the codes of the point's cell and of the 26 cells around it. The grid has these precomputed, see
+        Grid.get_neighbor_points_ids.
 
-        :return: List of neighbor points.
+        :return: List of cell codes.
         """
-        neighbor_nodes = [self.cell_code]
+        neighbor_nodes = []
 
         # Find the point's cell.
         x, y, z = utils.decode_cell(self.cell_code)
 
-        # Check for each of the possible 8 neighbors if it exists.
+        # Check for each of the 27 cells (the point's cell included) if it exists.
         for i in range(-1, 2):
             for j in range(-1, 2):
                 for k in range(-1, 2):
                     cell_corner = x + i, y + j, z + k
 
-                    if cell_corner[0] < 0 or cell_corner[1] < 0 or cell_corner[2] < 0:
+                    # Cells outside the grid have no points.
+                    if min(cell_corner) < 0 or max(cell_corner) > utils.CELL_MASK:
                         continue
 
                     cell_code = utils.encode_cell(cell_corner[0], cell_corner[1], cell_corner[2])
@@ -0,0 +1,237 @@
+import os
+import struct
+import sys
+import numpy as np
+
+from point_cloud import PointCloud
+
+"""
+Binary cache of a point cloud, so repeated runs on the same scan don't parse its text file again. The file is opened
+with np.memmap, so it's loaded lazily, and processes that open the same file share its pages.
+
+Layout (little endian), each array starts at a multiple of 64 bytes:
+- Header: magic, version, number of points, flags, the radius of the cell codes, and the size and modification time of
+  the text file the cache was created from.
+- Coordinates: float32 (N, 3), sorted lexicographically.
+- Normals: float32 (N, 3), if the cloud has normals.
+- Original indices: int64 (N), the index of each point in the text file (the sort order).
+- Cell codes: int64 (N), the grid cell of each point for the radius in the header, if the cache has them.
+"""
+
+MAGIC = b'BPAC'
+VERSION = 2  # 2: cell codes are relative to the grid's origin, with 21 bits per axis.
+HEADER_FORMAT = '<4sIQIIdQq'
+HEADER_SIZE = 64
+ALIGNMENT = 64
+EXTENSION = '.bpac'
+
+HAS_NORMALS = 1
+HAS_CELL_CODES = 2
+
+
+def get_cache_path(path: str) -> str:
+    """
+    Get the path of the cache of a text file. The cache is saved next to the text file.
+
+    :param path: The path to the text file.
+    :return: The path to the cache.
+    """
+    return path + EXTENSION
+
+
+def is_cache_file(path: str) -> bool:
+    """
+    Check if a file is a point cache.
+
+    :param path: The path to the file.
+    :return: Boolean.
+    """
+    if not os.path.isfile(path):
+        return False
+
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def get_source_stamp(source_path: str) -> (int, int):
+    """
+    Get the size and modification time of a file, used to find out if its cache is stale.
+
+    :param source_path: The path to the file.
+    :return: Size in bytes and modification time in nanoseconds.
+    """
+    stat = os.stat(source_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def get_layout(num_points: int, flags: int) -> dict:
+    """
+    Get the offset of each array in the file.
+
+    :param num_points: Number of points.
+    :param flags: The header's flags.
+    :return: Dictionary of array name to (offset, dtype, shape).
+    """
+    layout = {}
+    offset = HEADER_SIZE
+    arrays = [('coordinates', np.float32, (num_points, 3))]
+
+    if flags & HAS_NORMALS:
+        arrays.append(('normals', np.float32, (num_points, 3)))
+
+    arrays.append(('original_indices', np.int64, (num_points,)))
+
+    if flags & HAS_CELL_CODES:
+        arrays.append(('cell_codes', np.int64, (num_points,)))
+
+    for name, dtype, shape in arrays:
+        offset = align(offset)
+        layout[name] = (offset, dtype, shape)
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+    return layout
+
+
+def write_cache(path: str, cloud: PointCloud, radius: float = None, source_path: str = None):
+    """
+    Write a point cloud to a cache file. The file is written to a temporary file first and then renamed, so processes
+    that have the old cache open are not affected.
+
+    :param path: The path to the cache.
+    :param cloud: The point cloud. Its points should already be sorted.
+    :param radius: (Optional) if given, the points' cell codes (which must be calculated for this radius) are saved.
+    :param source_path: (Optional) the text file the cloud was read from, to detect when the cache is stale.
+    :return: None.
+    """
+    flags = 0
+
+    if cloud.normals is not None:
+        flags |= HAS_NORMALS
+
+    if radius is not None:
+        flags |= HAS_CELL_CODES
+
+    source_size, source_mtime = get_source_stamp(source_path) if source_path is not None else (0, 0)
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(cloud), flags, 0, radius or 0.0, source_size, source_mtime)
+    arrays = {'coordinates': cloud.coordinates, 'normals': cloud.normals, 'original_indices': cloud.original_indices,
+              'cell_codes': cloud.cell_codes}
+    temporary_path = path + '.tmp'
+
+    with open(temporary_path, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+
+        for name, (offset, dtype, shape) in get_layout(len(cloud), flags).items():
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+
+    os.replace(temporary_path, path)
+
+
+def read_header(path: str) -> dict:
+    """
+    Read the header of a cache file.
+
+    :param path: The path to the cache.
+    :return: Dictionary of the header's fields.
+    """
+    with open(path, 'rb') as f:
+        values = struct.unpack(HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT)))
+
+    magic, version, num_points, flags, _, radius, source_size, source_mtime = values
+
+    if magic != MAGIC:
+        raise ValueError("{} is not a point cache".format(path))
+
+    if version != VERSION:
+        raise ValueError("Unsupported point cache version {} in {}".format(version, path))
+
+    return {'num_points': num_points, 'flags': flags, 'radius': radius if flags & HAS_CELL_CODES else None,
+            'source_size': source_size, 'source_mtime': source_mtime}
+
+
+def open_cache(path: str) -> (PointCloud, float):
+    """
+    Open a cache file. The arrays are memory mapped copy-on-write: they are read from the file only when accessed, and
+    changing them doesn't change the file.
+
+    :param path: The path to the cache.
+    :return: The point cloud, and the radius its cell codes were calculated for (None if the cache has no cell codes).
+    """
+    header = read_header(path)
+    arrays = {}
+
+    for name, (offset, dtype, shape) in get_layout(header['num_points'], header['flags']).items():
+        if shape[0] == 0:
+            arrays[name] = np.zeros(shape, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(path, dtype=dtype, mode='c', offset=offset, shape=shape)
+
+    cloud = PointCloud(arrays['coordinates'], normals=arrays.get('normals'))
+
+    # Keep the memory maps themselves, PointCloud only keeps plain array views of them.
+    cloud.coordinates = arrays['coordinates']
+    cloud.normals = arrays.get('normals')
+    cloud.original_indices = arrays['original_indices']
+
+    if 'cell_codes' in arrays:
+        cloud.cell_codes = arrays['cell_codes']
+
+    return cloud, header['radius']
+
+
+def is_cache_valid(path: str, source_path: str) -> bool:
+    """
+    Check if a cache exists and was created from the current version of a text file.
+
+    :param path: The path to the cache.
+    :param source_path: The path to the text file.
+    :return: Boolean.
+    """
+    if not is_cache_file(path):
+        return False
+
+    try:
+        header = read_header(path)
+    except ValueError:
+        return False
+
+    return (header['source_size'], header['source_mtime']) == get_source_stamp(source_path)
+
+
+def convert(source_path: str, path: str = None, radius: float = None) -> str:
+    """
+    Convert a text file of points to a cache file.
+
+    :param source_path: The path to the text file.
+    :param path: (Optional) the path to the cache. Defaults to a cache next to the text file.
+    :param radius: (Optional) if given, the points' cells for this radius are calculated and saved.
+    :return: The path to the cache.
+    """
+    import loader
+    from grid import Grid
+
+    if path is None:
+        path = get_cache_path(source_path)
+
+    coordinates, normals = loader.load_points(source_path)
+    cloud = PointCloud(coordinates, normals=normals)
+    cloud.sort_lexicographic()
+
+    if radius is not None:
+        Grid(radius=radius, points=cloud.points)
+
+    write_cache(path, cloud, radius=radius, source_path=source_path)
+    return path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python point_cache.py <points.txt> [cache path] [radius]")
+        sys.exit(1)
+
+    print(convert(sys.argv[1], path=sys.argv[2] if len(sys.argv) > 2 else None,
+                  radius=float(sys.argv[3]) if len(sys.argv) > 3 else None))
@@ -0,0 +1,80 @@
+import numpy as np
+
+import point
+
+# Marks a point that wasn't assigned to a grid cell yet.
+NO_CELL = np.iinfo(np.int64).min
+
+
+class PointCloud:
+    def __init__(self, coordinates, normals=None):
+        """
+        Store the points of a cloud as contiguous arrays (structure of arrays). Point objects are only views over
+        these arrays, so the grid, the algorithm and the visualizer all share the same buffers.
+
+        :param coordinates: Array-like of shape (N, 3) with the points' coordinates.
+        :param normals: (Optional) array-like of shape (N, 3) with the points' normals.
+        """
+        self.coordinates = np.ascontiguousarray(coordinates, dtype=np.float32).reshape(-1, 3)
+        self.normals = None
+
+        if normals is not None:
+            self.normals = np.ascontiguousarray(normals, dtype=np.float32).reshape(-1, 3)
+
+        self.cell_codes = np.full(len(self.coordinates), NO_CELL, dtype=np.int64)
+        self.used = np.zeros(len(self.coordinates), dtype=bool)
+        self.original_indices = np.arange(len(self.coordinates))  # The index of each point before it was sorted.
+        self._points = None
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    def __getitem__(self, index):
+        return self.points[index]
+
+    def __iter__(self):
+        return iter(self.points)
+
+    @property
+    def points(self) -> list:
+        """
+        Get the points of the cloud as Point views. The views are created once, so each index always maps to the same
+        Point object.
+
+        :return: List of points.
+        """
+        if self._points is None:
+            self._points = [point.Point.view(self, i) for i in range(len(self))]
+
+        return self._points
+
+    def set_normal(self, index, normal):
+        """
+        Set the normal of a single point. Allocates the normals array if the cloud has no normals yet.
+
+        :param index: Index of the point.
+        :param normal: The normal.
+        :return: None.
+        """
+        if self.normals is None:
+            self.normals = np.zeros_like(self.coordinates)
+
+        self.normals[index] = normal
+
+    def sort_lexicographic(self) -> np.ndarray:
+        """
+        Sort the points by x, then y, then z. The Point views are rebuilt, so each point's id is its new index.
+
+        :return: The permutation that was applied to the points.
+        """
+        order = np.lexsort((self.coordinates[:, 2], self.coordinates[:, 1], self.coordinates[:, 0]))
+        self.coordinates = self.coordinates[order]
+
+        if self.normals is not None:
+            self.normals = self.normals[order]
+
+        self.cell_codes = self.cell_codes[order]
+        self.used = self.used[order]
+        self.original_indices = self.original_indices[order]
+        self._points = None
+        return order
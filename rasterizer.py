@@ -0,0 +1,231 @@
+import math
+import struct
+import zlib
+import numpy as np
+
+"""
+A small software renderer for recording the algorithm's progress without a display (see Visualizer's frames_dir). It
+draws the mesh with an orthographic camera that turns around the vertical axis: the triangles flat shaded, the edges
+in their colors and the points in black, all with a depth buffer. Everything is vectorised over the pixels the
+triangles and edges cover, and the frames are written as PNG files with zlib only.
+"""
+
+IMAGE_SIZE = (800, 600)  # Width, height.
+BACKGROUND_COLOR = (255, 255, 255)
+MESH_COLOR = (180, 180, 180)
+POINT_COLOR = (0, 0, 0)
+LIGHT_DIRECTION = (0.3, 0.5, 1)
+
+# Maximal number of candidate pixels (of the triangles bounding boxes) handled at once.
+FRAGMENTS_CHUNK_SIZE = 1 << 20
+
+# How far behind the surface an edge or a point can be and still be drawn, relative to the image's size.
+DEPTH_TOLERANCE = 0.01
+
+
+class Camera:
+    def __init__(self, coordinates, image_size=IMAGE_SIZE, angle=0, tilt=20):
+        """
+        An orthographic camera that sees all the points.
+
+        :param coordinates: Array of shape (N, 3) of the points.
+        :param image_size: (Optional) width and height of the image.
+        :param angle: (Optional) rotation around the vertical (y) axis, in degrees.
+        :param tilt: (Optional) rotation around the horizontal (x) axis, in degrees.
+        """
+        self.width, self.height = image_size
+        a, t = math.radians(angle), math.radians(tilt)
+        rotate_y = np.array([[math.cos(a), 0, math.sin(a)], [0, 1, 0], [-math.sin(a), 0, math.cos(a)]])
+        rotate_x = np.array([[1, 0, 0], [0, math.cos(t), -math.sin(t)], [0, math.sin(t), math.cos(t)]])
+        self.rotation = rotate_x @ rotate_y
+
+        coordinates = np.asarray(coordinates, dtype=np.float64)
+        self.center = (coordinates.min(axis=0) + coordinates.max(axis=0)) / 2 if len(coordinates) else np.zeros(3)
+
+        # The points stay in the image in any rotation.
+        radius = np.linalg.norm(coordinates - self.center, axis=1).max() if len(coordinates) else 1
+        self.scale = 0.95 * min(self.width, self.height) / (2 * radius if radius > 0 else 1)
+
+    def project(self, coordinates) -> np.ndarray:
+        """
+        Project points to the image.
+
+        :param coordinates: Array of shape (N, 3).
+        :return: Array of shape (N, 3) of the column, the row and the depth (smaller is nearer) of each point.
+        """
+        rotated = (np.asarray(coordinates, dtype=np.float64) - self.center) @ self.rotation.T * self.scale
+        return np.column_stack([rotated[:, 0] + self.width / 2, self.height / 2 - rotated[:, 1], -rotated[:, 2]])
+
+
+def shade_triangles(coordinates, triangles, color=MESH_COLOR) -> np.ndarray:
+    """
+    Flat shading of triangles, by the angle between their normals and the light. The triangles aren't consistently
+    oriented, so both sides are lit.
+
+    :param coordinates: Array of shape (N, 3) of the points.
+    :param triangles: Array of shape (T, 3) of the points indices.
+    :param color: (Optional) the color of a fully lit triangle.
+    :return: Array of shape (T, 3) of the colors.
+    """
+    c = np.asarray(coordinates, dtype=np.float64)
+    normals = np.cross(c[triangles[:, 1]] - c[triangles[:, 0]], c[triangles[:, 2]] - c[triangles[:, 0]])
+    norms = np.linalg.norm(normals, axis=1)
+    norms[norms == 0] = 1
+    light = np.asarray(LIGHT_DIRECTION, dtype=np.float64) / np.linalg.norm(LIGHT_DIRECTION)
+    intensity = 0.3 + 0.7 * np.abs(normals @ light) / norms
+    return intensity[:, None] * np.asarray(color, dtype=np.float64)
+
+
+def draw_fragments(image, depth, columns, rows, depths, colors, tolerance=0.0):
+    """
+    Draw pixels that pass the depth test. When a pixel is covered more than once, the nearest one is drawn.
+
+    :param image: The image, array of shape (H, W, 3).
+    :param depth: The depth buffer, array of shape (H, W).
+    :param columns: Array of the columns of the pixels.
+    :param rows: Array of the rows of the pixels.
+    :param depths: Array of the depths of the pixels.
+    :param colors: Array of shape (K, 3) of the colors of the pixels.
+    :param tolerance: (Optional) how far behind the depth buffer a pixel can be and still be drawn.
+    :return: None.
+    """
+    height, width = depth.shape
+    inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+    pixels = rows[inside] * width + columns[inside]
+    depths, colors = depths[inside], colors[inside]
+
+    # The nearest fragment of each pixel is the first one when sorting by pixel and then by depth.
+    order = np.lexsort((depths, pixels))
+    pixels, first = np.unique(pixels[order], return_index=True)
+    nearest = order[first]
+    visible = depths[nearest] <= depth.flat[pixels] + tolerance
+
+    pixels, nearest = pixels[visible], nearest[visible]
+    depth.flat[pixels] = np.minimum(depth.flat[pixels], depths[nearest])
+    image.reshape(-1, 3)[pixels] = colors[nearest]
+
+
+def draw_triangles(image, depth, projected, triangles, colors):
+    """
+    Fill triangles, with the depth interpolated over each triangle.
+
+    :param image: The image, array of shape (H, W, 3).
+    :param depth: The depth buffer, array of shape (H, W).
+    :param projected: Array of shape (N, 3) of the projected points (see Camera.project).
+    :param triangles: Array of shape (T, 3) of the points indices.
+    :param colors: Array of shape (T, 3) of the colors of the triangles.
+    :return: None.
+    """
+    v = projected[triangles]
+    image_end = np.array([depth.shape[1] - 1, depth.shape[0] - 1])
+    low = np.maximum(np.floor(v[:, :, :2].min(axis=1)).astype(np.int64), 0)
+    high = np.minimum(np.ceil(v[:, :, :2].max(axis=1)).astype(np.int64), image_end)
+    sizes = np.maximum(high - low + 1, 0)
+    areas = sizes[:, 0] * sizes[:, 1]
+
+    # Rasterize a chunk of triangles at a time, by testing all the pixels of their bounding boxes.
+    ends = np.cumsum(areas)
+    start = 0
+
+    while start < len(triangles):
+        end = max(int(np.searchsorted(ends, ends[start] - areas[start] + FRAGMENTS_CHUNK_SIZE, side='right')),
+                  start + 1)
+        chunk = np.arange(start, end)
+        ids = np.repeat(chunk, areas[chunk])
+        offsets = np.arange(len(ids)) - np.repeat(np.cumsum(areas[chunk]) - areas[chunk], areas[chunk])
+        columns = low[ids, 0] + offsets % sizes[ids, 0]
+        rows = low[ids, 1] + offsets // sizes[ids, 0]
+
+        # Barycentric coordinates of the centers of the pixels.
+        a, b, c = v[ids, 0], v[ids, 1], v[ids, 2]
+        x, y = columns + 0.5, rows + 0.5
+        area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+        is_flat = area == 0
+        area[is_flat] = 1
+        w1 = ((c[:, 0] - b[:, 0]) * (y - b[:, 1]) - (c[:, 1] - b[:, 1]) * (x - b[:, 0])) / area
+        w2 = ((a[:, 0] - c[:, 0]) * (y - c[:, 1]) - (a[:, 1] - c[:, 1]) * (x - c[:, 0])) / area
+        w3 = 1 - w1 - w2
+        inside = (w1 >= 0) & (w2 >= 0) & (w3 >= 0) & ~is_flat
+
+        depths = w1 * a[:, 2] + w2 * b[:, 2] + w3 * c[:, 2]
+        draw_fragments(image, depth, columns[inside], rows[inside], depths[inside], colors[ids[inside]])
+        start = end
+
+
+def draw_lines(image, depth, projected, lines, colors, tolerance):
+    """
+    Draw line segments, with the depth interpolated along each one.
+
+    :param image: The image, array of shape (H, W, 3).
+    :param depth: The depth buffer, array of shape (H, W).
+    :param projected: Array of shape (N, 3) of the projected points (see Camera.project).
+    :param lines: Array of shape (L, 2) of the points indices.
+    :param colors: Array of shape (L, 3) of the colors of the lines.
+    :param tolerance: How far behind the depth buffer a line can be and still be drawn.
+    :return: None.
+    """
+    a, b = projected[lines[:, 0]], projected[lines[:, 1]]
+    steps = np.ceil(np.abs(b[:, :2] - a[:, :2]).max(axis=1)).astype(np.int64) + 1
+    ids = np.repeat(np.arange(len(lines)), steps)
+    t = (np.arange(len(ids)) - np.repeat(np.cumsum(steps) - steps, steps)) / np.maximum(steps[ids] - 1, 1)
+    points = a[ids] + t[:, None] * (b[ids] - a[ids])
+    draw_fragments(image, depth, np.floor(points[:, 0]).astype(np.int64), np.floor(points[:, 1]).astype(np.int64),
+                   points[:, 2], colors[ids], tolerance=tolerance)
+
+
+def render(coordinates, triangles=None, lines=None, line_colors=None, image_size=IMAGE_SIZE, angle=0) -> np.ndarray:
+    """
+    Render the points and the mesh.
+
+    :param coordinates: Array of shape (N, 3) of the points.
+    :param triangles: (Optional) array of shape (T, 3) of the points indices of the triangles.
+    :param lines: (Optional) array of shape (L, 2) of the points indices of the edges.
+    :param line_colors: (Optional) array of shape (L, 3) of the colors of the edges, in [0, 1]. Defaults to black.
+    :param image_size: (Optional) width and height of the image.
+    :param angle: (Optional) rotation of the camera around the vertical axis, in degrees.
+    :return: Array of shape (H, W, 3) of uint8.
+    """
+    camera = Camera(coordinates, image_size=image_size, angle=angle)
+    projected = camera.project(coordinates)
+    tolerance = DEPTH_TOLERANCE * min(image_size)
+    image = np.empty((camera.height, camera.width, 3), dtype=np.uint8)
+    image[:] = BACKGROUND_COLOR
+    depth = np.full((camera.height, camera.width), np.inf)
+
+    if triangles is not None and len(triangles) > 0:
+        triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+        draw_triangles(image, depth, projected, triangles, shade_triangles(coordinates, triangles))
+
+    if lines is not None and len(lines) > 0:
+        lines = np.asarray(lines, dtype=np.int64).reshape(-1, 2)
+        colors = np.zeros((len(lines), 3)) if line_colors is None else np.asarray(line_colors, dtype=np.float64)
+        draw_lines(image, depth, projected, lines, colors * 255, tolerance)
+
+    point_colors = np.tile(np.asarray(POINT_COLOR, dtype=np.float64), (len(projected), 1))
+    draw_fragments(image, depth, np.floor(projected[:, 0]).astype(np.int64),
+                   np.floor(projected[:, 1]).astype(np.int64), projected[:, 2], point_colors, tolerance=tolerance)
+    return image
+
+
+def write_png(path, image):
+    """
+    Write an RGB image to a PNG file.
+
+    :param path: The path to the file.
+    :param image: Array of shape (H, W, 3) of uint8.
+    :return: None.
+    """
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    height, width = image.shape[:2]
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    # Each row starts with its filter type, 0 (none).
+    rows = np.hstack([np.zeros((height, 1), dtype=np.uint8), image.reshape(height, width * 3)])
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)))
+        f.write(chunk(b'IEND', b''))
@@ -0,0 +1,403 @@
+import numpy as np
+
+import utils
+
+"""
+Spatial indices for the candidates search. The algorithm only asks an index for the points around a point (and around
+an edge), so the uniform hash grid can be replaced by a KD-tree on scans with very uneven density, where the grid's
+cells are either crowded or almost all empty.
+"""
+
+INDEX_TYPES = ('grid', 'kdtree', 'auto')
+
+# 'auto' picks the KD-tree when the density is that uneven: the points around the densest quarter of the points (in
+# the 27 cells around them) are that many times the points around the sparsest quarter. In the sparse parts most of
+# the grid's candidates are too far for the ball, and checking them costs more than building the tree.
+DENSITY_SKEW = 2.0
+DENSITY_SAMPLE_SIZE = 1024  # Number of points the density is measured around.
+
+LEAF_SIZE = 16  # Maximum number of points in a KD-tree leaf.
+QUERY_CHUNK_SIZE = 1 << 12  # Number of points (or cells) queried at once.
+
+
+def gather_ranges(starts, ends) -> (np.ndarray, np.ndarray):
+    """
+    Concatenate the ranges [starts[i], ends[i]).
+
+    :param starts: Array of the ranges starts.
+    :param ends: Array of the ranges ends.
+    :return: Array of the concatenated ranges, and array of the index of the range each value came from.
+    """
+    sizes = ends - starts
+    offsets = np.cumsum(sizes) - sizes
+    values = np.repeat(starts - offsets, sizes) + np.arange(sizes.sum())
+    return values, np.repeat(np.arange(len(starts)), sizes)
+
+
+def get_neighborhoods_arrays(neighborhoods) -> (np.ndarray, np.ndarray):
+    """
+    Join a list of (ids, offsets) neighborhoods, as query_radius returns them, into a single table.
+
+    :param neighborhoods: List of (ids, offsets) tuples.
+    :return: Array of the ids and array of the offsets of each neighborhood.
+    """
+    ids = np.concatenate([ids for ids, _ in neighborhoods] + [np.zeros(0, dtype=np.int64)])
+    offsets = [np.zeros(1, dtype=np.int64)]
+    total = 0
+
+    for chunk_ids, chunk_offsets in neighborhoods:
+        offsets.append(chunk_offsets[1:] + total)
+        total += len(chunk_ids)
+
+    return ids, np.concatenate(offsets)
+
+
+class SpatialIndex:
+    """
+    The interface of a spatial index. Points are referred to by their index in the coordinates the index was built
+    with, and the queries return the points ids.
+    """
+    def __init__(self, coordinates, ids):
+        self.coordinates = np.asarray(coordinates, dtype=np.float64)
+        self.ids = np.asarray(ids, dtype=np.int64)
+
+    def get_neighbor_points_ids(self, i) -> np.ndarray:
+        """
+        Get the ids of the candidates of a point: all points at distance of 2r from it (maybe more).
+
+        :param i: Index of the point.
+        :return: Read-only array of the points ids.
+        """
+        raise NotImplementedError
+
+    def get_common_neighbor_points_ids(self, i, j) -> np.ndarray:
+        """
+        Get the ids of the candidates of an edge: all points at distance of 2r from both its points (maybe more).
+
+        :param i: Index of the first point.
+        :param j: Index of the second point.
+        :return: Read-only array of the points ids.
+        """
+        raise NotImplementedError
+
+    def query_radius(self, centers, radius) -> (np.ndarray, np.ndarray):
+        """
+        Find all points at distance of maximum radius from each center.
+
+        :param centers: Array of shape (Q, 3) of the centers.
+        :param radius: The radius.
+        :return: Array of the points ids, and array of shape (Q + 1) of the offset of each center's points.
+        """
+        indices, offsets = self.query_radius_indices(np.asarray(centers, dtype=np.float64).reshape(-1, 3), radius)
+        return self.ids[indices], offsets
+
+    def query_radius_indices(self, centers, radius) -> (np.ndarray, np.ndarray):
+        """
+        Same as query_radius, but returns the indices of the points instead of their ids.
+
+        :param centers: Array of shape (Q, 3) of the centers.
+        :param radius: The radius.
+        :return: Array of the points indices, sorted for each center, and array of shape (Q + 1) of the offset of each
+        center's points.
+        """
+        raise NotImplementedError
+
+    def filter_by_distance(self, centers, radius, indices, owners) -> (np.ndarray, np.ndarray):
+        """
+        Keep the points that are at distance of maximum radius from their center, and group them by center.
+
+        :param centers: Array of shape (Q, 3) of the centers.
+        :param radius: The radius.
+        :param indices: Array of the indices of the candidate points.
+        :param owners: Array of the index of the center of each candidate.
+        :return: Same as query_radius_indices.
+        """
+        inside = ((self.coordinates[indices] - centers[owners]) ** 2).sum(axis=1) <= radius ** 2
+        indices, owners = indices[inside], owners[inside]
+
+        # Sort by a single key, lexsort is several times slower.
+        order = np.argsort(owners * max(len(self.coordinates), 1) + indices, kind='stable')
+        return indices[order], np.searchsorted(owners[order], np.arange(len(centers) + 1))
+
+    def query_knn(self, centers, k) -> np.ndarray:
+        """
+        Find the k nearest points of each center. The radius around the centers is doubled until it has k points.
+
+        :param centers: Array of shape (Q, 3) of the centers.
+        :param k: Number of points.
+        :return: Array of shape (Q, k) of the points ids, sorted by distance from the center (fewer columns if there
+        are less than k points).
+        """
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+        k = min(k, len(self.coordinates))
+        result = np.zeros((len(centers), k), dtype=np.int64)
+
+        if k == 0 or len(centers) == 0:
+            return result
+
+        # Start with the radius of a disk that has k points if the points were spread evenly on a surface as large as
+        # the bounding box's largest side. Scans are surfaces, so guessing by the box's volume starts way too large.
+        extent = np.ptp(self.coordinates, axis=0).max()
+        radius = max(extent * (k / len(self.coordinates)) ** (1 / 2), 1e-12)
+        remaining = np.arange(len(centers))
+
+        while len(remaining) > 0:
+            indices, offsets = self.query_radius_indices(centers[remaining], radius)
+            counts = np.diff(offsets)
+            done = counts >= k
+            owners = np.repeat(np.arange(len(remaining)), counts)
+            keep = done[owners]
+            indices, owners = indices[keep], owners[keep]
+            distances = ((self.coordinates[indices] - centers[remaining][owners]) ** 2).sum(axis=1)
+
+            # Sort by the distance and then by the center. Both sorts are stable and the points of each center are
+            # already sorted, so points at the same distance stay sorted by their index.
+            order = np.argsort(distances, kind='stable')
+            order = order[np.argsort(owners[order], kind='stable')]
+            indices, owners = indices[order], owners[order]
+
+            # Take the first k of each center.
+            starts = np.searchsorted(owners, np.arange(len(remaining)))[done]
+            result[remaining[done]] = self.ids[indices[starts[:, None] + np.arange(k)]]
+            remaining = remaining[~done]
+            radius *= 2
+
+        return result
+
+
+class HashGridIndex(SpatialIndex):
+    def __init__(self, grid, coordinates, ids):
+        """
+        The grid's cells as an index. For each cell, its non-empty neighbor cells (out of the 27 cells around it,
+        itself included) and the ids of all points in them are precomputed, so the candidates of a point are a single
+        slice. The tables are read-only, the lookups return views of them.
+
+        :param grid: The grid, after its points were binned.
+        :param coordinates: Array of shape (N, 3) of the points' coordinates.
+        :param ids: Array of the points' ids.
+        """
+        super().__init__(coordinates, ids)
+        self.cell_size = grid.cell_size
+        self.origin = grid.origin
+        self.cell_codes = grid.cell_codes
+        self.cell_offsets = grid.cell_offsets
+        self.cell_points = grid.cell_points
+        self.cell_points_ids = grid.cell_points_ids
+        self.point_cells = np.zeros(len(self.ids), dtype=np.int64)  # The index of the cell of each point.
+        self.point_cells[grid.cell_points] = np.repeat(np.arange(len(self.cell_codes)), np.diff(self.cell_offsets))
+
+        self.neighbor_cells, self.neighbor_cells_offsets = self.find_neighbor_cells(self.cell_codes, 1)
+
+        # Gather the points of the neighbor cells of each cell, one after the other.
+        indices, _ = gather_ranges(self.cell_offsets[self.neighbor_cells], self.cell_offsets[self.neighbor_cells + 1])
+        self.neighborhood_ids = self.cell_points_ids[indices]
+        sizes = np.diff(self.cell_offsets)[self.neighbor_cells]
+        self.neighborhood_offsets = np.append(0, np.cumsum(sizes))[self.neighbor_cells_offsets]
+
+        for table in (self.neighbor_cells, self.neighbor_cells_offsets, self.neighborhood_ids,
+                      self.neighborhood_offsets):
+            table.flags.writeable = False
+
+    def find_neighbor_cells(self, codes, rings) -> (np.ndarray, np.ndarray):
+        """
+        Find the non-empty cells around some cells.
+
+        :param codes: Array of the cells codes.
+        :param rings: Number of cells to each direction.
+        :return: Array of the indices of the neighbor cells, and array of the offset of each cell's neighbors.
+        """
+        num_cells = len(self.cell_codes)
+        cells = utils.decode_cells(codes)
+        steps = np.arange(-rings, rings + 1)
+        offsets = np.stack(np.meshgrid(steps, steps, steps, indexing='ij'), axis=-1).reshape(-1, 3)
+        all_cells = utils.decode_cells(self.cell_codes)
+        neighbor_cells, counts = [], []
+
+        # Either look for each cell around a cell, or check all non-empty cells, whichever is shorter.
+        chunk_size = max(QUERY_CHUNK_SIZE * 27 // min(len(offsets), max(num_cells, 1)), 1)
+
+        for i in range(0, len(cells), chunk_size):
+            chunk = cells[i:i + chunk_size]
+
+            if len(offsets) <= num_cells:
+                neighbors = chunk[:, None, :] + offsets[None, :, :]
+                inside = ((neighbors >= 0) & (neighbors <= utils.CELL_MASK)).all(axis=2)
+                neighbors_codes = utils.encode_cell(neighbors[..., 0], neighbors[..., 1], neighbors[..., 2])
+                slots = np.minimum(np.searchsorted(self.cell_codes, neighbors_codes), max(num_cells - 1, 0))
+                found = inside & (self.cell_codes[slots] == neighbors_codes) if num_cells > 0 else inside & False
+            else:
+                found = (np.abs(chunk[:, None, :] - all_cells[None, :, :]) <= rings).all(axis=2)
+                slots = np.broadcast_to(np.arange(num_cells), found.shape)
+
+            neighbor_cells.append(slots[found])
+            counts.append(found.sum(axis=1))
+
+        neighbor_cells = np.concatenate(neighbor_cells + [np.zeros(0, dtype=np.int64)])
+        counts = np.concatenate(counts + [np.zeros(0, dtype=np.int64)])
+        return neighbor_cells, np.append(0, np.cumsum(counts)).astype(np.int64)
+
+    def get_neighbor_points_ids(self, i) -> np.ndarray:
+        cell = self.point_cells[i]
+        return self.neighborhood_ids[self.neighborhood_offsets[cell]:self.neighborhood_offsets[cell + 1]]
+
+    def get_common_neighbor_points_ids(self, i, j) -> np.ndarray:
+        cell_i, cell_j = self.point_cells[i], self.point_cells[j]
+
+        if cell_i == cell_j:
+            return self.get_neighbor_points_ids(i)
+
+        offsets = self.neighbor_cells_offsets
+        common = np.intersect1d(self.neighbor_cells[offsets[cell_i]:offsets[cell_i + 1]],
+                                self.neighbor_cells[offsets[cell_j]:offsets[cell_j + 1]], assume_unique=True)
+        indices, _ = gather_ranges(self.cell_offsets[common], self.cell_offsets[common + 1])
+        ids = self.cell_points_ids[indices]
+        ids.flags.writeable = False
+        return ids
+
+    def query_radius_indices(self, centers, radius) -> (np.ndarray, np.ndarray):
+        cells = np.floor((centers - self.origin) / self.cell_size).astype(np.int64)
+        cells = np.clip(cells, 0, utils.CELL_MASK)
+        codes = utils.encode_cell(cells[:, 0], cells[:, 1], cells[:, 2])
+        neighbor_cells, neighbor_offsets = self.find_neighbor_cells(codes, int(np.ceil(radius / self.cell_size)))
+
+        # The points of all the cells around each center, and which center they belong to.
+        owners = np.repeat(np.arange(len(centers)), np.diff(neighbor_offsets))
+        indices, ranges = gather_ranges(self.cell_offsets[neighbor_cells], self.cell_offsets[neighbor_cells + 1])
+        return self.filter_by_distance(centers, radius, self.cell_points[indices], owners[ranges])
+
+
+class KDTreeIndex(SpatialIndex):
+    def __init__(self, coordinates, ids, reach, leaf_size=LEAF_SIZE):
+        """
+        A KD-tree, stored as arrays. Each node splits its points at the median of the longest axis of their bounding
+        box. The candidates of a point are all points at distance of reach from it, and they are precomputed for all
+        points with batched queries.
+
+        :param coordinates: Array of shape (N, 3) of the points' coordinates.
+        :param ids: Array of the points' ids.
+        :param reach: The distance of the candidates of a point (2r), or None to only use the tree for queries.
+        :param leaf_size: (Optional) maximum number of points in a leaf.
+        """
+        super().__init__(coordinates, ids)
+        self.reach = reach
+        self.order = np.arange(len(self.coordinates))  # The points of node i are order[start[i]:end[i]].
+        starts, ends, lefts, rights, lowers, uppers = [], [], [], [], [], []
+        stack = [(0, len(self.coordinates), -1, 0)] if len(self.coordinates) > 0 else []
+
+        while len(stack) > 0:
+            start, end, parent, side = stack.pop()
+            node = len(starts)
+            points = self.order[start:end]
+            lower, upper = self.coordinates[points].min(axis=0), self.coordinates[points].max(axis=0)
+            starts.append(start), ends.append(end), lefts.append(-1), rights.append(-1)
+            lowers.append(lower), uppers.append(upper)
+
+            if parent >= 0:
+                (lefts if side == 0 else rights)[parent] = node
+
+            if end - start > leaf_size:
+                axis = int(np.argmax(upper - lower))
+                middle = (end - start) // 2
+                self.order[start:end] = points[np.argpartition(self.coordinates[points, axis], middle)]
+                stack.append((start + middle, end, node, 1))
+                stack.append((start, start + middle, node, 0))
+
+        self.starts, self.ends = np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64)
+        self.lefts, self.rights = np.array(lefts, dtype=np.int64), np.array(rights, dtype=np.int64)
+        self.lowers, self.uppers = np.array(lowers).reshape(-1, 3), np.array(uppers).reshape(-1, 3)
+
+        # Precompute the candidates of all points.
+        if reach is not None:
+            self.neighborhood_ids, self.neighborhood_offsets = self.query_radius(self.coordinates, reach)
+            self.neighborhood_ids.flags.writeable = False
+            self.neighborhood_offsets.flags.writeable = False
+
+    def get_neighbor_points_ids(self, i) -> np.ndarray:
+        return self.neighborhood_ids[self.neighborhood_offsets[i]:self.neighborhood_offsets[i + 1]]
+
+    def get_common_neighbor_points_ids(self, i, j) -> np.ndarray:
+        if i == j:
+            return self.get_neighbor_points_ids(i)
+
+        ids = np.intersect1d(self.get_neighbor_points_ids(i), self.get_neighbor_points_ids(j), assume_unique=True)
+        ids.flags.writeable = False
+        return ids
+
+    def query_radius_indices(self, centers, radius) -> (np.ndarray, np.ndarray):
+        if len(centers) > QUERY_CHUNK_SIZE:
+            return get_neighborhoods_arrays([self.query_radius_indices(centers[i:i + QUERY_CHUNK_SIZE], radius)
+                                             for i in range(0, len(centers), QUERY_CHUNK_SIZE)])
+
+        queries = np.arange(len(centers)) if len(self.starts) > 0 else np.zeros(0, dtype=np.int64)
+        nodes = np.zeros(len(queries), dtype=np.int64)
+        leaf_queries, leaf_nodes = [], []
+
+        # Go down the tree with all centers at once, keeping the (center, node) pairs whose box is close enough.
+        while len(queries) > 0:
+            gap = np.maximum(self.lowers[nodes] - centers[queries], 0) + \
+                np.maximum(centers[queries] - self.uppers[nodes], 0)
+            close = (gap ** 2).sum(axis=1) <= radius ** 2
+            queries, nodes = queries[close], nodes[close]
+            leaf = self.lefts[nodes] < 0
+            leaf_queries.append(queries[leaf])
+            leaf_nodes.append(nodes[leaf])
+            queries, nodes = np.repeat(queries[~leaf], 2), np.stack([self.lefts[nodes[~leaf]],
+                                                                     self.rights[nodes[~leaf]]], axis=1).ravel()
+
+        queries = np.concatenate(leaf_queries + [np.zeros(0, dtype=np.int64)])
+        nodes = np.concatenate(leaf_nodes + [np.zeros(0, dtype=np.int64)])
+        indices, ranges = gather_ranges(self.starts[nodes], self.ends[nodes])
+        return self.filter_by_distance(centers, radius, self.order[indices], queries[ranges])
+
+
+def measure_density_skew(grid) -> float:
+    """
+    Measure how uneven the density of the points is from the grid's cells, without building an index: count the points
+    in the 27 cells around the cells of a sample of the points, and compare the upper quartile of the counts to the
+    lower one.
+
+    :param grid: The grid, after its points were binned.
+    :return: The ratio of the quartiles.
+    """
+    counts = np.diff(grid.cell_offsets)
+
+    if len(counts) == 0:
+        return 1.0
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(int(counts.sum()), min(DENSITY_SAMPLE_SIZE, int(counts.sum())), replace=False)
+    cells = np.repeat(np.arange(len(counts)), counts)[sample]  # The points are sorted by cell.
+    steps = np.arange(-1, 2)
+    offsets = np.stack(np.meshgrid(steps, steps, steps, indexing='ij'), axis=-1).reshape(-1, 3)
+    neighbors = utils.decode_cells(grid.cell_codes[cells])[:, None, :] + offsets[None, :, :]
+    inside = ((neighbors >= 0) & (neighbors <= utils.CELL_MASK)).all(axis=2)
+    codes = utils.encode_cell(neighbors[..., 0], neighbors[..., 1], neighbors[..., 2])
+    slots = np.minimum(np.searchsorted(grid.cell_codes, codes), len(counts) - 1)
+    found = inside & (grid.cell_codes[slots] == codes)
+    lower, upper = np.percentile(np.where(found, counts[slots], 0).sum(axis=1), [25, 75])
+    return float(upper / max(lower, 1))
+
+
+def create_index(index_type, grid, coordinates, ids) -> SpatialIndex:
+    """
+    Create the spatial index of a grid's points.
+
+    :param index_type: One of INDEX_TYPES. 'auto' picks the KD-tree if the density is uneven (see DENSITY_SKEW) in
+    pivot mode, and the hash grid otherwise.
+    :param grid: The grid, after its points were binned.
+    :param coordinates: Array of shape (N, 3) of the points' coordinates.
+    :param ids: Array of the points' ids.
+    :return: The index.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError("Unknown index '{}', expected one of {}".format(index_type, INDEX_TYPES))
+
+    # In incircle mode (where the grid's cells grow to hold min_points_per_cell points) the triangle is made with the
+    # nearest candidate the ball fits in, so the mesh depends on which points are candidates, and the KD-tree's ball
+    # gives a different mesh than the grid's 27 cells. In pivot mode the ball must be empty, so both give the same mesh.
+    is_pivot = grid.min_points_per_cell == 0
+
+    if index_type == 'kdtree' or (index_type == 'auto' and is_pivot and measure_density_skew(grid) > DENSITY_SKEW):
+        return KDTreeIndex(coordinates, ids, grid.cell_size)
+
+    return HashGridIndex(grid, coordinates, ids)
@@ -0,0 +1,317 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+from typing import List
+import numpy as np
+
+from bpa import BPA
+from point_cloud import PointCloud
+import loader
+import mesh_io
+
+"""
+Out-of-core reconstruction, for clouds that don't fit in memory. The points are streamed from the text file into tiles
+on disk: slabs along the longest axis of the cloud, each with about tile_size points. Then the tiles are reconstructed
+one after the other, each in a window of its own points, a halo of the next tile's points (up to 2r from the tile) and
+the points and triangles carried from the previous window, and the finished triangles are written to the mesh file.
+So only a window is in memory at a time.
+
+A window keeps only the new triangles that have a point in its own tile. The ball of such a triangle is within 2r of
+that point, so it's all inside the window, and a point outside the window can't be missed. The triangles near the end
+of the tile are carried to the next window, and the ball pivots again around their boundary edges there (see
+create_mesh, which continues the front of an existing mesh). The mesh is close to the one of the whole cloud but not
+identical, since the front grows in a different order.
+
+Files in the tiles directory:
+- coordinates.bin, normals.bin: float32 (N, 3) of the points, in the order of the text file.
+- tile_<i>.bin: int64 indices of the points of tile i.
+- tiles.json: the number of points, the axis and the boundaries of the tiles.
+"""
+
+# Default number of points in a tile.
+TILE_SIZE = 1 << 18
+
+# Number of bins of the histogram the boundaries of the tiles are picked with.
+HISTOGRAM_BINS = 1 << 16
+
+# Number of points read from the binary files at once.
+READ_CHUNK_SIZE = 1 << 20
+
+
+def get_tile_path(tiles_dir: str, i: int) -> str:
+    return os.path.join(tiles_dir, 'tile_{:05d}.bin'.format(i))
+
+
+def iter_array_chunks(array, chunk_size: int = READ_CHUNK_SIZE):
+    # Iterate over an array in chunks of rows, with the index of the first row of each chunk.
+    for start in range(0, len(array), chunk_size):
+        yield start, np.asarray(array[start:start + chunk_size])
+
+
+def pick_boundaries(values_chunks, low: float, high: float, num_points: int, tile_size: int,
+                    min_thickness: float) -> List[float]:
+    """
+    Pick the boundaries of the tiles along an axis, so the tiles have about tile_size points each.
+
+    :param values_chunks: Iterable of arrays of the points' values along the axis.
+    :param low: The minimal value.
+    :param high: The maximal value.
+    :param num_points: The number of points.
+    :param tile_size: The number of points in a tile.
+    :param min_thickness: Minimal distance between boundaries, so a halo never reaches past the next tile.
+    :return: Sorted list of the boundaries (a point with a value v is in tile searchsorted(boundaries, v, 'right')).
+    """
+    histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+
+    for values in values_chunks:
+        histogram += np.histogram(values, bins=HISTOGRAM_BINS, range=(low, high))[0]
+
+    counts = np.cumsum(histogram)
+    edges = np.linspace(low, high, HISTOGRAM_BINS + 1)
+    boundaries = []
+
+    for i in range(1, int(np.ceil(num_points / tile_size))):
+        boundary = edges[int(np.searchsorted(counts, i * tile_size)) + 1]
+
+        if boundary - (boundaries[-1] if boundaries else low) >= min_thickness and high - boundary >= min_thickness:
+            boundaries.append(float(boundary))
+
+    return boundaries
+
+
+def write_tiles(path: str, tiles_dir: str, radius: float, tile_size: int = TILE_SIZE,
+                chunk_size: int = loader.DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    Split a text file of points into tiles, without loading all the points. The text is read once, into binary files
+    of the coordinates and normals, and the tiles are made from those.
+
+    :param path: The path to the text file.
+    :param tiles_dir: The directory of the tiles (created if needed).
+    :param radius: The largest radius the tiles will be reconstructed with. The tiles are at least 4r thick.
+    :param tile_size: (Optional) the number of points in a tile.
+    :param chunk_size: (Optional) number of lines parsed at once.
+    :return: The tiles metadata, as saved in tiles.json.
+    """
+    os.makedirs(tiles_dir, exist_ok=True)
+    num_points = 0
+    low, high = np.full(3, np.inf), np.full(3, -np.inf)
+    has_normals = False
+
+    with open(os.path.join(tiles_dir, 'coordinates.bin'), 'wb') as coordinates_file, \
+            open(os.path.join(tiles_dir, 'normals.bin'), 'wb') as normals_file:
+        for coordinates, normals in loader.iter_chunks(path, chunk_size):
+            coordinates_file.write(coordinates.tobytes())
+            normals_file.write(normals.tobytes())
+            low, high = np.minimum(low, coordinates.min(axis=0)), np.maximum(high, coordinates.max(axis=0))
+            has_normals |= not np.isnan(normals).all()
+            num_points += len(coordinates)
+
+    metadata = {'num_points': num_points, 'has_normals': bool(has_normals), 'radius': radius, 'axis': 0,
+                'boundaries': []}
+
+    if num_points > 0:
+        coordinates = open_points(tiles_dir, metadata)[0]
+        axis = metadata['axis'] = int(np.argmax(high - low))
+        metadata['boundaries'] = pick_boundaries(
+            (chunk[:, axis] for _, chunk in iter_array_chunks(coordinates)), float(low[axis]), float(high[axis]),
+            num_points, tile_size, 4 * radius)
+
+    num_tiles = len(metadata['boundaries']) + 1
+    metadata['tile_sizes'] = [0] * num_tiles
+
+    for i in range(num_tiles):
+        open(get_tile_path(tiles_dir, i), 'wb').close()
+
+    if num_points > 0:
+        for start, chunk in iter_array_chunks(coordinates):
+            tiles = np.searchsorted(metadata['boundaries'], chunk[:, metadata['axis']], side='right')
+            order = np.argsort(tiles, kind='stable')
+            tiles_of_chunk, starts = np.unique(tiles[order], return_index=True)
+
+            for tile, indices in zip(tiles_of_chunk.tolist(), np.split(start + order, starts[1:])):
+                with open(get_tile_path(tiles_dir, tile), 'ab') as f:
+                    f.write(indices.astype(np.int64).tobytes())
+
+                metadata['tile_sizes'][tile] += len(indices)
+
+    with open(os.path.join(tiles_dir, 'tiles.json'), 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    return metadata
+
+
+def open_points(tiles_dir: str, metadata: dict) -> (np.ndarray, np.ndarray):
+    """
+    Memory map the points of the tiles.
+
+    :param tiles_dir: The directory of the tiles.
+    :param metadata: The tiles metadata.
+    :return: Arrays of shape (N, 3) of the coordinates, and of the normals (None if the points have no normals).
+    """
+    shape = (metadata['num_points'], 3)
+
+    def open_array(name):
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=np.float32)
+
+        return np.memmap(os.path.join(tiles_dir, name), dtype=np.float32, mode='r', shape=shape)
+
+    return open_array('coordinates.bin'), open_array('normals.bin') if metadata['has_normals'] else None
+
+
+def get_triangles_edges(triangles) -> np.ndarray:
+    # The 3 edges of each triangle, as an array of shape (3T, 2).
+    return triangles[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+
+
+def get_edge_keys(edges) -> np.ndarray:
+    # The key of each edge (see Grid.get_edge_key).
+    edges = np.sort(np.asarray(edges, dtype=np.int64), axis=1)
+    return (edges[:, 0] << 32) | edges[:, 1]
+
+
+def read_tile(tiles_dir: str, i: int) -> np.ndarray:
+    return np.fromfile(get_tile_path(tiles_dir, i), dtype=np.int64)
+
+
+def reconstruct_window(coordinates, normals, indices, triangles, closing_edges, bpa_kwargs: dict,
+                       mesh_kwargs: dict):
+    """
+    Reconstruct the mesh of a window of points, continuing from the triangles carried to it.
+
+    :param coordinates: Array of shape (N, 3) of all the points (may be memory mapped).
+    :param normals: Array of shape (N, 3) of all the normals, or None.
+    :param indices: The indices of the window's points.
+    :param triangles: Array of shape (T, 3) of the indices of the points of the carried triangles.
+    :param closing_edges: Array of shape (E, 2) of the indices of the points of the carried edges that closed a loop.
+    :param bpa_kwargs: Keyword arguments for the BPA constructor.
+    :param mesh_kwargs: Keyword arguments for create_mesh.
+    :return: The BPA object, and the indices of its points.
+    """
+    indices = np.sort(indices)
+    cloud = PointCloud(coordinates[indices], normals=None if normals is None else normals[indices])
+    indices = indices[cloud.sort_lexicographic()]
+    order = np.argsort(indices)
+
+    def localize(array):
+        # The indices of points in the window.
+        return order[np.searchsorted(indices[order], array)]
+
+    bpa = BPA(path=None, cloud=cloud, **bpa_kwargs)
+    bpa.add_triangles(localize(triangles), localize(closing_edges))
+    bpa.create_mesh(**mesh_kwargs)
+    return bpa, indices
+
+
+def reconstruct_tiles(tiles_dir: str, output: str, radius: float, mode: str = 'pivot', radii: List[float] = None,
+                      priority: str = 'fifo', index: str = 'auto', limit_points: int = None,
+                      binary: bool = True) -> int:
+    """
+    Reconstruct the mesh of tiles (see write_tiles) one window at a time, and write it to a mesh file.
+
+    :param tiles_dir: The directory of the tiles.
+    :param output: The path of the mesh file (.obj, .ply or .stl, see mesh_io.py). Its vertices are all the points, in
+    the order of the text file.
+    :param radius: The ball's radius.
+    :param mode: (Optional) the criteria for accepting a triangle, see create_mesh.
+    :param radii: (Optional) list of radii for each window, see create_mesh.
+    :param priority: (Optional) the order the edges of the front are pivoted around, see create_mesh.
+    :param index: (Optional) the spatial index, see BPA.
+    :param limit_points: (Optional) the number of candidates tried for each edge, see BPA.
+    :param binary: (Optional) for PLY files, whether to write a binary or an ASCII file.
+    :return: The number of triangles.
+    """
+    with open(os.path.join(tiles_dir, 'tiles.json')) as f:
+        metadata = json.load(f)
+
+    coordinates, normals = open_points(tiles_dir, metadata)
+    axis, boundaries = metadata['axis'], metadata['boundaries']
+    num_tiles = len(boundaries) + 1
+
+    # The ball touches points up to 2r apart.
+    reach = 2 * max(radii or [radius])
+
+    if reach > 2 * metadata['radius']:
+        raise ValueError("The tiles were made for radius {}, not {}".format(metadata['radius'], reach / 2))
+
+    bpa_kwargs = {'radius': radius, 'index': index}
+
+    if limit_points is not None:
+        bpa_kwargs['limit_points'] = limit_points
+
+    mesh_kwargs = {'mode': mode, 'radii': radii, 'priority': priority}
+    carried_indices = np.zeros(0, dtype=np.int64)
+    extra_indices = np.zeros(0, dtype=np.int64)  # Carried only as points of carried triangles.
+    carried_triangles = np.zeros((0, 3), dtype=np.int64)
+    carried_closing_edges = np.zeros((0, 2), dtype=np.int64)
+    next_tile = read_tile(tiles_dir, 0)
+
+    with mesh_io.open_writer(output, coordinates, normals=normals, binary=binary) as writer:
+        for i in range(num_tiles):
+            tile = next_tile
+            next_tile = read_tile(tiles_dir, i + 1) if i + 1 < num_tiles else np.zeros(0, dtype=np.int64)
+            halo = next_tile[coordinates[next_tile, axis] < boundaries[i] + reach] if i + 1 < num_tiles else next_tile
+            window = np.union1d(np.union1d(carried_indices, tile), halo)
+
+            bpa, indices = reconstruct_window(coordinates, normals, window, carried_triangles, carried_closing_edges,
+                                              bpa_kwargs, mesh_kwargs)
+            triangles = indices[bpa.get_triangles_array()]
+            closing_edges = indices[bpa.grid.get_closing_edges().astype(np.int64)]
+
+            # Keep the new triangles that have a point in the tile (see above). In 'incircle' mode the triangles are not
+            # limited to 2r, so they could also reach the points that were carried only with their triangles, and not
+            # with all of them. These are dropped, since the window doesn't know all the triangles of their edges.
+            new_triangles = triangles[len(carried_triangles):]
+            is_own = np.isin(new_triangles, tile).any(axis=1) & ~np.isin(new_triangles, extra_indices).any(axis=1)
+            writer.write_triangles(new_triangles[is_own])
+            triangles = np.concatenate([triangles[:len(carried_triangles)], new_triangles[is_own]])
+
+            if i + 1 == num_tiles:
+                break
+
+            # Carry the points near the end of the tile, and the triangles that touch them, to the next window.
+            margin = indices[coordinates[indices, axis] >= boundaries[i] - reach]
+            is_carried = np.isin(triangles, margin).any(axis=1)
+            carried_triangles = triangles[is_carried]
+            carried_indices = np.union1d(margin, carried_triangles.ravel())
+            extra_indices = np.setdiff1d(carried_indices, margin)
+            carried_closing_edges = closing_edges[np.isin(get_edge_keys(closing_edges),
+                                                          get_edge_keys(get_triangles_edges(carried_triangles)))]
+
+        return writer.num_triangles
+
+
+def reconstruct_streaming(path: str, output: str, radius: float, tiles_dir: str = None, tile_size: int = TILE_SIZE,
+                          **kwargs) -> int:
+    """
+    Reconstruct the mesh of a text file of points without loading all the points: split it into tiles, and
+    reconstruct them one window at a time.
+
+    :param path: The path to the text file.
+    :param output: The path of the mesh file (see reconstruct_tiles).
+    :param radius: The ball's radius.
+    :param tiles_dir: (Optional) the directory of the tiles, which is kept. Defaults to a temporary directory.
+    :param tile_size: (Optional) the number of points in a tile.
+    :param kwargs: (Optional) arguments for reconstruct_tiles (mode, radii, priority, index, limit_points, binary).
+    :return: The number of triangles.
+    """
+    temporary_dir = tempfile.mkdtemp() if tiles_dir is None else None
+
+    try:
+        write_tiles(path, tiles_dir or temporary_dir, max(kwargs.get('radii') or [radius]), tile_size=tile_size)
+        return reconstruct_tiles(tiles_dir or temporary_dir, output, radius, **kwargs)
+    finally:
+        if temporary_dir is not None:
+            shutil.rmtree(temporary_dir)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("Usage: python streaming.py <points.txt> <output mesh> <radius> [tile size] [mode]")
+        sys.exit(1)
+
+    print(reconstruct_streaming(sys.argv[1], sys.argv[2], float(sys.argv[3]),
+                                tile_size=int(sys.argv[4]) if len(sys.argv) > 4 else TILE_SIZE,
+                                mode=sys.argv[5] if len(sys.argv) > 5 else 'pivot'))
@@ -1,64 +1,121 @@
+import os
 import unittest
 from bpa import BPA
+from edge import Edge
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
 
 
 class TestBPA(unittest.TestCase):
     def test_calc_normals(self):
         # Load data.
-        bpa = BPA(path='normals_test.txt', radius=0.2, visualizer=True)
+        bpa = BPA(path=os.path.join(DATA_DIR, 'normals_test.txt'), radius=0.2, visualizer=True)
 
         # Find a seed triangle.
         bpa.find_seed_triangle()
-        bpa.visualizer.update(edges=bpa.grid.edges, color='red')
+        bpa.visualizer.update(bpa.grid, color='red')
         bpa.visualizer.lock()
 
     def test_create_mesh(self):
         # Load data.
-        bpa = BPA(path='large_bunny_with_normals.txt', radius=0.005, visualizer=True)
+        bpa = BPA(path=os.path.join(DATA_DIR, 'large_bunny_with_normals.txt'), radius=0.005, visualizer=True)
         bpa.create_mesh(limit_iterations=1000)
         bpa.visualizer.lock()
 
     def test_small_bunny(self):
         # Load data.
-        bpa = BPA(path='bunny_with_normals.txt', radius=0.0005, visualizer=True)
+        bpa = BPA(path=os.path.join(DATA_DIR, 'bunny_with_normals.txt'), radius=0.0005, visualizer=True)
         bpa.create_mesh(limit_iterations=900)
         bpa.visualizer.lock()
 
     def test_tea(self):
         # Load data.
-        bpa = BPA(path='teapot_with_normal.txt', radius=0.02, visualizer=True)
+        bpa = BPA(path=os.path.join(DATA_DIR, 'teapot_with_normal.txt'), radius=0.02, visualizer=True)
         print("Starting...")
         bpa.create_mesh(limit_iterations=1000)
         print("Finished.")
         bpa.visualizer.lock()
 
     def test_multi_process(self):
-        bpa = BPA(path='../data/bunny_with_normals.txt', radius=0.0005, visualizer=True)
+        bpa = BPA(path=os.path.join(DATA_DIR, 'bunny_with_normals.txt'), radius=0.0005, visualizer=True)
         bpa.create_mesh(limit_iterations=1000)
         bpa.visualizer.lock()
 
     def test_medium_bunny(self):
-        bpa = BPA(path='../data/bunny_with_normals.txt', radius=0.0005, visualizer=True)
+        bpa = BPA(path=os.path.join(DATA_DIR, 'bunny_with_normals.txt'), radius=0.0005, visualizer=True)
         bpa.create_mesh()
         bpa.visualizer.lock()
 
     def test_normal_drawing(self):
-        bpa = BPA(path='../data/large_bunny_with_normals.txt', radius=0.0005, visualizer=True)
+        bpa = BPA(path=os.path.join(DATA_DIR, 'large_bunny_with_normals.txt'), radius=0.0005, visualizer=True)
         bpa.visualizer.draw_with_normals(normals_size=0.5)
 
+    def test_seed_search_without_seeds(self):
+        # The ball is too small to touch any 3 points, so every point is tried once without hitting the recursion
+        # limit.
+        bpa = BPA(path=os.path.join(DATA_DIR, 'bunny_with_normals.txt'), radius=0.0001)
+        bpa.mode = 'pivot'
+        _, edges, _ = bpa.find_seed_triangle()
+
+        self.assertIsNone(edges)
+        self.assertEqual(bpa.num_points_i_tried_to_seed_from, len(bpa.points))
+        self.assertTrue(bpa.exhausted_points.all())
+
+    def test_seed_points_are_free(self):
+        bpa = BPA(path=os.path.join(DATA_DIR, 'bunny_with_normals.txt'), radius=0.015)
+        bpa.create_mesh(limit_iterations=50, mode='pivot')
+        used, exhausted = bpa.cloud.used.copy(), bpa.exhausted_points.copy()
+        _, edges, index = bpa.find_seed_triangle()
+
+        # The seed point was free, and all points the cursor skipped are either used or have no seed triangle.
+        self.assertEqual(len(edges), 3)
+        self.assertFalse(used[index] or exhausted[index])
+        skipped = slice(0, bpa.first_free_point_index)
+        self.assertTrue((bpa.cloud.used[skipped] | bpa.exhausted_points[skipped]).all())
+        self.assertTrue(all(p.is_used for p in bpa.grid.triangles[-1]))
+
+    def test_multiple_radii(self):
+        bpa = BPA(path=os.path.join(DATA_DIR, 'bunny_with_normals.txt'), radius=0.01)
+        bpa.create_mesh(mode='pivot')
+        num_triangles = len(bpa.grid.triangles)
+        grid = bpa.grid
+
+        # The second pass continues from the mesh of the first one, with the same grid.
+        bpa.create_mesh(mode='pivot', radii=[0.01, 0.03])
+        self.assertIs(bpa.grid, grid)
+        self.assertEqual(bpa.radius, 0.03)
+        self.assertEqual(grid.radius, 0.03)
+        self.assertGreater(len(bpa.grid.triangles), num_triangles)
+
+    def test_validate_candidates(self):
+        for mode, radius in [('pivot', 0.015), ('incircle', 0.0005)]:
+            bpa = BPA(path=os.path.join(DATA_DIR, 'bunny_with_normals.txt'), radius=radius)
+            bpa.create_mesh(limit_iterations=50, mode=mode)
+            edge = bpa.get_boundary_edges()[0]
+            p1, p2 = edge.p1, edge.p2
+            third_point = bpa.get_third_point_of_triangle(bpa.get_triangle_edges(edge), p1, p2)
+            candidates = bpa.grid.get_common_neighbor_points_ids(p1, p2)
+            valid, _ = bpa.validate_candidates(p1, p2, third_point, candidates)
+
+            # The same checks, one candidate at a time.
+            expected = []
+
+            for p3 in [bpa.points[i] for i in candidates]:
+                if p3.id in (p1.id, p2.id, third_point.id) or bpa.will_triangles_overlap(edge, third_point, p3) or \
+                        not bpa.does_ball_fit(p1, p2, p3):
+                    expected.append(False)
+                    continue
+
+                min_angle, max_angle = bpa.calc_min_max_angle(Edge(p1, p3), Edge(p2, p3), edge)
+                expected.append(bool(min_angle >= 1 and max_angle <= 180))
+
+            self.assertEqual(valid.tolist(), expected)
+
+    def test_limit_points(self):
+        path = os.path.join(DATA_DIR, 'bunny_with_normals.txt')
+        bpa = BPA(path=path, radius=0.0005)
+        bpa.create_mesh()
+        more_candidates_bpa = BPA(path=path, radius=0.0005, limit_points=40)
+        more_candidates_bpa.create_mesh()
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+        self.assertGreater(len(more_candidates_bpa.grid.triangles), len(bpa.grid.triangles))
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from bpa import BPA
+from grid import Grid
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+
+class Crash(Exception):
+    pass
+
+
+def crash_after(bpa, num_calls):
+    # Make the run crash in the middle, after expanding a number of edges.
+    expand_triangle = bpa.expand_triangle
+    calls = [0]
+
+    def wrapper(*args):
+        calls[0] += 1
+
+        if calls[0] > num_calls:
+            raise Crash()
+
+        return expand_triangle(*args)
+
+    bpa.expand_triangle = wrapper
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(DATA_DIR, 'bunny_with_normals.txt')
+        self.checkpoint_path = os.path.join(self.directory, 'run.npz')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assert_resumed(self, radius, **kwargs):
+        bpa = BPA(path=self.path, radius=radius)
+        bpa.create_mesh(**kwargs)
+
+        crashed = BPA(path=self.path, radius=radius)
+        crash_after(crashed, 300)
+
+        with self.assertRaises(Crash):
+            crashed.create_mesh(checkpoint_path=self.checkpoint_path, checkpoint_interval=0, **kwargs)
+
+        resumed = BPA(path=self.path, radius=radius)
+        resumed.create_mesh(checkpoint_path=self.checkpoint_path, resume=True, **kwargs)
+
+        self.assertGreater(len(resumed.grid.triangles), 0)
+        np.testing.assert_array_equal(resumed.get_triangles_array(), bpa.get_triangles_array())
+        np.testing.assert_array_equal(resumed.grid.get_edges_array(), bpa.grid.get_edges_array())
+        np.testing.assert_array_equal(resumed.cloud.used, bpa.cloud.used)
+
+    def test_resume(self):
+        self.assert_resumed(0.015, mode='pivot')
+
+    def test_resume_radii(self):
+        self.assert_resumed(0.01, mode='pivot', radii=[0.01, 0.015, 0.03], priority='shortest')
+
+    def test_resume_with_other_arguments(self):
+        BPA(path=self.path, radius=0.015).create_mesh(mode='pivot', checkpoint_path=self.checkpoint_path)
+
+        with self.assertRaises(ValueError):
+            BPA(path=self.path, radius=0.015).create_mesh(mode='incircle', checkpoint_path=self.checkpoint_path,
+                                                          resume=True)
+
+    def test_mesh_state(self):
+        bpa = BPA(path=self.path, radius=0.015)
+        bpa.create_mesh(mode='pivot', limit_iterations=200)
+
+        grid = Grid(radius=0.015, points=bpa.points)
+        grid.set_mesh_state(bpa.grid.get_mesh_state())
+
+        np.testing.assert_array_equal(grid.get_triangles_array(), bpa.grid.get_triangles_array())
+        self.assertEqual(grid.num_edges, bpa.grid.num_edges)
+        self.assertEqual(grid.edge_rows, bpa.grid.edge_rows)
+        self.assertEqual(grid.adjacency, bpa.grid.adjacency)
+
+
+if __name__ == '__main__':
+    unittest.main()
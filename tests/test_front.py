@@ -0,0 +1,72 @@
+import unittest
+from edge import Edge
+from front import Front, ACTIVE, BOUNDARY, FROZEN
+from grid import Grid
+from point import Point
+
+
+class TestFront(unittest.TestCase):
+    def setUp(self):
+        self.points = [Point(0, 0, 0, id=0), Point(3, 0, 0, id=1), Point(0, 1, 0, id=2), Point(0, -1, 0, id=3)]
+        self.grid = Grid(radius=1, points=self.points)
+        p1, p2, p3, _ = self.points
+        self.edges = [Edge(p1, p2), Edge(p2, p3), Edge(p3, p1)]
+
+        for edge in self.edges:
+            self.grid.add_edge(edge)
+
+        self.grid.add_triangle([p1, p2, p3])
+
+    def test_fifo(self):
+        front = Front(self.grid)
+
+        for edge in self.edges:
+            front.push(edge)
+
+        front.push(self.edges[0])
+        self.assertEqual(len(front), 3)
+        self.assertEqual(front.get_state(self.edges[0]), ACTIVE)
+        self.assertIs(front.pop(), self.edges[0])
+        self.assertEqual(front.get_state(self.edges[0]), BOUNDARY)
+
+    def test_shortest(self):
+        front = Front(self.grid, priority='shortest')
+
+        for edge in self.edges:
+            front.push(edge)
+
+        self.assertIs(front.pop(), self.edges[2])
+        self.assertIs(front.pop(), self.edges[0])
+
+    def test_frozen_edges(self):
+        front = Front(self.grid)
+
+        for edge in self.edges:
+            front.push(edge)
+
+        # A second triangle on the first edge takes it off the boundary while it waits.
+        self.grid.add_triangle([self.points[3], self.points[0], self.points[1]])
+        self.assertIs(front.pop(), self.edges[1])
+        self.assertEqual(front.get_state(self.edges[0]), FROZEN)
+
+        front.push(self.edges[0])
+        self.assertEqual(front.get_state(self.edges[0]), FROZEN)
+
+    def test_activate_boundary(self):
+        front = Front(self.grid)
+        front.activate_boundary()
+
+        self.assertEqual(len(front), 3)
+        self.assertEqual([front.pop() for _ in range(4)], self.edges + [None])
+
+        # Boundary edges are pushed again, for example after the radius changed.
+        front.activate_boundary()
+        self.assertEqual(len(front), 3)
+
+    def test_unknown_priority(self):
+        with self.assertRaises(ValueError):
+            Front(self.grid, priority='longest')
+
+
+if __name__ == '__main__':
+    unittest.main()
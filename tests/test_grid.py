@@ -1,6 +1,8 @@
 import unittest
+import numpy as np
 from grid import Grid
 from point import Point
+from edge import Edge
 
 
 class TestGrid(unittest.TestCase):
@@ -50,9 +52,125 @@ class TestGrid(unittest.TestCase):
 
         self.assertLessEqual(len(center_point_neighbors), 27)
 
-
-
-
-
-
-
+    def test_edge_index(self):
+        p1 = Point(0, 0, 0, id=0)
+        p2 = Point(1, 0, 0, id=1)
+        p3 = Point(0, 1, 0, id=2)
+
+        grid = Grid(radius=1, points=[p1, p2, p3])
+        e1 = Edge(p1, p2)
+        e2 = Edge(p3, p2)
+        grid.add_edge(e1)
+        grid.add_edge(e2)
+        grid.add_edge(e1)
+
+        self.assertEqual(len(grid.edges), 2)
+        self.assertEqual(grid.get_edge(p2, p1), e1)
+        self.assertIs(grid.get_edge(p2, p1).p1, p1)
+        self.assertTrue(grid.are_connected(p2, p3))
+        self.assertFalse(grid.are_connected(p1, p3))
+        self.assertEqual(grid.get_connected_points_ids(p2), {0, 2})
+
+        grid.remove_edge(e1)
+        self.assertIsNone(grid.get_edge(p1, p2))
+        self.assertEqual(grid.get_connected_points_ids(p2), {2})
+
+    def test_edge_triangles(self):
+        p1 = Point(0, 0, 0, id=0)
+        p2 = Point(1, 0, 0, id=1)
+        p3 = Point(0, 1, 0, id=2)
+        p4 = Point(0, -1, 0, id=3)
+
+        grid = Grid(radius=1, points=[p1, p2, p3, p4])
+        e = Edge(p2, p1)
+        grid.add_triangle([p1, p2, p3])
+        self.assertEqual(grid.get_num_triangles(e), 1)
+
+        grid.add_triangle([p4, p1, p2])
+        self.assertEqual(grid.get_num_triangles(e), 2)
+        self.assertEqual(grid.get_edge_triangles(e), [[p1, p2, p3], [p4, p1, p2]])
+
+        e2 = Edge(p3, p4)
+        self.assertEqual(grid.get_num_triangles(e2), 0)
+        grid.mark_closing_edge(e2)
+        self.assertEqual(grid.get_num_triangles(e2), 1)
+
+    def test_mesh_arrays(self):
+        p1 = Point(0, 0, 0, id=0)
+        p2 = Point(1, 0, 0, id=1)
+        p3 = Point(0, 1, 0, id=2)
+        p4 = Point(0, -1, 0, id=3)
+
+        grid = Grid(radius=1, points=[p1, p2, p3, p4])
+        grid.add_triangle([p1, p2, p3])
+        grid.add_triangle([p4, p1, p2])
+        grid.add_edge(Edge(p1, p2))
+        grid.add_edge(Edge(p3, p1))
+        grid.mark_closing_edge(Edge(p3, p4))
+
+        np.testing.assert_array_equal(grid.get_triangles_array(), [[0, 1, 2], [3, 0, 1]])
+        self.assertEqual(grid.get_triangles_array().dtype, np.int32)
+        self.assertEqual(grid.triangles[-1], [p4, p1, p2])
+        self.assertEqual(len(grid.triangles), 2)
+
+        # Only the edges that were added, in their order and orientation.
+        np.testing.assert_array_equal(grid.get_edges_array(), [[0, 1], [2, 0]])
+        np.testing.assert_array_equal(np.asarray(grid.edges), grid.get_edges_array())
+        self.assertEqual(list(grid.edges), [Edge(p1, p2), Edge(p1, p3)])
+        np.testing.assert_array_equal(grid.get_closing_edges(), [[2, 3]])
+
+        grid.remove_edge(Edge(p1, p2))
+        self.assertEqual(list(grid.edges), [Edge(p3, p1)])
+        self.assertEqual(grid.get_num_triangles(Edge(p1, p2)), 2)
+
+        with self.assertRaises(ValueError):
+            grid.remove_edge(Edge(p1, p2))
+
+    def test_set_radius(self):
+        points = [Point(i, i, i, id=i) for i in range(1000)]
+        grid = Grid(radius=1, points=points)
+        grid.add_edge(Edge(points[0], points[1]))
+        grid.set_radius(0.5)
+
+        self.assertEqual(len(grid.cells), 1000)
+        self.assertTrue(grid.are_connected(points[0], points[1]))
+
+    def test_negative_coordinates(self):
+        points = [Point(-i, 2 * i, -3 * i, id=i) for i in range(1000)]
+        grid = Grid(radius=0.5, points=points)
+
+        # The points span 3000 cells along the z axis, more than 8 bits per axis can encode.
+        self.assertEqual(len(grid.cells), 1000)
+        self.assertTrue(all(len(grid.get_cell_points(p.cell_code)) == 1 for p in points))
+
+    def test_cells_layout(self):
+        points = [Point(x, 0, 0, id=i) for i, x in enumerate([0, 0.1, 3, 3.2, 1.1, 0.2])]
+        grid = Grid(radius=0.5, points=points)
+
+        self.assertEqual(grid.cell_offsets.tolist(), [0, 3, 4, 6])
+        self.assertEqual(grid.cell_points.tolist(), [0, 1, 5, 4, 2, 3])
+        self.assertEqual(sorted(grid.get_cells_points_ids([points[2].cell_code, points[4].cell_code])), [2, 3, 4])
+        self.assertEqual(grid.get_cell_points(points[3].cell_code), [points[2], points[3]])
+
+    def test_min_points_per_cell(self):
+        points = [Point(i, 0, 0, id=i) for i in range(100)]
+        grid = Grid(radius=0.25, points=points, min_points_per_cell=4)
+
+        self.assertEqual(grid.cell_size, 4)
+        self.assertEqual(len(grid.cells), 25)
+        self.assertTrue(np.array_equal(grid.cell_offsets, np.arange(0, 101, 4)))
+
+    def test_neighborhoods(self):
+        points = [Point(x, y, 0, id=i) for i, (x, y) in enumerate([(0, 0), (1.5, 0), (3.5, 0), (0.5, 1.5), (5, 5)])]
+        grid = Grid(radius=0.5, points=points)
+
+        self.assertEqual(sorted(grid.get_neighbor_points_ids(points[0])), [0, 1, 3])
+        self.assertEqual(sorted(grid.get_neighbor_points_ids(points[1])), [0, 1, 3])
+        self.assertEqual(sorted(grid.get_neighbor_points_ids(points[4])), [4])
+        self.assertEqual(sorted(grid.get_common_neighbor_points_ids(points[1], points[3])), [0, 1, 3])
+        self.assertEqual(len(grid.get_common_neighbor_points_ids(points[0], points[2])), 0)
+
+        # Lookups are views of the grid's table, and can't be changed.
+        ids = grid.get_neighbor_points_ids(points[0])
+        self.assertTrue(np.shares_memory(ids, grid.index.neighborhood_ids))
+        self.assertFalse(ids.flags.writeable)
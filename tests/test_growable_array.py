@@ -0,0 +1,40 @@
+import unittest
+import numpy as np
+from growable_array import GrowableArray
+
+
+class TestGrowableArray(unittest.TestCase):
+    def test_append(self):
+        array = GrowableArray((3,), capacity=2)
+
+        for i in range(5):
+            self.assertEqual(array.append([i, i + 1, i + 2]), i)
+
+        self.assertEqual(len(array), 5)
+        self.assertEqual(len(array.data), 8)
+        self.assertEqual(array.array.dtype, np.int32)
+        np.testing.assert_array_equal(array.array[:, 0], np.arange(5))
+
+    def test_extend(self):
+        array = GrowableArray((2,), fill_value=-1, capacity=1)
+        array.append([1, 2])
+        array.extend([[3, 4], [5, 6], [7, 8]])
+        array.extend([])
+
+        np.testing.assert_array_equal(array.array, [[1, 2], [3, 4], [5, 6], [7, 8]])
+
+        # New rows start as the fill value.
+        array.reserve(10)
+        self.assertTrue(np.all(array.data[len(array):] == -1))
+
+    def test_scalars(self):
+        array = GrowableArray(dtype=np.uint8)
+        array.extend(np.ones(20))
+        array.append(2)
+
+        self.assertEqual(array.array.shape, (21,))
+        self.assertEqual(array.array[-1], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
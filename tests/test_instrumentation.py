@@ -0,0 +1,101 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from bpa import BPA
+import instrumentation
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_timed(self):
+        stats = instrumentation.Stats()
+        double = stats.timed('double', lambda x: 2 * x)
+
+        self.assertEqual(double(3), 6)
+        self.assertEqual(double(4), 8)
+        self.assertEqual(stats.counters['double'], 2)
+        self.assertGreater(stats.timers['double'], 0)
+
+    def test_unknown_profiler(self):
+        with self.assertRaises(ValueError):
+            instrumentation.Stats(profile='perf')
+
+    def test_sampling_profiler(self):
+        stats = instrumentation.Stats(profile='sampling')
+        stats.start_profile()
+        end = time.perf_counter() + 0.1
+
+        while time.perf_counter() < end:
+            pass
+
+        stats.stop_profile()
+        functions = [result['function'] for result in stats.profile_results]
+        self.assertTrue(any('test_sampling_profiler' in function for function in functions))
+
+    def test_bpa_stats(self):
+        path = os.path.join(DATA_DIR, 'bunny_with_normals.txt')
+        self.assertIsNone(BPA(path=path, radius=0.015).stats)
+
+        bpa = BPA(path=path, radius=0.015, stats=True, profile='cprofile')
+        output = os.path.join(self.directory, 'stats.json')
+        bpa.create_mesh(mode='pivot', stats_output=output)
+        counters = bpa.stats.counters
+
+        self.assertEqual(counters['triangles'], len(bpa.grid.triangles))
+        self.assertEqual(counters['seed_points_tried'], bpa.num_points_i_tried_to_seed_from)
+        self.assertGreaterEqual(counters['seeds'], 1)
+        self.assertGreater(counters['candidates'], 0)
+        self.assertGreater(counters['rejected_ball_not_empty'], 0)
+        self.assertGreater(bpa.stats.timers['expansion'], bpa.stats.timers['validate_candidates'])
+
+        # The methods are unwrapped after the run.
+        self.assertNotIn('expand_triangle', vars(bpa))
+
+        with open(output) as f:
+            saved = json.load(f)
+
+        self.assertEqual(saved['counters']['triangles'], counters['triangles'])
+        self.assertGreater(len(saved['profile']), 0)
+
+    def test_stopped_run(self):
+        bpa = BPA(path=os.path.join(DATA_DIR, 'bunny_with_normals.txt'), radius=0.015, stats=True, profile='sampling')
+        expand_triangle = BPA.expand_triangle
+        calls = []
+
+        def stop_after_20(*args):
+            calls.append(args)
+
+            if len(calls) > 20:
+                raise RuntimeError("Stopped")
+
+            return expand_triangle(*args)
+
+        with mock.patch.object(BPA, 'expand_triangle', stop_after_20):
+            with self.assertRaises(RuntimeError):
+                bpa.create_mesh(mode='pivot', output=os.path.join(self.directory, 'mesh.obj'))
+
+        # The methods are unwrapped, the profiler is stopped and the file is closed.
+        self.assertNotIn('expand_triangle', vars(bpa))
+        self.assertIsNone(bpa.stats.profiler)
+        self.assertIsNone(bpa.mesh_writer)
+        self.assertEqual(bpa.stats.counters['expansion'], 21)
+
+        # The next run isn't measured twice.
+        bpa.create_mesh(mode='pivot')
+        self.assertEqual(bpa.stats.counters['triangles'], len(bpa.grid.triangles))
+        self.assertEqual(bpa.stats.counters['expansion'], 21 + bpa.num_iterations)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import numpy as np
+
+import kernels
+from utils import calc_distance_points, calc_incircle_radius, calc_distance_point_to_edge, \
+    calc_min_max_angle_of_triangle, calc_ball_centers, cross
+from point_cloud import PointCloud
+from edge import Edge
+
+
+class TestKernels(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        coordinates = rng.uniform(-1, 1, (20, 3))
+        normals = coordinates / np.linalg.norm(coordinates, axis=1)[:, None]
+        self.cloud = PointCloud(coordinates, normals=normals)
+        self.c = kernels.as_kernel_array(self.cloud.coordinates)
+        self.n = kernels.as_kernel_array(self.cloud.normals)
+        self.triangles = [tuple(rng.choice(20, 3, replace=False)) for _ in range(20)]
+
+    def test_same_as_utils(self):
+        points = self.cloud.points
+
+        for i, j, k in self.triangles:
+            p1, p2, p3 = points[i], points[j], points[k]
+            self.assertAlmostEqual(kernels.distance(self.c, i, j), calc_distance_points(p1, p2), places=5)
+            self.assertAlmostEqual(kernels.distance_point_to_edge(self.c, k, i, j),
+                                   calc_distance_point_to_edge(p3, Edge(p1, p2)), places=5)
+            self.assertAlmostEqual(kernels.incircle_radius(self.c, i, j, k), calc_incircle_radius(p1, p2, p3),
+                                   places=5)
+            np.testing.assert_allclose(kernels.min_max_angle(self.c, i, j, j, k, k, i),
+                                       calc_min_max_angle_of_triangle(Edge(p1, p2), Edge(p2, p3), Edge(p3, p1)),
+                                       atol=1e-3)
+
+    def test_ball_center(self):
+        for radius in [0.5, 2]:
+            for i, j, k in self.triangles:
+                valid, x, y, z = kernels.ball_center(self.c, self.n, i, j, k, radius)
+                centers, valids = calc_ball_centers(self.cloud.coordinates, self.cloud.normals, i, j, [k], radius)
+                self.assertEqual(valid, valids[0])
+
+                if valid:
+                    np.testing.assert_allclose([x, y, z], centers[0], atol=1e-5)
+
+    def test_degenerate_triangle(self):
+        c = kernels.as_kernel_array(np.array([[0, 0, 0], [1, 0, 0], [2, 0, 0]], dtype=np.float64))
+        n = kernels.as_kernel_array(np.array([[0, 0, 1], [0, 0, 1], [0, 0, 1]], dtype=np.float64))
+
+        self.assertEqual(kernels.incircle_radius(c, 0, 1, 2), 0)
+        self.assertEqual(kernels.incircle_radius(c, 0, 0, 0), 0)
+        self.assertFalse(kernels.ball_center(c, n, 0, 1, 2, 1)[0])
+
+    def test_triangle_normal_dot(self):
+        c = kernels.as_kernel_array(np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=np.float64))
+        n = kernels.as_kernel_array(np.array([[0, 0, 1], [0, 0, -1], [0, 0, 1]], dtype=np.float64))
+
+        self.assertEqual(kernels.triangle_normal_dot(c, n, 0, 1, 2, 0), 1)
+        self.assertEqual(kernels.triangle_normal_dot(c, n, 0, 1, 2, 1), -1)
+        self.assertEqual(kernels.triangle_normal_dot(c, n, 0, 2, 1, 0), -1)
+
+    def test_will_triangles_overlap(self):
+        # The edge is (0, 1), point 2 is above it, point 3 above it too, point 4 below it.
+        c = kernels.as_kernel_array(np.array([[0, 0, 0], [1, 0, 0], [0.5, 1, 0], [0.2, 2, 0.1], [0.5, -1, 0]]))
+
+        self.assertTrue(kernels.will_triangles_overlap(c, 0, 1, 2, 3))
+        self.assertFalse(kernels.will_triangles_overlap(c, 0, 1, 2, 4))
+
+    def test_row_cache(self):
+        rows = kernels.RowCache(self.cloud.coordinates, max_rows=4)
+
+        for i in range(len(self.cloud)):
+            self.assertEqual(rows[i], self.cloud.coordinates[i].tolist())
+            self.assertLessEqual(len(rows), 4)
+
+        self.assertIsInstance(rows[0], list)
+
+    def test_check_candidates(self):
+        # The same checks with utils' NumPy functions, one candidate at a time.
+        coordinates, normals = self.cloud.coordinates.astype(np.float64), self.cloud.normals.astype(np.float64)
+        points = self.cloud.points
+        candidates = np.arange(20)
+        all_reasons = set()
+
+        for i, j, third in self.triangles:
+            for radius, incircle in [(0.05, True), (0.2, True), (1.0, False), (2.0, False)]:
+                reasons, flip = kernels.check_candidates(self.c, self.n, i, j, third, candidates, radius, incircle)
+                _, valid_balls = calc_ball_centers(coordinates, normals, i, j, candidates, radius)
+                edge_vector = coordinates[j] - coordinates[i]
+                plane_normal = cross(edge_vector, cross(coordinates[third] - coordinates[i], edge_vector))
+
+                for k in candidates:
+                    if k in (i, j, third):
+                        self.assertEqual(reasons[k], kernels.REJECTED_SAME_POINT)
+                        continue
+
+                    overlap = np.sign(np.dot(plane_normal, coordinates[third] - coordinates[i])) == \
+                        np.sign(np.dot(plane_normal, coordinates[k] - coordinates[i]))
+                    self.assertEqual(kernels.will_triangles_overlap(self.c, i, j, third, k), overlap)
+
+                    if overlap:
+                        expected = kernels.REJECTED_OVERLAP
+                    elif not (calc_incircle_radius(points[i], points[j], points[k]) >= radius if incircle else
+                              valid_balls[k]):
+                        expected = kernels.REJECTED_BALL
+                    else:
+                        min_angle, max_angle = calc_min_max_angle_of_triangle(
+                            Edge(points[i], points[k]), Edge(points[j], points[k]), Edge(points[i], points[j]))
+                        expected = kernels.REJECTED_ANGLE if max_angle > 180 or min_angle < 1 else kernels.ACCEPTED
+
+                    self.assertEqual(reasons[k], expected)
+
+                    if expected == kernels.ACCEPTED:
+                        normal = cross(coordinates[j] - coordinates[i], coordinates[k] - coordinates[i])
+                        self.assertEqual(flip[k], np.dot(normal, normals[i]) < 0)
+
+                all_reasons.update(reasons.tolist())
+
+        self.assertTrue({kernels.ACCEPTED, kernels.REJECTED_OVERLAP, kernels.REJECTED_BALL} <= all_reasons)
+
+    @unittest.skipUnless(kernels.HAS_NUMBA, "numba is not installed")
+    def test_compiled_kernels(self):
+        # With Numba the kernels are compiled, and get the arrays themselves.
+        self.assertIsInstance(self.c, np.ndarray)
+        self.assertEqual(self.c.dtype, np.float64)
+        self.assertTrue(hasattr(kernels.check_candidates, 'py_func'))
+
+
+if __name__ == '__main__':
+    unittest.main()
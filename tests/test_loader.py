@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from loader import load_points, iter_chunks
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+
+class TestLoader(unittest.TestCase):
+    def test_load_points_with_normals(self):
+        coordinates, normals = load_points(os.path.join(DATA_DIR, 'normals_test.txt'))
+
+        self.assertEqual(coordinates.shape, (4, 3))
+        self.assertEqual(coordinates.dtype, np.float32)
+        self.assertEqual(list(coordinates[1]), [1, 1, 0])
+        self.assertEqual(list(normals[1]), [1, 1, 1])
+
+    def test_load_mixed_lines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'points.txt')
+
+            with open(path, 'w') as f:
+                f.write("1 2 3\n\n4 5 6 0 0 1\n7 8\n-1e-3 2.5 3\n")
+
+            coordinates, normals = load_points(path)
+
+        self.assertEqual(coordinates.tolist(), [[1, 2, 3], [4, 5, 6], [np.float32(-1e-3), 2.5, 3]])
+        self.assertTrue(np.isnan(normals[0]).all())
+        self.assertEqual(list(normals[1]), [0, 0, 1])
+
+    def test_load_without_normals(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'points.txt')
+
+            with open(path, 'w') as f:
+                f.write("1 2 3\n4 5 6\n")
+
+            coordinates, normals = load_points(path)
+
+        self.assertEqual(len(coordinates), 2)
+        self.assertIsNone(normals)
+
+    def test_chunks(self):
+        path = os.path.join(DATA_DIR, 'bunny_with_normals.txt')
+        coordinates, normals = load_points(path)
+        chunks = list(iter_chunks(path, chunk_size=100))
+
+        self.assertEqual(len(chunks), int(np.ceil(len(coordinates) / 100)))
+        np.testing.assert_array_equal(np.concatenate([c for c, _ in chunks]), coordinates)
+        np.testing.assert_array_equal(np.concatenate([n for _, n in chunks]), normals)
@@ -0,0 +1,120 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import numpy as np
+from bpa import BPA
+import mesh_io
+from mesh_io import open_writer, write_mesh
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+
+def read_ply(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    end = data.index(b'end_header\n') + len(b'end_header\n')
+    header = data[:end].decode('ascii').split('\n')
+    num_vertices = int(header[2].split()[2])
+    num_properties = sum(line.startswith('property float') for line in header)
+    num_faces = int([line for line in header if line.startswith('element face')][0].split()[2])
+
+    if 'binary_little_endian' in header[1]:
+        vertices = np.frombuffer(data, dtype='<f4', count=num_vertices * num_properties, offset=end)
+        faces = np.frombuffer(data, dtype=mesh_io.PLY_FACE_DTYPE, count=num_faces, offset=end + vertices.nbytes)
+        return vertices.reshape(-1, num_properties), faces['indices']
+
+    lines = data[end:].decode('ascii').split('\n')
+    vertices = np.array([line.split() for line in lines[:num_vertices]], dtype=np.float32)
+    faces = np.array([line.split()[1:] for line in lines[num_vertices:num_vertices + num_faces]], dtype=np.int64)
+    return vertices, faces.reshape(-1, 3)
+
+
+class TestMeshIO(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.coordinates = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]], dtype=np.float32)
+        self.normals = np.array([[0, 0, 1], [0, 0, 1], [0, 0, 1], [1, 0, 0]], dtype=np.float32)
+        self.triangles = np.array([[0, 1, 2], [0, 1, 3], [0, 3, 2]])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_ply(self):
+        for binary in [True, False]:
+            path = os.path.join(self.directory, 'mesh.ply')
+            write_mesh(path, self.coordinates, self.triangles, normals=self.normals, binary=binary)
+            vertices, faces = read_ply(path)
+
+            np.testing.assert_array_equal(vertices, np.hstack([self.coordinates, self.normals]))
+            np.testing.assert_array_equal(faces, self.triangles)
+
+    def test_obj(self):
+        for normals in [None, self.normals]:
+            path = os.path.join(self.directory, 'mesh.obj')
+            write_mesh(path, self.coordinates, self.triangles, normals=normals)
+
+            with open(path) as f:
+                lines = [line.split() for line in f.read().splitlines()]
+
+            vertices = np.array([line[1:] for line in lines if line[0] == 'v'], dtype=np.float32)
+            faces = np.array([[int(value.split('//')[0]) for value in line[1:]] for line in lines if line[0] == 'f'])
+            np.testing.assert_array_equal(vertices, self.coordinates)
+            np.testing.assert_array_equal(faces - 1, self.triangles)
+
+            if normals is not None:
+                vertices_normals = np.array([line[1:] for line in lines if line[0] == 'vn'], dtype=np.float32)
+                np.testing.assert_array_equal(vertices_normals, normals)
+
+    def test_stl(self):
+        path = os.path.join(self.directory, 'mesh.stl')
+        write_mesh(path, self.coordinates, self.triangles)
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        num_triangles = struct.unpack('<I', data[80:84])[0]
+        records = np.frombuffer(data, dtype=mesh_io.STL_TRIANGLE_DTYPE, offset=84)
+        self.assertEqual(num_triangles, 3)
+        self.assertEqual(len(records), 3)
+        np.testing.assert_array_equal(records['vertices'], self.coordinates[self.triangles])
+        np.testing.assert_allclose(records['normal'][0], [0, 0, 1])
+
+    def test_streaming(self):
+        # After every chunk the file is a valid mesh of the triangles written so far.
+        path = os.path.join(self.directory, 'mesh.ply')
+        writer = open_writer(path, self.coordinates)
+        writer.write_triangles(self.triangles[:2])
+        self.assertEqual(len(read_ply(path)[1]), 2)
+
+        writer.write_triangles(self.triangles[2:])
+        writer.close()
+        np.testing.assert_array_equal(read_ply(path)[1], self.triangles)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            open_writer(os.path.join(self.directory, 'mesh.off'), self.coordinates)
+
+    def test_bpa_output(self):
+        path = os.path.join(self.directory, 'mesh.ply')
+        chunk_size = mesh_io.MESH_CHUNK_SIZE
+        mesh_io.MESH_CHUNK_SIZE = 100
+
+        try:
+            bpa = BPA(path=os.path.join(DATA_DIR, 'bunny_with_normals.txt'), radius=0.015)
+            bpa.create_mesh(mode='pivot', output=path)
+        finally:
+            mesh_io.MESH_CHUNK_SIZE = chunk_size
+
+        vertices, faces = read_ply(path)
+        triangles = bpa.get_triangles_array()
+        self.assertEqual(len(vertices), len(bpa.points))
+        np.testing.assert_array_equal(faces, triangles)
+        self.assertEqual(sorted(map(sorted, triangles.tolist())),
+                         sorted(sorted(p.id for p in triangle) for triangle in bpa.grid.triangles))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from bpa import BPA
+import loader
+import normal_estimation
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+
+def create_sphere(num_points=3000):
+    rng = np.random.default_rng(0)
+    coordinates = rng.normal(size=(num_points, 3))
+    return coordinates / np.linalg.norm(coordinates, axis=1, keepdims=True)
+
+
+class TestNormalEstimation(unittest.TestCase):
+    def test_sphere(self):
+        coordinates = create_sphere()
+        normals = normal_estimation.estimate_normals(coordinates)
+
+        # The normals point outwards, along the radius.
+        np.testing.assert_allclose(np.linalg.norm(normals, axis=1), 1, rtol=1e-5)
+        self.assertGreater(np.einsum('ij,ij->i', normals, coordinates).min(), 0.95)
+
+    def test_reference(self):
+        # The normals of a plane have no outside, so they are oriented by the points that have normals.
+        rng = np.random.default_rng(0)
+        coordinates = np.column_stack([rng.random((500, 2)), np.zeros(500)])
+        reference = np.full_like(coordinates, np.nan)
+        reference[:10] = [0, 0, -1]
+        normals = normal_estimation.estimate_normals(coordinates, reference=reference)
+
+        np.testing.assert_allclose(normals, np.tile([0, 0, -1], (500, 1)), atol=1e-5)
+
+    def test_spanning_forest_signs(self):
+        # Two parts: a chain of 4 points whose normals alternate, and a pair with the same normal.
+        sources, targets = np.array([0, 1, 2, 4]), np.array([1, 2, 3, 5])
+        opposite = np.array([True, True, True, False])
+        parts, flips = normal_estimation.get_spanning_forest_signs(6, sources, targets, np.zeros(4), opposite)
+
+        self.assertEqual(len(set(parts[:4])), 1)
+        self.assertEqual(len(set(parts[4:])), 1)
+        self.assertNotEqual(parts[0], parts[4])
+        self.assertEqual(list(flips[:4] ^ flips[0]), [False, True, False, True])
+        self.assertEqual(flips[4], flips[5])
+
+    def test_num_workers(self):
+        coordinates = create_sphere()
+        normals = normal_estimation.estimate_normals(coordinates, chunk_size=1000)
+        np.testing.assert_array_equal(normal_estimation.estimate_normals(coordinates, chunk_size=1000, num_workers=2),
+                                      normals)
+
+    def test_points_without_normals(self):
+        directory = tempfile.mkdtemp()
+
+        try:
+            coordinates, normals = loader.load_points(os.path.join(DATA_DIR, 'bunny_with_normals.txt'))
+            path = os.path.join(directory, 'bunny.txt')
+            np.savetxt(path, coordinates)
+
+            bpa = BPA(path=path, radius=0.015)
+            bpa.create_mesh(mode='pivot')
+
+            # Most of the estimated normals point to the same side as the normals of the file.
+            order = bpa.cloud.original_indices
+            self.assertGreater((np.einsum('ij,ij->i', bpa.cloud.normals, normals[order]) > 0).mean(), 0.9)
+            self.assertGreater(len(bpa.grid.triangles), 0)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
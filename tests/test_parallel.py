@@ -0,0 +1,38 @@
+import os
+import unittest
+import numpy as np
+from parallel import partition_points, get_points_near_boundaries, split_iterations
+from bpa import BPA
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+
+class TestParallel(unittest.TestCase):
+    def test_partition_points(self):
+        coordinates = np.array([[0, 0, 0], [5, 0, 1], [1, 0, 0], [4, 0, 0], [2, 1, 0], [3, 0, 1]], dtype=np.float32)
+        blocks, axis = partition_points(coordinates, 2)
+
+        self.assertEqual(axis, 0)
+        self.assertEqual([list(block) for block in blocks], [[0, 2, 4], [1, 3, 5]])
+
+        near = get_points_near_boundaries(coordinates, blocks, axis, 0.5)
+        self.assertEqual(list(np.flatnonzero(near)), [5])
+
+    def test_parallel_reconstruction(self):
+        bpa = BPA(path=os.path.join(DATA_DIR, 'bunny_with_normals.txt'), radius=0.015, num_workers=2)
+        bpa.create_mesh(mode='pivot')
+        num_triangles = [bpa.grid.get_num_triangles(edge) for edge in bpa.grid.edges]
+
+        self.assertGreater(len(bpa.grid.triangles), 0)
+        self.assertLessEqual(max(num_triangles), 2)
+        self.assertEqual(len({tuple(sorted(p.id for p in t)) for t in bpa.grid.triangles}), len(bpa.grid.triangles))
+
+    def test_limit_iterations(self):
+        # The blocks and the stitching share the limit, as if there was a single process.
+        bpa = BPA(path=os.path.join(DATA_DIR, 'bunny_with_normals.txt'), radius=0.015, num_workers=2)
+        bpa.create_mesh(mode='pivot', limit_iterations=40)
+
+        self.assertEqual(bpa.num_iterations, 40)
+        self.assertLessEqual(len(bpa.grid.triangles), 40)
+        self.assertEqual(split_iterations(7, 3), [3, 2, 2])
+        self.assertEqual(split_iterations(np.inf, 2), [np.inf, np.inf])
@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from bpa import BPA
+from point_cloud import PointCloud
+from point_cache import write_cache, open_cache, is_cache_valid, get_cache_path, convert
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+
+class TestPointCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        cloud = PointCloud([[2, 0, 0], [0, 1, 0], [0, 0, 3]], normals=[[1, 0, 0], [0, 1, 0], [0, 0, 1]])
+        cloud.sort_lexicographic()
+        cloud.cell_codes[:] = [5, -7, 9]
+        path = os.path.join(self.directory, 'points.bpac')
+        write_cache(path, cloud, radius=0.5)
+
+        cached, radius = open_cache(path)
+
+        self.assertEqual(radius, 0.5)
+        self.assertIsInstance(cached.coordinates, np.memmap)
+        self.assertTrue(np.array_equal(cached.coordinates, cloud.coordinates))
+        self.assertTrue(np.array_equal(cached.normals, cloud.normals))
+        self.assertEqual(cached.original_indices.tolist(), [2, 1, 0])
+        self.assertEqual(cached.cell_codes.tolist(), [5, -7, 9])
+
+        # Changes to the arrays don't reach the file.
+        cached.cell_codes[0] = 1
+        self.assertEqual(open_cache(path)[0].cell_codes[0], 5)
+
+    def test_without_normals_and_cells(self):
+        path = os.path.join(self.directory, 'points.bpac')
+        write_cache(path, PointCloud([[1, 2, 3], [4, 5, 6]]))
+
+        cached, radius = open_cache(path)
+
+        self.assertIsNone(radius)
+        self.assertIsNone(cached.normals)
+        self.assertEqual(cached.coordinates.tolist(), [[1, 2, 3], [4, 5, 6]])
+
+    def test_stale_cache(self):
+        source_path = os.path.join(self.directory, 'points.txt')
+
+        with open(source_path, 'w') as f:
+            f.write("1 2 3\n4 5 6\n")
+
+        path = convert(source_path)
+        self.assertEqual(path, get_cache_path(source_path))
+        self.assertTrue(is_cache_valid(path, source_path))
+
+        with open(source_path, 'a') as f:
+            f.write("7 8 9\n")
+
+        self.assertFalse(is_cache_valid(path, source_path))
+
+    def test_bpa_with_cache(self):
+        source_path = os.path.join(self.directory, 'bunny_with_normals.txt')
+        shutil.copy(os.path.join(DATA_DIR, 'bunny_with_normals.txt'), source_path)
+
+        bpa = BPA(path=source_path, radius=0.015, cache=True)
+        self.assertTrue(is_cache_valid(get_cache_path(source_path), source_path))
+
+        cached_bpa = BPA(path=source_path, radius=0.015, cache=True)
+        self.assertIsInstance(cached_bpa.cloud.coordinates, np.memmap)
+        self.assertTrue(np.array_equal(cached_bpa.cloud.coordinates, bpa.cloud.coordinates))
+        self.assertEqual(cached_bpa.grid.cells.keys(), bpa.grid.cells.keys())
+        self.assertEqual(len(cached_bpa.grid.get_cell_points(bpa.points[0].cell_code)),
+                         len(bpa.grid.get_cell_points(bpa.points[0].cell_code)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import numpy as np
+from point_cloud import PointCloud
+from point import Point
+
+
+class TestPointCloud(unittest.TestCase):
+    def test_points_are_views(self):
+        cloud = PointCloud([[0, 1, 2], [3, 4, 5]], normals=[[0, 0, 1], [0, 1, 0]])
+        p = cloud[1]
+
+        self.assertIs(cloud[1], p)
+        self.assertEqual(p.id, 1)
+        self.assertEqual((p.x, p.y, p.z), (3, 4, 5))
+        self.assertEqual(list(p.normal), [0, 1, 0])
+
+        p.is_used = True
+        p.cell_code = 7
+        self.assertTrue(cloud.used[1])
+        self.assertEqual(cloud.cell_codes[1], 7)
+        self.assertFalse(cloud[0].is_used)
+        self.assertIsNone(cloud[0].cell_code)
+
+    def test_sort_lexicographic(self):
+        coordinates = [[1, 0, 0], [0, 2, 0], [0, 1, 5], [0, 1, 3]]
+        cloud = PointCloud(coordinates, normals=np.eye(4, 3))
+        order = cloud.sort_lexicographic()
+
+        self.assertEqual(list(order), [3, 2, 1, 0])
+        self.assertEqual(cloud.coordinates.tolist(), [[0, 1, 3], [0, 1, 5], [0, 2, 0], [1, 0, 0]])
+        self.assertEqual(cloud.normals[3].tolist(), [1, 0, 0])
+        self.assertEqual([p.id for p in cloud], [0, 1, 2, 3])
+
+    def test_standalone_point(self):
+        p = Point(1, 2, 3, id=5)
+        self.assertEqual(p.id, 5)
+        self.assertIsNone(p.normal)
+
+        p.normal = [0, 0, 1]
+        self.assertEqual(list(p.normal), [0, 0, 1])
@@ -0,0 +1,82 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+import numpy as np
+from bpa import BPA
+import rasterizer
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+
+def read_png(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    width, height = struct.unpack('>II', data[16:24])
+    idat_length = struct.unpack('>I', data[33:37])[0]
+    rows = np.frombuffer(zlib.decompress(data[41:41 + idat_length]), dtype=np.uint8).reshape(height, -1)
+    return rows[:, 1:].reshape(height, width, 3)
+
+
+class TestRasterizer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_render_triangles(self):
+        # A square facing the camera, made of 2 triangles, and a tilted triangle in front of it or behind it.
+        square = [[-1, -1, 0], [1, -1, 0], [1, 1, 0], [-1, 1, 0]]
+        triangles = np.array([[0, 1, 2], [0, 2, 3], [4, 5, 6]])
+        colors = []
+
+        for z in [0.5, -0.5]:
+            coordinates = np.array(square + [[-0.2, -0.2, z], [0.2, -0.2, z + 0.3], [0, 0.2, z]])
+            image = rasterizer.render(coordinates, triangles, image_size=(100, 80), angle=0)
+            colors.append(image[40, 50])
+
+            self.assertEqual(image.shape, (80, 100, 3))
+            np.testing.assert_array_equal(image[0, 0], rasterizer.BACKGROUND_COLOR)
+
+            # Inside the square, but not at its corner (the points are drawn there).
+            corner = rasterizer.Camera(coordinates, image_size=(100, 80)).project(coordinates[:1]).astype(int)[0]
+            square_color = image[corner[1] - 3, corner[0] + 3]
+            self.assertTrue(np.all(square_color < 255))
+
+        # Only the triangle in front of the square is seen.
+        self.assertFalse(np.array_equal(colors[0], square_color))
+        np.testing.assert_array_equal(colors[1], square_color)
+
+    def test_render_lines(self):
+        coordinates = np.array([[-1, 0, 0], [1, 0, 0]])
+        image = rasterizer.render(coordinates, lines=[[0, 1]], line_colors=[[1, 0, 0]], image_size=(50, 50))
+        red = np.all(image == [255, 0, 0], axis=2)
+
+        self.assertGreater(red.sum(), 30)
+        self.assertEqual(len(np.unique(np.nonzero(red)[0])), 1)
+
+    def test_write_png(self):
+        image = np.random.RandomState(0).randint(0, 256, size=(7, 5, 3)).astype(np.uint8)
+        path = os.path.join(self.directory, 'image.png')
+        rasterizer.write_png(path, image)
+
+        np.testing.assert_array_equal(read_png(path), image)
+
+    def test_bpa_frames(self):
+        frames_dir = os.path.join(self.directory, 'frames')
+        bpa = BPA(path=os.path.join(DATA_DIR, 'bunny_with_normals.txt'), radius=0.015, frames_dir=frames_dir)
+        bpa.create_mesh(mode='pivot')
+        bpa.visualizer.close()
+
+        frames = sorted(os.listdir(frames_dir))
+        self.assertGreaterEqual(len(frames), 1)
+        self.assertEqual(frames[0], 'frame_00000.png')
+        self.assertEqual(read_png(os.path.join(frames_dir, frames[-1])).shape, (600, 800, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import unittest
+import numpy as np
+from bpa import BPA
+from grid import Grid
+from point_cloud import PointCloud
+from spatial_index import HashGridIndex, KDTreeIndex, create_index
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+
+def create_uneven_cloud(num_points=2000):
+    # Half of the points in a small blob, half spread on a plane.
+    rng = np.random.default_rng(1)
+    coordinates = rng.normal(size=(num_points, 3)) * np.array([1, 1, 0.05])
+    coordinates[:num_points // 2] *= 0.02
+    return PointCloud(coordinates)
+
+
+class TestSpatialIndex(unittest.TestCase):
+    def setUp(self):
+        self.cloud = create_uneven_cloud()
+        self.grid = Grid(radius=0.01, points=self.cloud.points)
+        self.centers = np.random.default_rng(2).normal(size=(50, 3)) * 0.05
+        self.distances = np.sqrt(((self.cloud.coordinates[None, :, :] - self.centers[:, None, :]) ** 2).sum(axis=2))
+
+    def get_indices(self):
+        return [HashGridIndex(self.grid, self.cloud.coordinates, np.arange(len(self.cloud))),
+                KDTreeIndex(self.cloud.coordinates, np.arange(len(self.cloud)), self.grid.cell_size)]
+
+    def test_query_radius(self):
+        for index in self.get_indices():
+            ids, offsets = index.query_radius(self.centers, 0.03)
+
+            for i in range(len(self.centers)):
+                self.assertEqual(sorted(ids[offsets[i]:offsets[i + 1]]), list(np.nonzero(self.distances[i] <= 0.03)[0]))
+
+    def test_query_knn(self):
+        for index in self.get_indices():
+            ids = index.query_knn(self.centers, 7)
+
+            for i in range(len(self.centers)):
+                self.assertEqual(list(ids[i]), list(np.argsort(self.distances[i], kind='stable')[:7]))
+
+    def test_neighborhoods(self):
+        for index in self.get_indices():
+            for i in range(0, len(self.cloud), 50):
+                distances = np.sqrt(((self.cloud.coordinates - self.cloud.coordinates[i]) ** 2).sum(axis=1))
+                neighbors = set(index.get_neighbor_points_ids(i))
+                self.assertTrue(set(np.nonzero(distances <= 0.02)[0]) <= neighbors)
+                self.assertFalse(index.get_neighbor_points_ids(i).flags.writeable)
+
+                # The candidates of an edge are around both its points.
+                common = set(index.get_common_neighbor_points_ids(i, i + 1))
+                self.assertTrue(common <= neighbors & set(index.get_neighbor_points_ids(i + 1)))
+
+    def test_auto_index(self):
+        self.assertIsInstance(create_index('auto', self.grid, self.cloud.coordinates, np.arange(len(self.cloud))),
+                              KDTreeIndex)
+
+        # Evenly spread points.
+        x, y = np.meshgrid(np.arange(50), np.arange(50))
+        cloud = PointCloud(np.stack([x.ravel(), y.ravel(), np.zeros(x.size)], axis=1))
+        grid = Grid(radius=1, points=cloud.points)
+        self.assertIsInstance(create_index('auto', grid, cloud.coordinates, np.arange(len(cloud))), HashGridIndex)
+
+    def test_bpa_with_kdtree(self):
+        triangles = []
+
+        for index in ('grid', 'kdtree'):
+            bpa = BPA(path=os.path.join(DATA_DIR, 'bunny_with_normals.txt'), radius=0.015, index=index)
+            bpa.create_mesh(limit_iterations=100, mode='pivot')
+            triangles.append(sorted(tuple(sorted(p.id for p in triangle)) for triangle in bpa.grid.triangles))
+
+        self.assertGreater(len(triangles[0]), 0)
+        self.assertEqual(triangles[0], triangles[1])
+
+    def test_auto_index_mesh(self):
+        # The teapot's density is uneven, so 'auto' picks the KD-tree in pivot mode. The mesh is the same in both modes.
+        path = os.path.join(DATA_DIR, 'teapot_with_normal.txt')
+
+        for mode, indices in [('pivot', ('grid', 'kdtree', 'auto')), ('incircle', ('grid', 'auto'))]:
+            triangles = []
+
+            for index in indices:
+                bpa = BPA(path=path, radius=0.02, index=index)
+                bpa.create_mesh(limit_iterations=1000, mode=mode)
+                triangles.append(sorted(tuple(sorted(p.id for p in triangle)) for triangle in bpa.grid.triangles))
+
+            self.assertIsInstance(bpa.grid.index, KDTreeIndex if mode == 'pivot' else HashGridIndex)
+            self.assertGreater(len(triangles[0]), 0)
+
+            for other in triangles[1:]:
+                self.assertEqual(other, triangles[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
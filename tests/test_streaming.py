@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from bpa import BPA
+import loader
+import streaming
+from test_mesh_io import read_ply
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(DATA_DIR, 'bunny_with_normals.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_tiles(self):
+        tiles_dir = os.path.join(self.directory, 'tiles')
+        metadata = streaming.write_tiles(self.path, tiles_dir, 0.015, tile_size=150, chunk_size=100)
+        coordinates, normals = streaming.open_points(tiles_dir, metadata)
+        num_tiles = len(metadata['boundaries']) + 1
+
+        self.assertGreater(num_tiles, 1)
+        self.assertTrue(np.all(np.diff(metadata['boundaries']) >= 4 * 0.015))
+        np.testing.assert_array_equal(coordinates, loader.load_points(self.path)[0])
+
+        # Each point is in a single tile, between the tile's boundaries.
+        tiles = [streaming.read_tile(tiles_dir, i) for i in range(num_tiles)]
+        np.testing.assert_array_equal(np.sort(np.concatenate(tiles)), np.arange(metadata['num_points']))
+        boundaries = [-np.inf] + metadata['boundaries'] + [np.inf]
+
+        for i, tile in enumerate(tiles):
+            values = coordinates[tile, metadata['axis']]
+            self.assertTrue(np.all((values >= boundaries[i]) & (values < boundaries[i + 1])))
+
+    def test_reconstruct_streaming(self):
+        output = os.path.join(self.directory, 'mesh.ply')
+        num_triangles = streaming.reconstruct_streaming(self.path, output, 0.015, tile_size=150, mode='pivot')
+        vertices, triangles = read_ply(output)
+
+        bpa = BPA(path=self.path, radius=0.015)
+        bpa.create_mesh(mode='pivot')
+
+        self.assertEqual(len(vertices), len(bpa.points))
+        self.assertEqual(len(triangles), num_triangles)
+        self.assertAlmostEqual(num_triangles / len(bpa.grid.triangles), 1, delta=0.05)
+
+        # No triangle is written twice, and no edge is in more than 2 triangles.
+        triangles = np.sort(triangles, axis=1)
+        self.assertEqual(len(np.unique(triangles, axis=0)), len(triangles))
+        _, counts = np.unique(streaming.get_edge_keys(streaming.get_triangles_edges(triangles)), return_counts=True)
+        self.assertLessEqual(counts.max(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
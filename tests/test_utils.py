@@ -1,5 +1,8 @@
 import unittest
-from utils import calc_distance_points, calc_incircle_radius, calc_distance_point_to_edge, encode_cell, decode_cell
+import numpy as np
+from utils import calc_distance_points, calc_incircle_radius, calc_distance_point_to_edge, encode_cell, decode_cell, \
+    sort_points_by_distance, round_values, calc_ball_centers, calc_pivot_angles
+from point_cloud import PointCloud
 from point import Point
 from edge import Edge
 
@@ -59,7 +62,51 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(y, 2)
         self.assertEqual(z, 3)
 
-
-
-
-
+        # More than 8 bits per axis.
+        self.assertEqual(decode_cell(encode_cell(300000, 1, 2000000)), (300000, 1, 2000000))
+
+    def test_round_values(self):
+        values = np.array([0.125, 0.135, 2.675, 1.005, 0.3333, 0.0149999])
+        rounded = round_values(values, 2)
+        self.assertEqual(list(rounded), [round(float(v), 2) for v in values])
+
+    def test_sort_points_by_distance(self):
+        rng = np.random.default_rng(0)
+        cloud = PointCloud(rng.random((200, 3)))
+        p1, p2 = cloud[0], cloud[1]
+        indices = np.arange(200)
+
+        # Sorting the same way as the algorithm did with lists of points.
+        dists = [calc_distance_points(p1, p) for p in cloud]
+        expected = [p.id for _, p in sorted(zip(dists, cloud.points))][:6]
+        self.assertEqual(list(sort_points_by_distance(cloud.coordinates, indices, [0], limit=6)), expected)
+
+        dists = [round(round(calc_distance_points(p1, p), 2) + round(calc_distance_points(p2, p), 2), 2) for p in cloud]
+        expected = [p.id for _, p in sorted(zip(dists, cloud.points))][:5]
+        self.assertEqual(list(sort_points_by_distance(cloud.coordinates, indices, [0, 1], limit=5, decimals=2)),
+                         expected)
+
+    def test_ball_centers(self):
+        coordinates = np.array([[0, 0, 0], [2, 0, 0], [0, 2, 0], [10, 0, 0]], dtype=np.float32)
+        normals = np.array([[0, 0, 1]] * 4, dtype=np.float32)
+
+        centers, valid = calc_ball_centers(coordinates, normals, 0, 1, [2, 3], radius=1.5)
+        self.assertEqual(list(valid), [True, False])
+
+        # The circumcenter is (1, 1, 0) with radius sqrt(2), so the ball is above it.
+        np.testing.assert_allclose(centers[0], [1, 1, np.sqrt(1.5 ** 2 - 2)])
+
+        # Flipping the normals puts the ball on the other side.
+        centers, valid = calc_ball_centers(coordinates, -normals, 0, 1, [2], radius=1.5)
+        self.assertLess(centers[0][2], 0)
+
+    def test_pivot_angles(self):
+        coordinates = np.array([[0, 0, 0], [2, 0, 0], [1, 1, 0], [1, -2, 0], [1, -1, 1]], dtype=np.float32)
+        normals = np.array([[0, 0, 1]] * 5, dtype=np.float32)
+        centers, _ = calc_ball_centers(coordinates, normals, 0, 1, [2, 3, 4], radius=2)
+
+        # The ball pivots away from point 2, so it hits the flat neighbor point before the one leaning back over it.
+        angles = calc_pivot_angles(coordinates, 0, 1, 2, centers[0], centers)
+        self.assertAlmostEqual(angles[0], 0)
+        self.assertGreater(angles[1], 0)
+        self.assertLess(angles[1], angles[2])
@@ -0,0 +1,56 @@
+import os
+import queue
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from bpa import BPA
+from visualizer import Visualizer
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+
+class TestVisualizer(unittest.TestCase):
+    def test_send(self):
+        directory = tempfile.mkdtemp()
+
+        try:
+            bpa = BPA(path=os.path.join(DATA_DIR, 'bunny_with_normals.txt'), radius=0.015)
+            bpa.create_mesh(limit_iterations=50, mode='pivot')
+            grid = bpa.grid
+
+            # Without Open3D there is only the frames process. It's stopped, and the updates are read from a plain
+            # queue instead. They are only sent when send is called.
+            visualizer = Visualizer(bpa.cloud, max_fps=1e-12, frames_dir=directory)
+            visualizer.close()
+            visualizer.queue = queue.Queue()
+
+            # A row that is no longer an edge isn't sent.
+            visualizer.update(grid, color='red')
+            grid.remove_edge(grid.get_edge_by_row(0))
+            visualizer.send()
+            edges, triangles, colors = visualizer.queue.get_nowait()
+            np.testing.assert_array_equal(edges, grid.get_edges_array())
+            np.testing.assert_array_equal(triangles, grid.get_triangles_array())
+            np.testing.assert_array_equal(colors, np.tile([1., 0, 0], (len(edges), 1)))
+            num_edges, num_triangles = len(grid.edge_points), len(triangles)
+
+            # Only what was added since is sent, in the color of its update.
+            bpa.create_mesh(limit_iterations=50, mode='pivot')
+            visualizer.update(grid, color='green')
+            visualizer.send()
+            edges, triangles, colors = visualizer.queue.get_nowait()
+            np.testing.assert_array_equal(edges, grid.edge_points.array[num_edges:])
+            np.testing.assert_array_equal(triangles, grid.get_triangles_array()[num_triangles:])
+            np.testing.assert_array_equal(colors, np.tile([0., 1, 0], (len(edges), 1)))
+            self.assertGreater(len(edges), 0)
+
+            # Nothing new, nothing is sent.
+            visualizer.send()
+            self.assertTrue(visualizer.queue.empty())
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
 import math
 import numpy as np
 
+# Number of bits of each axis in a cell code.
+CELL_BITS = 21
+CELL_MASK = (1 << CELL_BITS) - 1
+
 
 def calc_distance_points(p1, p2) -> float:
     """
@@ -13,6 +17,78 @@ def calc_distance_points(p1, p2) -> float:
     return math.sqrt(math.pow((p2.x - p1.x), 2) + math.pow((p2.y - p1.y), 2) + math.pow((p2.z - p1.z), 2))
 
 
+def calc_distances_from_point(coordinates, indices, index) -> np.ndarray:
+    """
+    Calculate the distances of many points from a single point at once. Gives the same values as
+    calc_distance_points: the differences are taken in the points' precision and the rest is done in double precision.
+
+    :param coordinates: Array of shape (N, 3) with all the points coordinates.
+    :param indices: Indices of the points to calculate their distance.
+    :param index: Index of the point to calculate the distance from.
+    :return: Array of the distances.
+    """
+    v = (coordinates[indices] - coordinates[index]).astype(np.float64)
+    return np.sqrt(v[:, 0] * v[:, 0] + v[:, 1] * v[:, 1] + v[:, 2] * v[:, 2])
+
+
+def round_values(values, decimals) -> np.ndarray:
+    """
+    Round an array of values the same way Python's round() does. np.round scales the values before rounding them, so
+    values that are (almost) exactly half way between two decimals might be rounded differently. These are rounded
+    again with round().
+
+    :param values: Array of values.
+    :param decimals: Number of decimals to round to.
+    :return: Array of the rounded values.
+    """
+    rounded = np.round(values, decimals)
+    scaled = values * 10 ** decimals
+    ties = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+
+    for i in np.flatnonzero(ties):
+        rounded[i] = round(float(values[i]), decimals)
+
+    return rounded
+
+
+def sort_points_by_distance(coordinates, indices, anchors, limit=None, decimals=None) -> np.ndarray:
+    """
+    Sort points by the sum of their distances from some anchor points. Points with the same distance are sorted by
+    their z coordinate (like Point's comparison), and then by their index.
+    If limit is given, only the closest points are selected (with partial selection instead of a full sort).
+
+    :param coordinates: Array of shape (N, 3) with all the points coordinates.
+    :param indices: Indices of the points to sort.
+    :param anchors: Indices of the points to calculate the distances from.
+    :param limit: (Optional) maximum number of points to return.
+    :param decimals: (Optional) number of decimals to round each distance and their sum to.
+    :return: The sorted indices.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    distances = np.zeros(len(indices))
+
+    for anchor in anchors:
+        d = calc_distances_from_point(coordinates, indices, anchor)
+
+        if decimals is not None:
+            d = round_values(d, decimals)
+
+        distances = distances + d
+
+    if decimals is not None:
+        distances = round_values(distances, decimals)
+
+    if limit is not None and len(indices) > limit:
+        # Keep all points that are not farther than the limit-th closest point, so ties are broken the same way as in
+        # a full sort.
+        kth_distance = np.partition(distances, limit - 1)[limit - 1]
+        mask = distances <= kth_distance
+        indices, distances = indices[mask], distances[mask]
+
+    order = np.lexsort((indices, coordinates[indices, 2], distances))
+    return indices[order][:limit]
+
+
 def calc_distance_point_to_edge(point, edge) -> float:
     """
     Calculate the distance of a point to an edge. Taken from here: https://math.stackexchange.com/q/1905581
@@ -67,17 +143,101 @@ def calc_min_max_angle_of_triangle(e1, e2, e3) -> (float, float):
     return min(angle1, angle2, angle3), max(angle1, angle2, angle3)
 
 
+def cross(u, v) -> np.ndarray:
+    """
+    Calculate the cross product of vectors along the last axis. Same as np.cross, without its overhead, which is much
+    longer than the arithmetic for a few vectors.
+
+    :param u: Array of shape (..., 3).
+    :param v: Array of shape (..., 3).
+    :return: Array of the cross products.
+    """
+    u, v = np.asarray(u), np.asarray(v)
+    return np.stack([u[..., 1] * v[..., 2] - u[..., 2] * v[..., 1],
+                     u[..., 2] * v[..., 0] - u[..., 0] * v[..., 2],
+                     u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0]], axis=-1)
+
+
+def calc_ball_centers(coordinates, normals, i1, i2, indices, radius) -> (np.ndarray, np.ndarray):
+    """
+    Calculate the centers of the balls of a given radius that touch the 2 points i1, i2 and each of the points in
+    indices. Of the 2 possible centers, the one on the side the points normals are pointing to is taken.
+    Based on the circumcenter formula: https://en.wikipedia.org/wiki/Circumscribed_circle#Higher_dimensions
+
+    :param coordinates: Array of shape (N, 3) with all the points coordinates.
+    :param normals: Array of shape (N, 3) with all the points normals.
+    :param i1: Index of the first point.
+    :param i2: Index of the second point.
+    :param indices: Indices of the third points.
+    :param radius: The ball's radius.
+    :return: Array of shape (k, 3) of the centers, and a boolean mask of the triangles that the ball can touch all their
+    points (the rest of the centers are nan).
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    a = coordinates[i1].astype(np.float64)
+    ab = coordinates[i2].astype(np.float64) - a
+    ac = coordinates[indices].astype(np.float64) - a
+    n = cross(ab, ac)
+    n_norm_2 = np.einsum('ij,ij->i', n, n)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        circumcenter = (np.einsum('ij,ij->i', ac, ac)[:, None] * cross(n, ab) +
+                        np.dot(ab, ab) * cross(ac, n)) / (2 * n_norm_2[:, None])
+        h_2 = radius ** 2 - np.einsum('ij,ij->i', circumcenter, circumcenter)
+        n = n / np.sqrt(n_norm_2)[:, None]
+
+    # The ball is on the side of the triangle the points normals are pointing to.
+    points_normals = normals[i1].astype(np.float64) + normals[i2] + normals[indices]
+    n[np.einsum('ij,ij->i', n, points_normals) < 0] *= -1
+
+    valid = (n_norm_2 > 0) & (h_2 >= 0)
+    centers = np.full((len(indices), 3), np.nan)
+    centers[valid] = a + circumcenter[valid] + np.sqrt(h_2[valid])[:, None] * n[valid]
+    return centers, valid
+
+
+def calc_pivot_angles(coordinates, i1, i2, i_third, center, new_centers) -> np.ndarray:
+    """
+    Calculate the angles a ball should rotate around the edge (i1, i2) from its current center to each of the new
+    centers. The ball rotates away from the third point of the triangle it's currently touching.
+
+    :param coordinates: Array of shape (N, 3) with all the points coordinates.
+    :param i1: Index of the first point of the edge.
+    :param i2: Index of the second point of the edge.
+    :param i_third: Index of the third point of the triangle the ball is touching.
+    :param center: The current center of the ball.
+    :param new_centers: Array of shape (k, 3) of the new centers.
+    :return: Array of the angles, in range [0, 2*pi).
+    """
+    p1 = coordinates[i1].astype(np.float64)
+    p2 = coordinates[i2].astype(np.float64)
+    middle = (p1 + p2) / 2
+    e = (p2 - p1) / np.linalg.norm(p2 - p1)
+
+    def perpendicular(v):
+        return v - np.outer(np.dot(v, e), e) if v.ndim == 2 else v - np.dot(v, e) * e
+
+    u0 = perpendicular(np.asarray(center, dtype=np.float64) - middle)
+    u1 = perpendicular(np.asarray(new_centers, dtype=np.float64) - middle)
+    w = perpendicular(coordinates[i_third].astype(np.float64) - middle)
+
+    # Choose the rotation direction that moves the ball away from the third point.
+    axis = -e if np.dot(cross(e, u0), w) > 0 else e
+    angles = np.arctan2(np.dot(cross(u0, u1), axis), np.dot(u1, u0))
+    return np.mod(angles, 2 * np.pi)
+
+
 def encode_cell(x, y, z):
     """
-    Encode 3 numbers into a single one.
+    Encode 3 numbers into a single one. Works on scalars and on NumPy arrays.
 
     :param x: First number.
     :param y: Second number.
     :param z: Third number.
     :return: Code.
     """
-    # Assuming each coordinate is 8 bytes.
-    code = x | (y << 8) | (z << 16)
+    # Each number takes CELL_BITS bits, so the code fits in a (signed) 64 bit integer.
+    code = x | (y << CELL_BITS) | (z << (2 * CELL_BITS))
     return code
 
 
@@ -88,10 +248,18 @@ def decode_cell(code):
     :param code: The code
     :return: 3 numbers.
     """
-    mask_x = 0b000000000000000011111111
-    x = code & mask_x
-    mask_y = 0b000000001111111100000000
-    y = (code & mask_y) >> 8
-    z = code >> 16
+    x = code & CELL_MASK
+    y = (code >> CELL_BITS) & CELL_MASK
+    z = code >> (2 * CELL_BITS)
     return int(x), int(y), int(z)
 
+
+def decode_cells(codes) -> np.ndarray:
+    """
+    Decode an array of codes.
+
+    :param codes: Array of codes.
+    :return: Array of shape (N, 3) of the numbers.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    return np.stack([codes & CELL_MASK, (codes >> CELL_BITS) & CELL_MASK, codes >> (2 * CELL_BITS)], axis=-1)
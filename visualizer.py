@@ -1,96 +1,221 @@
-import open3d as o3d
+import multiprocessing
+import os
+import queue
+import threading
+import time
 import numpy as np
-from itertools import tee
+
+import rasterizer
+from grid import IS_EDGE
+from growable_array import GrowableArray
+
+try:
+    import open3d as o3d
+except ImportError:
+    # Without Open3D the progress can still be recorded as frames (see frames_dir).
+    o3d = None
+
+
+# Maximal number of times per second the window is redrawn.
+MAX_FPS = 10
+
+# Without a window, a frame is saved every this many seconds (and/or every number of new triangles).
+FRAME_EVERY_SECONDS = 2.0
+FRAME_ROTATION = 4  # Degrees the camera turns between frames.
+
+COLORS = {'red': [1, 0, 0], 'green': [0, 1, 0], 'blue': [0, 0, 1]}
+
+# Messages to the rendering thread, besides the new edges and triangles.
+LOCK = 'lock'
+CLOSE = 'close'
+
+
+def get_messages(messages_queue, timeout) -> list:
+    """
+    Wait for the next message in a queue, and take all the others that are already waiting (drawing can take longer
+    than producing the updates).
+
+    :param messages_queue: The queue.
+    :param timeout: Seconds to wait, or None.
+    :return: List of the messages, empty if none arrived in time. LOCK or CLOSE can only be the last one.
+    """
+    try:
+        messages = [messages_queue.get(timeout=timeout)]
+    except queue.Empty:
+        return []
+
+    while not isinstance(messages[-1], str):
+        try:
+            messages.append(messages_queue.get_nowait())
+        except queue.Empty:
+            break
+
+    return messages
 
 
 class Visualizer:
-    def __init__(self, points):
-        self.points = points
+    def __init__(self, cloud, max_fps=MAX_FPS, frames_dir=None, frame_every_triangles=None,
+                 frame_every_seconds=FRAME_EVERY_SECONDS, image_size=rasterizer.IMAGE_SIZE):
+        """
+        Render the mesh while it's created. The window lives in its own thread: update only sends the edges and
+        triangles that were added since the last update through a queue, and the thread appends them to the geometry
+        it already has and redraws at most max_fps times a second. So watching the algorithm barely slows it down.
+
+        With frames_dir there is no window (and no need for Open3D or a display): the updates go to a FrameRecorder in
+        its own process, which saves the mesh as numbered PNG frames.
+
+        :param cloud: The point cloud.
+        :param max_fps: (Optional) maximal number of redraws per second.
+        :param frames_dir: (Optional) a directory to save PNG frames to, instead of showing a window.
+        :param frame_every_triangles: (Optional) save a frame after this many new triangles.
+        :param frame_every_seconds: (Optional) save a frame after this many seconds (if there are new triangles).
+        :param image_size: (Optional) width and height of the frames.
+        """
+        if frames_dir is None and o3d is None:
+            raise ImportError("Open3D is needed for the visualizer's window, pass frames_dir to save frames instead")
+
+        self.cloud = cloud
+        self.points = cloud.points
+        self.max_fps = max_fps
+        self.frames_dir = frames_dir
         self.visualizer = None
-        self.init_visualiser()
         self.pcd = None
-        self.lines_set = None
+        self.line_set = None
+        self.mesh = None
         self.rotation_angle = 0
 
+        # How much of the grid's edges and triangles arrays were sent to the renderer. The updates since then are
+        # kept as runs of edges with the same color, each one is the number of edges at its end and the color.
+        self.grid = None
+        self.num_sent_edges = 0
+        self.num_sent_triangles = 0
+        self.color_runs = []
+        self.last_send_time = 0
+
+        if frames_dir is None:
+            self.queue = queue.Queue()
+            self.renderer = threading.Thread(target=self.render_loop, daemon=True)
+        else:
+            # Rendering the frames takes the GIL for a while, so it's done in another process.
+            recorder = FrameRecorder(cloud.coordinates, frames_dir, frame_every_triangles=frame_every_triangles,
+                                     frame_every_seconds=frame_every_seconds, image_size=image_size)
+            self.queue = multiprocessing.Queue()
+            self.renderer = multiprocessing.Process(target=recorder.run, args=(self.queue,), daemon=True)
+
+        self.renderer.start()
+
     def init_visualiser(self):
         """
-        Initialize visualizer.
+        Initialize visualizer. Called from the rendering thread, which owns the window.
 
         :return: None.
         """
+        points = self.cloud.coordinates.astype(np.float64)
         pcd = o3d.geometry.PointCloud()
-        points = np.array([(point.x, point.y, point.z) for point in self.points])
         pcd.points = o3d.utility.Vector3dVector(points)
 
         # Color the point in black.
-        points_mask = np.zeros(shape=(len(self.points), 3))
-        black_colors = np.zeros_like(points_mask)
-        pcd.colors = o3d.Vector3dVector(black_colors)
+        pcd.colors = o3d.utility.Vector3dVector(np.zeros((len(points), 3)))
+
+        # The mesh starts empty, its edges and triangles are appended to these.
+        self.line_set = o3d.geometry.LineSet()
+        self.line_set.points = o3d.utility.Vector3dVector(points)
+        self.mesh = o3d.geometry.TriangleMesh()
+        self.mesh.vertices = o3d.utility.Vector3dVector(points)
 
         # Set up visualizer.
         self.pcd = pcd
         self.visualizer = o3d.visualization.Visualizer()
         self.visualizer.create_window()
+        self.visualizer.get_render_option().point_size = 3.5
         self.visualizer.add_geometry(pcd)
+        self.visualizer.add_geometry(self.line_set)
+        self.visualizer.add_geometry(self.mesh)
 
-    def update(self, edges, grid_triangles, color='red'):
+    def update(self, grid, color='red'):
         """
-        Updating only the edges (assuming points don't change).
+        Color the edges that were added to the mesh since the last update, and send the new edges and triangles to the
+        renderer (at most max_fps times a second, the ones in between are sent together).
 
+        :param grid: The grid that holds the mesh.
+        :param color: (Optional) the color of the new edges: 'red', 'green' or 'blue'.
         :return: None.
         """
+        self.grid = grid
+        num_edges = len(grid.edge_points)
+        color = COLORS.get(color, COLORS['blue'])
+        last_run_end = self.color_runs[-1][0] if self.color_runs else self.num_sent_edges
+
+        if num_edges > last_run_end:
+            if self.color_runs and self.color_runs[-1][1] == color:
+                self.color_runs[-1][0] = num_edges
+            else:
+                self.color_runs.append([num_edges, color])
 
-        if color == 'red':
-            c = [1, 0, 0]
-        elif color == 'green':
-            c = [0, 1, 0]
-        else:
-            c = [0, 0, 1]
+        if time.time() - self.last_send_time >= 1 / self.max_fps:
+            self.send()
 
-        lines = [[edge.p1.id, edge.p2.id] for edge in edges]
+    def send(self):
+        """
+        Send the edges and triangles that were added to the mesh since the last time to the renderer. The mesh only
+        grows, so they are the ends of the grid's arrays.
 
-        for edge in edges:
-            if edge.color == []:
-                edge.color = c
-            if edge.p1.id == 2 and edge.p2.id == 2 or edge.p2.id == 2 and edge.p1.id == 2:
-                edge.color = [0, 0, 1]
+        :return: None.
+        """
+        self.last_send_time = time.time()
 
-        colors = [edge.color for edge in edges]
-        line_set = o3d.geometry.LineSet()
-        points = np.array([(point.x, point.y, point.z) for point in self.points])
-        line_set.points = o3d.Vector3dVector(points)
-        line_set.lines = o3d.utility.Vector2iVector(lines)
-        line_set.colors = o3d.utility.Vector3dVector(colors)
+        if self.grid is None:
+            return
+
+        triangles = self.grid.get_triangles_array()[self.num_sent_triangles:].copy()
+
+        # Edges that were added after the last update are sent now, but colored with the next update.
+        run_ends = [end for end, _ in self.color_runs]
+        run_sizes = np.diff([self.num_sent_edges] + run_ends)
+        end = self.num_sent_edges + sum(run_sizes)
+
+        if end == self.num_sent_edges and len(triangles) == 0:
+            return
 
-        facets = []
+        # Like the grid's get_edges_array, the rows that are only sides of triangles aren't edges.
+        is_edge = (self.grid.edge_flags.array[self.num_sent_edges:end] & IS_EDGE) > 0
+        edges = self.grid.edge_points.array[self.num_sent_edges:end][is_edge]
+        colors = np.repeat(np.array([color for _, color in self.color_runs], dtype=np.float64).reshape(-1, 3),
+                           run_sizes, axis=0)[is_edge]
 
-        for triangle in grid_triangles:
-            index_1 = self.points.index(triangle[0])
-            index_2 = self.points.index(triangle[1])
-            index_3 = self.points.index(triangle[2])
-            facets.append([index_1, index_2, index_3])
+        self.num_sent_edges = end
+        self.num_sent_triangles += len(triangles)
+        self.color_runs = []
+        self.queue.put((edges, triangles, colors))
 
-        facets = np.asarray(facets).astype(np.int32)
-        points_triangles = np.array([(point.x, point.y, point.z) for point in self.points])
-        mesh = o3d.TriangleMesh()
-        mesh.vertices = o3d.Vector3dVector(points_triangles)
-        mesh.triangles = o3d.Vector3iVector(facets)
+    def add_to_geometry(self, edges, triangles, colors):
+        """
+        Append new edges and triangles to the rendered geometry.
+
+        :param edges: Array of shape (E, 2) of the points indices of the new edges.
+        :param triangles: Array of shape (T, 3) of the points indices of the new triangles.
+        :param colors: Array of shape (E, 3) of the colors of the new edges.
+        :return: None.
+        """
+        self.line_set.lines.extend(o3d.utility.Vector2iVector(edges))
+        self.line_set.colors.extend(o3d.utility.Vector3dVector(colors))
 
         # Manual fix since i don't define the vertices of a triangle clockwise. If they are anti-clockwise, open3d
         # won't render their mesh.
-        mesh.compute_triangle_normals()
+        if self.cloud.normals is not None and len(triangles) > 0:
+            p1, p2, p3 = (self.cloud.coordinates[triangles[:, k]].astype(np.float64) for k in range(3))
+            normals = np.cross(p2 - p1, p3 - p1)
+            flip = np.einsum('ij,ij->i', normals, self.cloud.normals[triangles[:, 0]]) < 0
+            triangles[flip] = triangles[flip][:, ::-1]
 
-        for i, n in enumerate(np.asarray(mesh.triangle_normals)):
-            t = mesh.triangles[i]
-            p_index = t[0]
-            p = self.points[p_index]
-            if np.dot(n, p.normal) < 0:
-                mesh.triangles[i] = np.flip(t)
+        self.mesh.triangles.extend(o3d.utility.Vector3iVector(triangles))
 
-        self.visualizer.get_render_option().point_size = 3.5
-        self.visualizer.add_geometry(line_set)
-        self.visualizer.add_geometry(mesh)
+    def redraw(self):
+        """
+        Redraw the window with the geometry so far.
 
+        :return: None.
+        """
         # Rotate the object.
         ctr = self.visualizer.get_view_control()
         self.rotation_angle += 4
@@ -100,21 +225,65 @@ class Visualizer:
         self.visualizer.poll_events()
         self.visualizer.update_renderer()
 
+    def render_loop(self):
+        """
+        The rendering thread: add whatever arrived in the queue to the geometry, and redraw when there is something new
+        and enough time passed since the last redraw.
+
+        :return: None.
+        """
+        self.init_visualiser()
+        frame_time = 1 / self.max_fps
+        last_draw_time = 0
+        is_changed = False
+
+        while True:
+            messages = get_messages(self.queue, frame_time)
+
+            for message in messages:
+                if message in (LOCK, CLOSE):
+                    # Draw everything that was sent before stopping.
+                    self.redraw()
+
+                    if message == LOCK:
+                        self.visualizer.run()
+
+                    self.visualizer.destroy_window()
+                    return
+
+                self.add_to_geometry(*message)
+                is_changed = True
+
+            if is_changed and time.time() - last_draw_time >= frame_time:
+                self.redraw()
+                last_draw_time = time.time()
+                is_changed = False
+            else:
+                # Keep the window responsive.
+                self.visualizer.poll_events()
+
+    def stop(self, message):
+        if self.renderer.is_alive():
+            self.send()
+            self.queue.put(message)
+            self.renderer.join()
+
     def lock(self):
         """
-        Lock the visualizer. Program will stop until user closes the visualizer's window.
+        Lock the visualizer. Program will stop until user closes the visualizer's window (or, without a window, until
+        the last frame is saved).
 
         :return: None.
         """
-        self.visualizer.run()
+        self.stop(LOCK)
 
     def close(self):
         """
-        Close visualizer's window.
+        Close visualizer's window (or, without a window, save the last frame).
 
         :return: None.
         """
-        self.visualizer.close()
+        self.stop(CLOSE)
 
     def draw_with_normals(self, percentage=10, normals_size=1):
         """
@@ -123,11 +292,10 @@ class Visualizer:
         :param percentage: What percentage of normals to draw. Integer number in range [1, 100].
         :return: None.
         """
-        self.visualizer.close()
+        self.close()
 
         pcd = o3d.geometry.PointCloud()
-        points = np.array([(point.x, point.y, point.z) for point in self.points])
-        pcd.points = o3d.utility.Vector3dVector(points)
+        pcd.points = o3d.utility.Vector3dVector(self.cloud.coordinates.astype(np.float64))
 
         # Color the point in black.
         points_mask = np.zeros(shape=(len(self.points), 3))
@@ -174,4 +342,88 @@ class Visualizer:
         vis.update_geometry()
         vis.poll_events()
         vis.update_renderer()
-        vis.run()
\ No newline at end of file
+        vis.run()
+
+
+class FrameRecorder:
+    def __init__(self, coordinates, frames_dir, frame_every_triangles=None, frame_every_seconds=FRAME_EVERY_SECONDS,
+                 image_size=rasterizer.IMAGE_SIZE):
+        """
+        Save the mesh as numbered PNG frames while it's created, rendered with rasterizer.py. A frame is saved every
+        frame_every_triangles new triangles or frame_every_seconds seconds, whichever comes first, and once more when
+        it's closed.
+
+        :param coordinates: Array of shape (N, 3) of the points.
+        :param frames_dir: The directory to save the frames to.
+        :param frame_every_triangles: (Optional) save a frame after this many new triangles.
+        :param frame_every_seconds: (Optional) save a frame after this many seconds (if there are new triangles).
+        :param image_size: (Optional) width and height of the frames.
+        """
+        self.coordinates = np.asarray(coordinates)
+        self.frames_dir = frames_dir
+        self.frame_every_triangles = frame_every_triangles
+        self.frame_every_seconds = frame_every_seconds
+        self.image_size = image_size
+        self.lines = GrowableArray((2,), np.int32)
+        self.line_colors = GrowableArray((3,), np.float64)
+        self.triangles = GrowableArray((3,), np.int32)
+        self.num_frames = 0
+        self.num_saved_triangles = 0
+        self.last_frame_time = 0
+
+    def add(self, edges, triangles, colors):
+        """
+        Add new edges and triangles to the mesh.
+
+        :param edges: Array of shape (E, 2) of the points indices of the new edges.
+        :param triangles: Array of shape (T, 3) of the points indices of the new triangles.
+        :param colors: Array of shape (E, 3) of the colors of the new edges.
+        :return: None.
+        """
+        self.lines.extend(edges)
+        self.line_colors.extend(colors)
+        self.triangles.extend(triangles)
+
+    def is_frame_due(self) -> bool:
+        num_new_triangles = len(self.triangles) - self.num_saved_triangles
+        return (self.frame_every_triangles is not None and num_new_triangles >= self.frame_every_triangles) or \
+            (self.frame_every_seconds is not None and time.time() - self.last_frame_time >= self.frame_every_seconds)
+
+    def save_frame(self):
+        """
+        Render the mesh so far, and save it as the next frame.
+
+        :return: None.
+        """
+        image = rasterizer.render(self.coordinates, self.triangles.array, self.lines.array, self.line_colors.array,
+                                  image_size=self.image_size, angle=self.num_frames * FRAME_ROTATION)
+        rasterizer.write_png(os.path.join(self.frames_dir, 'frame_{:05d}.png'.format(self.num_frames)), image)
+        self.num_frames += 1
+        self.num_saved_triangles = len(self.triangles)
+        self.last_frame_time = time.time()
+
+    def run(self, messages_queue):
+        """
+        Save frames of the updates that arrive in a queue (see Visualizer.update), until LOCK or CLOSE arrives.
+
+        :param messages_queue: The queue.
+        :return: None.
+        """
+        os.makedirs(self.frames_dir, exist_ok=True)
+        self.last_frame_time = time.time()
+        is_changed = False
+
+        while True:
+            for message in get_messages(messages_queue, self.frame_every_seconds):
+                if message in (LOCK, CLOSE):
+                    if is_changed or self.num_frames == 0:
+                        self.save_frame()
+
+                    return
+
+                self.add(*message)
+                is_changed = True
+
+            if is_changed and self.is_frame_due():
+                self.save_frame()
+                is_changed = False